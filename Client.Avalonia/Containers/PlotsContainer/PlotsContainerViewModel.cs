@@ -1,5 +1,6 @@
 ﻿using System;
 using System.Collections.Generic;
+using System.Linq;
 using System.Reactive.Disposables;
 using System.Reactive.Linq;
 using System.Threading.Tasks;
@@ -24,6 +25,10 @@ public class PlotsContainerViewModel : ViewModelBase
     private readonly IStratumService             _stratumService;
     private readonly ISensorsService             _sensorsService;
 
+    private static readonly EProjection[] AllProjections = [EProjection.XY, EProjection.XZ, EProjection.YZ];
+
+    private Dictionary<EProjection, Bitmap> _projectionImages = new();
+
     public PlotsContainerViewModel(
         IMeshPlotHelper meshPlotHelper,
         IComputationalDomainService domainService,
@@ -77,13 +82,14 @@ public class PlotsContainerViewModel : ViewModelBase
             )
             .DisposeWith(disposables);
 
+        // Все проекции строятся одним запуском mesh_chart при изменении данных,
+        // переключение проекции только выбирает готовое изображение
         this
             .WhenAnyValue(
                 vm => vm.Domain,
                 vm => vm.Stratums,
                 vm => vm.SensorsGrid,
-                vm => vm.IsSensorsGridTurnedOn,
-                vm => vm.SelectedProjection
+                vm => vm.IsSensorsGridTurnedOn
             )
             .ObserveOn(RxApp.MainThreadScheduler)
             .Subscribe(async void (args) =>
@@ -97,17 +103,22 @@ public class PlotsContainerViewModel : ViewModelBase
                             Item1:
                             { },
                             Item2:
-                            { },
-                            Item3:
                             { }
                         })
                             return;
 
-                        if (args.Item3 == null)
-                            return;
-
-                        var outputImage = await _meshPlotHelper.GenerateChartAsync(args.Item3, args.Item4, args.Item5);
-                        ChartImage = new(outputImage);
+                        var images = await _meshPlotHelper.GenerateStrataChartsAsync(
+                            args.Item1,
+                            args.Item2,
+                            AllProjections,
+                            args.Item4 ? args.Item3 : null
+                        );
+                        // Старые изображения освобождаются только после того, как ChartImage переключён на новые
+                        var previousImages = _projectionImages;
+                        _projectionImages = images.ToDictionary(pair => pair.Key, pair => new Bitmap(pair.Value));
+                        ShowSelectedProjection();
+                        foreach (var image in previousImages.Values)
+                            image.Dispose();
                     } catch (Exception ex)
                     {
                         Console.WriteLine($"Ошибка: {ex.Message}");
@@ -118,6 +129,18 @@ public class PlotsContainerViewModel : ViewModelBase
                 }
             )
             .DisposeWith(disposables);
+
+        this
+            .WhenAnyValue(vm => vm.SelectedProjection)
+            .ObserveOn(RxApp.MainThreadScheduler)
+            .Subscribe(_ => ShowSelectedProjection())
+            .DisposeWith(disposables);
+    }
+
+    private void ShowSelectedProjection()
+    {
+        if (_projectionImages.TryGetValue(SelectedProjection, out var image))
+            ChartImage = image;
     }
 
     [Reactive]
@@ -1,16 +1,144 @@
-import json
+import argparse
+import hashlib
+import os
+from typing import Optional
+
 import matplotlib.pyplot as plt
+import numpy as np
+
+import telemetry
+from mesh_loader import load_sensors
+
+PLOT_MODES = ('auto', 'scatter', 'map')
+GRID_METHODS = ('bin', 'linear')
+
+# В режиме auto карта строится, если сенсоров больше порога
+MAP_THRESHOLD = 5000
+# Сенсоры поверх карты рисуются, только если их не больше этого числа
+MAX_STATIONS = 2000
+
+# Интерполяционные веса по раскладке сенсоров: триангуляция считается один раз
+_weights_cache = {}
+
+
+def grid_axes(coords: np.ndarray, resolution: int) -> tuple[np.ndarray, np.ndarray]:
+    """Узлы регулярной сетки XY по габаритам сенсоров, по длинной стороне resolution"""
+    low = coords[:, :2].min(axis=0)
+    high = coords[:, :2].max(axis=0)
+    span = np.maximum(high - low, 1e-9)
+    counts = np.maximum(2, np.round(resolution * span / span.max())).astype(int)
+    return np.linspace(low[0], high[0], counts[0]), np.linspace(low[1], high[1], counts[1])
+
+
+def bin_to_grid(coords: np.ndarray, values: np.ndarray, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Среднее значение сенсоров в каждой ячейке сетки (NaN, где сенсоров нет), форма (len(y), len(x))"""
+    col = np.clip(np.round((coords[:, 0] - x[0]) / (x[1] - x[0])).astype(np.int64), 0, len(x) - 1)
+    row = np.clip(np.round((coords[:, 1] - y[0]) / (y[1] - y[0])).astype(np.int64), 0, len(y) - 1)
+    pixel = row * len(x) + col
+
+    total = np.bincount(pixel, weights=values, minlength=len(x) * len(y))
+    count = np.bincount(pixel, minlength=len(x) * len(y))
+    with np.errstate(invalid='ignore'):
+        return (total / count).reshape(len(y), len(x))
+
+
+def layout_key(coords: np.ndarray, x: np.ndarray, y: np.ndarray) -> str:
+    """Ключ раскладки сенсоров и сетки для кэша весов"""
+    digest = hashlib.sha1(np.ascontiguousarray(coords[:, :2], dtype=np.float64).tobytes())
+    digest.update(np.concatenate([x[[0, -1]], y[[0, -1]], [len(x), len(y)]]).tobytes())
+    return digest.hexdigest()
+
+
+def interpolation_weights(coords: np.ndarray, x: np.ndarray, y: np.ndarray,
+                          cache_dir: Optional[str] = None) -> tuple[np.ndarray, np.ndarray]:
+    """Вершины треугольника Делоне (P, 3) и барицентрические веса (P, 3) для каждого узла сетки.
+
+    Узлы вне выпуклой оболочки сенсоров получают вершины -1. Результат
+    кэшируется в памяти и, если задан cache_dir, в .npz по ключу раскладки.
+    """
+    key = layout_key(coords, x, y)
+    if key in _weights_cache:
+        return _weights_cache[key]
+
+    path = os.path.join(cache_dir, f"delaunay_{key}.npz") if cache_dir else None
+    if path and os.path.exists(path):
+        with np.load(path) as data:
+            _weights_cache[key] = data['vertices'], data['weights']
+        return _weights_cache[key]
+
+    from scipy.spatial import Delaunay
+
+    triangulation = Delaunay(coords[:, :2])
+    grid_x, grid_y = np.meshgrid(x, y)
+    points = np.column_stack([grid_x.ravel(), grid_y.ravel()])
+
+    simplex = triangulation.find_simplex(points)
+    transform = triangulation.transform[simplex]
+    partial = np.einsum('ijk,ik->ij', transform[:, :2], points - transform[:, 2])
+    weights = np.column_stack([partial, 1 - partial.sum(axis=1)])
+    vertices = np.where(simplex[:, np.newaxis] >= 0, triangulation.simplices[simplex], -1).astype(np.int32)
+
+    _weights_cache[key] = vertices, weights
+    if path:
+        os.makedirs(cache_dir, exist_ok=True)
+        np.savez(path, vertices=vertices, weights=weights)
+    return vertices, weights
+
+
+def interpolate_to_grid(coords: np.ndarray, values: np.ndarray, x: np.ndarray, y: np.ndarray,
+                        cache_dir: Optional[str] = None) -> np.ndarray:
+    """Линейная интерполяция по триангуляции Делоне, форма (len(y), len(x))"""
+    vertices, weights = interpolation_weights(coords, x, y, cache_dir)
+    grid = np.einsum('ij,ij->i', values[np.maximum(vertices, 0)], weights)
+    grid[vertices[:, 0] < 0] = np.nan
+    return grid.reshape(len(y), len(x))
+
+
+def plot_anomaly_map(coords, values, output_image='anomaly_chart.png', method: str = 'linear',
+                     resolution: int = 256, max_stations: int = MAX_STATIONS, cache_dir: Optional[str] = None):
+    """Карта аномалии: значения на регулярной сетке XY и заливка изолиниями"""
+    if method not in GRID_METHODS:
+        raise ValueError(f"Неизвестный метод построения сетки: {method}")
+
+    coords = np.asarray(coords, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    x, y = grid_axes(coords, resolution)
+    if method == 'bin':
+        grid = bin_to_grid(coords, values, x, y)
+    else:
+        grid = interpolate_to_grid(coords, values, x, y, cache_dir)
+    telemetry.checkpoint('geometry', sensors=len(coords), pixels=grid.size)
+
+    fig, ax = plt.subplots(figsize=(8, 7))
+    filled = ax.contourf(x, y, np.ma.masked_invalid(grid), levels=20, cmap='viridis')
+    if len(coords) <= max_stations:
+        ax.scatter(coords[:, 0], coords[:, 1], s=4, c='k', alpha=0.4, linewidths=0)
+
+    ax.set_xlabel("X")
+    ax.set_ylabel("Y")
+    ax.set_aspect('equal')
+    plt.colorbar(filled, label=u'Δg')
+    plt.title("Карта аномалий")
+    telemetry.checkpoint('draw')
+
+    plt.savefig(output_image, dpi=300, bbox_inches='tight')
+    telemetry.checkpoint('save', figure=fig)
+    plt.close(fig)
+    print(f"Сохранено изображение: {output_image}")
 
-# 📂 Загрузка сенсоров из JSON-файла
-def load_sensors(filepath):
-    with open(filepath, 'r') as f:
-        return json.load(f)
 
 # 📊 Построение 3D scatter-графика
-def plot_sensors(sensors):
-    x = [s["X"] for s in sensors]
-    y = [s["Y"] for s in sensors]
-    z = [s["Value"] for s in sensors]
+def plot_sensors(coords, values, output_image='anomaly_chart.png', mode: str = 'auto', **map_options):
+    """mode='map' — карта по сетке (см. plot_anomaly_map), 'auto' — карта при числе сенсоров > MAP_THRESHOLD"""
+    if mode not in PLOT_MODES:
+        raise ValueError(f"Неизвестный режим: {mode}")
+    if mode == 'map' or (mode == 'auto' and len(coords) > MAP_THRESHOLD):
+        plot_anomaly_map(coords, values, output_image, **map_options)
+        return
+
+    x = coords[:, 0]
+    y = coords[:, 1]
+    z = values
 
     fig = plt.figure()
     ax = fig.add_subplot(111, projection='3d')
@@ -22,13 +150,36 @@ def plot_sensors(sensors):
     ax.set_zlabel("Value")
     plt.colorbar(sc, label=u'Δg')
     plt.title("Карта аномалий")
+    telemetry.checkpoint('draw', sensors=len(coords))
 
-    plt.savefig('anomaly_chart.png', dpi=300, bbox_inches='tight')
-    print(f"Сохранено изображение: {'anomaly_chart.png'}")
+    plt.savefig(output_image, dpi=300, bbox_inches='tight')
+    telemetry.checkpoint('save', figure=fig)
+    plt.close(fig)
+    print(f"Сохранено изображение: {output_image}")
     #plt.show()
 
 # 🚀 Точка входа
 if __name__ == '__main__':
-    sensor_file = 'anomaly_data.json'  # Путь к JSON-файлу
-    sensors = load_sensors(sensor_file)
-    plot_sensors(sensors)
+    parser = argparse.ArgumentParser(
+        description='Карта аномалий по сенсорам',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('input', nargs='?', default='anomaly_data.json', help='Путь к файлу сенсоров')
+    parser.add_argument('output', nargs='?', default='anomaly_chart.png', help='Путь к выходному изображению')
+    parser.add_argument('--mode', choices=PLOT_MODES, default='auto',
+                        help=f'scatter — 3D точки, map — карта по сетке, auto — карта при > {MAP_THRESHOLD} сенсоров')
+    parser.add_argument('--method', choices=GRID_METHODS, default='linear',
+                        help='bin — среднее по ячейкам сетки, linear — интерполяция по триангуляции Делоне')
+    parser.add_argument('--resolution', type=int, default=256, help='Узлов сетки по длинной стороне')
+    parser.add_argument('--max-stations', type=int, default=MAX_STATIONS,
+                        help='Рисовать сенсоры поверх карты, если их не больше')
+    parser.add_argument('--cache-dir', default='triangulation_cache',
+                        help='Каталог кэша интерполяционных весов (пустая строка — без кэша)')
+
+    args = parser.parse_args()
+
+    with telemetry.session('anomaly_chart'):
+        coords, values = load_sensors(args.input)
+        telemetry.checkpoint('load', sensors=len(coords))
+        plot_sensors(coords, values, output_image=args.output, mode=args.mode, method=args.method,
+                     resolution=args.resolution, max_stations=args.max_stations, cache_dir=args.cache_dir or None)
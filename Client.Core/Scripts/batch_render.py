@@ -0,0 +1,160 @@
+"""Пакетная отрисовка снимков инверсии без дисплея.
+
+Пример:
+    python batch_render.py "runs/*/mesh_data.json" -o renders -s x=0,y=0,z=-7 -s none
+
+Каждый входной файл отрисовывается для каждой спецификации срезов в пуле
+процессов (по числу доступных ядер). Файлы сетки рисуются в раскладке
+show_plots_script, файлы сенсоров — через anomaly_chart.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Optional
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+import anomaly_chart
+import show_plots_script
+from mesh_lod import DEFAULT_RENDER_BUDGET
+from mesh_loader import detect_kind, load_mesh, load_sensors
+from projection_raster import REDUCERS
+
+AXIS_ARGUMENTS = {'x': 'x_slice', 'y': 'y_slice', 'z': 'z_slice'}
+
+
+def parse_slice_spec(spec: str) -> dict[str, Optional[float]]:
+    """'x=0,z=-7' -> {'x_slice': 0.0, 'y_slice': None, 'z_slice': -7.0}; 'none' — только проекции"""
+    slices = dict.fromkeys(AXIS_ARGUMENTS.values())
+    if spec.strip().lower() in ('', 'none'):
+        return slices
+
+    for part in spec.split(','):
+        axis, _, value = part.partition('=')
+        axis = axis.strip().lower()
+        if axis not in AXIS_ARGUMENTS or not value:
+            raise ValueError(f"Неверная спецификация среза: {spec}")
+        slices[AXIS_ARGUMENTS[axis]] = float(value)
+    return slices
+
+
+def slice_label(slices: dict[str, Optional[float]]) -> str:
+    parts = [f"{axis}{slices[name]:g}" for axis, name in AXIS_ARGUMENTS.items() if slices[name] is not None]
+    return '_'.join(parts) if parts else 'projections'
+
+
+def expand_inputs(patterns: list[str]) -> list[str]:
+    """Каталоги, маски и отдельные файлы в отсортированный список файлов JSON и .gxm"""
+    files = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            files.update(path for extension in ('*.json', '*.gxm')
+                         for path in glob.glob(os.path.join(pattern, extension)))
+        else:
+            files.update(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+    return sorted(files)
+
+
+def output_path(file_path: str, output_dir: str, label: str, unique: bool) -> str:
+    stem, extension = os.path.splitext(os.path.basename(file_path))
+    if unique:
+        # Одноимённые файлы из разных прогонов различаются по каталогу, JSON и .gxm — по расширению
+        stem = f"{os.path.basename(os.path.dirname(os.path.abspath(file_path)))}_{stem}"
+        if extension.lower() != '.json':
+            stem += extension.replace('.', '_')
+    return os.path.join(output_dir, f"{stem}_{label}.png")
+
+
+def render_job(file_path: str, output_image: str, kind: str, slices: dict, options: dict) -> tuple[str, float]:
+    """Одна задача пула: загрузка файла и сохранение одного изображения"""
+    start = time.perf_counter()
+    if kind == 'sensors':
+        coords, values = load_sensors(file_path)
+        anomaly_chart.plot_sensors(coords, values, output_image=output_image)
+    else:
+        show_plots_script.plot_cell_mesh(load_mesh(file_path), output_image=output_image, show=False,
+                                         **slices, **options)
+    return output_image, time.perf_counter() - start
+
+
+def run_batch(files: list[str], output_dir: str, specs: list[str], workers: Optional[int],
+              kind: str = 'auto', options: Optional[dict] = None) -> int:
+    os.makedirs(output_dir, exist_ok=True)
+    slice_specs = [parse_slice_spec(spec) for spec in specs]
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in files]
+    unique = len(set(stems)) != len(stems)
+
+    jobs = []
+    failures = 0
+    for file_path in files:
+        try:
+            file_kind = detect_kind(file_path) if kind == 'auto' else kind
+        except (OSError, ValueError) as e:
+            # Нечитаемый файл не должен останавливать весь пакет
+            failures += 1
+            print(f"Ошибка при чтении {file_path}: {e}", file=sys.stderr)
+            continue
+        # Для сенсоров срезы не имеют смысла: одно изображение на файл
+        for slices in (slice_specs if file_kind == 'mesh' else slice_specs[:1]):
+            label = slice_label(slices) if file_kind == 'mesh' else 'anomaly'
+            jobs.append((file_path, output_path(file_path, output_dir, label, unique), file_kind, slices,
+                         options or {}))
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        futures = {executor.submit(render_job, *job): job for job in jobs}
+        for future in as_completed(futures):
+            file_path = futures[future][0]
+            try:
+                image, seconds = future.result()
+                print(json.dumps({'input': file_path, 'image': image, 'seconds': round(seconds, 3)},
+                                 ensure_ascii=False))
+            except Exception as e:
+                failures += 1
+                print(f"Ошибка при отрисовке {file_path}: {e}", file=sys.stderr)
+
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Пакетная отрисовка сеток и карт аномалий без дисплея',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('inputs', nargs='+', help='Каталоги, маски или файлы JSON и .gxm')
+    parser.add_argument('-o', '--output-dir', default='renders', help='Каталог для изображений')
+    parser.add_argument('-s', '--slice', dest='slices', action='append',
+                        help="Срезы, например 'x=0,y=0,z=-7'; 'none' — только проекции. Можно повторять")
+    parser.add_argument('-j', '--workers', type=int, help='Число процессов (по умолчанию — все ядра)')
+    parser.add_argument('--kind', choices=['auto', 'mesh', 'sensors'], default='auto')
+    parser.add_argument('--projection-mode', choices=['patches', 'raster'], default='patches')
+    parser.add_argument('--reducer', choices=REDUCERS, default='mean')
+    parser.add_argument('--resolution', type=int, default=512)
+    parser.add_argument('--render-budget', type=int, default=DEFAULT_RENDER_BUDGET)
+
+    args = parser.parse_args()
+
+    files = expand_inputs(args.inputs)
+    if not files:
+        print("Ошибка: входные файлы не найдены")
+        exit(1)
+
+    failed = run_batch(
+        files,
+        args.output_dir,
+        args.slices or ['none'],
+        args.workers,
+        kind=args.kind,
+        options={
+            'projection_mode': args.projection_mode,
+            'reducer': args.reducer,
+            'resolution': args.resolution,
+            'render_budget': args.render_budget
+        }
+    )
+    exit(1 if failed else 0)
@@ -0,0 +1,391 @@
+"""Замеры времени и пиковой памяти этапов на синтетических сетках.
+
+Пример:
+    python benchmark.py --sizes 1e3 1e4 1e5 -o bench.json
+    python benchmark.py --sizes 1e3 1e4 -o bench.json --baseline bench_baseline.json
+    python benchmark.py --compare bench.json --baseline bench_baseline.json
+
+Сетки генерируются в формате Mesh из C# (JSON, а также .gxm): регулярные, как
+CreateInitialMeshFromSensorGrid в InvertTaskService, и октодеревья, дроблённые
+вокруг случайных тел, с разным SubdivisionLevel. Для каждой сетки замеряются
+этапы STAGES. Пиковая память замеряется отдельным проходом по tracemalloc
+(NumPy регистрирует в нём свои буферы), поэтому вычисления идут в одном
+процессе. Результат — JSON; при сравнении с эталоном код возврата 1, если
+какой-то этап стал медленнее или тяжелее допуска.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.collections import PolyCollection
+from mpl_toolkits.mplot3d.art3d import Line3DCollection
+
+import forward_model
+import jacobian_builder
+import show_plots_script
+from mesh_geometry import EDGES_PER_CELL, PLANE_AXES, cell_colors, cell_corners, cell_edges, projection_rectangles, \
+    slice_rectangles
+from mesh_loader import MeshData, load_mesh, load_sensors, save_mesh, save_sensors
+from mesh_lod import DEFAULT_RENDER_BUDGET, reduce_to_budget
+from refinement_planner import split_cells
+
+MESH_KINDS = ('regular', 'octree')
+STAGES = ('load', 'geometry', 'projection', 'slice', 'render3d', 'savefig', 'forward', 'jacobian')
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+
+# Сетка сенсоров и глубина, как в параметрах сетки по умолчанию
+GRID_START, GRID_END = -1000.0, 1000.0
+DEPTH = 500.0
+MAX_SUBDIVISION_LEVEL = 6
+BODIES = 3
+
+# Допуски сравнения: относительный и абсолютный (ниже него разница — шум)
+DEFAULT_TOLERANCE = 0.2
+MIN_SECONDS_DELTA = 0.05
+MIN_MEMORY_DELTA_MB = 1.0
+
+
+def _bodies(rng: np.random.Generator) -> np.ndarray:
+    """Центры аномальных тел (BODIES, 3) внутри области"""
+    return np.column_stack([
+        rng.uniform(GRID_START * 0.6, GRID_END * 0.6, BODIES),
+        rng.uniform(GRID_START * 0.6, GRID_END * 0.6, BODIES),
+        rng.uniform(-DEPTH * 0.8, -DEPTH * 0.2, BODIES)
+    ])
+
+
+def _body_density(center: np.ndarray, bodies: np.ndarray) -> np.ndarray:
+    distance2 = ((center[:, np.newaxis, :] - bodies[np.newaxis, :, :]) ** 2).sum(axis=2)
+    return 2.0 + 0.5 * np.exp(-distance2 / (2 * (0.1 * (GRID_END - GRID_START)) ** 2)).sum(axis=1)
+
+
+def regular_mesh(cells: int, seed: int = 0) -> MeshData:
+    """Регулярная сетка как CreateInitialMeshFromSensorGrid, около cells ячеек.
+
+    Bound — полуразмер ячейки (как в DirectTaskService), поэтому ячейки
+    сетки прилегают друг к другу без перекрытия.
+    """
+    splits_z = max(1, round(cells ** (1 / 3) / 2))
+    splits_xy = max(1, round(np.sqrt(cells / splits_z)))
+    size_xy = (GRID_END - GRID_START) / splits_xy
+    size_z = DEPTH / splits_z
+
+    ix, iy, iz = np.meshgrid(np.arange(splits_xy), np.arange(splits_xy), np.arange(splits_z), indexing='ij')
+    center = np.column_stack([
+        GRID_START + (ix.ravel() + 0.5) * size_xy,
+        GRID_START + (iy.ravel() + 0.5) * size_xy,
+        -(iz.ravel() + 0.5) * size_z
+    ])
+    bound = np.tile([size_xy / 2, size_xy / 2, size_z / 2], (len(center), 1))
+    return MeshData(
+        center=center,
+        bound=bound,
+        density=_body_density(center, _bodies(np.random.default_rng(seed))),
+        level=np.zeros(len(center)),
+        sensors=np.empty((0, 3))
+    )
+
+
+def octree_mesh(cells: int, seed: int = 0) -> MeshData:
+    """Октодерево около cells ячеек: дробление SplitCell ближайших к телам ячеек"""
+    rng = np.random.default_rng(seed)
+    bodies = _bodies(rng)
+    mesh = regular_mesh(max(8, cells // 8), seed)
+
+    while len(mesh) + 7 <= cells:
+        level = np.asarray(mesh.level)
+        distance = np.sqrt(((mesh.center[:, np.newaxis, :] - bodies[np.newaxis, :, :]) ** 2).sum(axis=2)).min(axis=1)
+        # Ближе к телу и крупнее — раньше; немного шума, чтобы уровни перемешивались
+        score = distance / mesh.bound[:, 0] * rng.uniform(0.7, 1.3, len(mesh))
+        score[level >= MAX_SUBDIVISION_LEVEL] = np.inf
+
+        count = min((cells - len(mesh)) // 7, max(1, len(mesh) // 4), int(np.isfinite(score).sum()))
+        if count == 0:
+            break
+        chosen = np.zeros(len(mesh), dtype=bool)
+        chosen[np.argpartition(score, count - 1)[:count]] = True
+
+        children = split_cells(mesh, np.flatnonzero(chosen))
+        kept = mesh.subset(~chosen)
+        mesh = MeshData(
+            center=np.concatenate([kept.center, children.center]),
+            bound=np.concatenate([kept.bound, children.bound]),
+            density=np.zeros(len(kept) + len(children)),
+            level=np.concatenate([kept.level, children.level]),
+            sensors=mesh.sensors
+        )
+
+    return mesh.with_density(_body_density(mesh.center, bodies))
+
+
+MESH_GENERATORS = {'regular': regular_mesh, 'octree': octree_mesh}
+
+
+def sensor_grid(count: int) -> np.ndarray:
+    """Регулярная сетка около count сенсоров на поверхности z = 0"""
+    side = max(1, round(np.sqrt(count)))
+    axis = np.linspace(GRID_START, GRID_END, side)
+    x, y = np.meshgrid(axis, axis, indexing='ij')
+    return np.column_stack([x.ravel(), y.ravel(), np.zeros(side * side)])
+
+
+def generate_inputs(kind: str, cells: int, directory: str, sensors: int, regenerate: bool = False) -> dict[str, str]:
+    """Файлы сетки (JSON и .gxm) и сенсоров в directory; готовые файлы переиспользуются"""
+    os.makedirs(directory, exist_ok=True)
+    paths = {
+        'json': os.path.join(directory, f"{kind}_{cells}.json"),
+        'gxm': os.path.join(directory, f"{kind}_{cells}.gxm"),
+        'sensors': os.path.join(directory, f"sensors_{sensors}.json")
+    }
+    if regenerate or not all(os.path.exists(path) for path in paths.values()):
+        mesh = MESH_GENERATORS[kind](cells)
+        save_mesh(mesh, paths['json'])
+        save_mesh(mesh, paths['gxm'])
+        coords = sensor_grid(sensors)
+        save_sensors(paths['sensors'], coords, np.zeros(len(coords)))
+    return paths
+
+
+class StageRunner:
+    """Этапы одной сетки; промежуточные данные (сетка, геометрия) передаются через self"""
+
+    def __init__(self, paths: dict[str, str], mesh_format: str, workers: int, forward_mode: str):
+        self.paths = paths
+        self.mesh_format = mesh_format
+        self.workers = workers
+        self.forward_mode = forward_mode
+        self.mesh = None
+        self.sensors = None
+
+    def load(self):
+        self.mesh = load_mesh(self.paths[self.mesh_format], mmap=False)
+        self.sensors = load_sensors(self.paths['sensors'])[0]
+
+    def geometry(self):
+        cmap = plt.get_cmap('RdYlGn_r')
+        norm = plt.Normalize(self.mesh.density.min(), self.mesh.density.max())
+        self.colors = cell_colors(self.mesh.density, cmap, norm)
+        self.corners = cell_corners(self.mesh)
+        self.visible = reduce_to_budget(self.mesh, DEFAULT_RENDER_BUDGET)
+        self.edges = cell_edges(self.corners if self.visible is self.mesh else cell_corners(self.visible))
+        self.edge_colors = cell_colors(self.visible.density, cmap, norm)
+
+    def _draw_planes(self, collections):
+        fig, axes = plt.subplots(1, 3, figsize=(18, 6))
+        for ax, collection in zip(axes, collections):
+            ax.add_collection(collection)
+            ax.autoscale_view()
+            ax.set_aspect('equal')
+        fig.canvas.draw()
+        plt.close(fig)
+
+    def projection(self):
+        self._draw_planes([
+            PolyCollection(projection_rectangles(self.mesh, plane), facecolors=self.colors, edgecolors='k')
+            for plane in PLANE_AXES
+        ])
+
+    def slice(self):
+        collections = []
+        for axis in ('X', 'Y', 'Z'):
+            position = float(np.mean(self.mesh.axis_bounds(axis)))
+            indices, rects = slice_rectangles(self.mesh, axis, position)
+            collections.append(PolyCollection(rects, facecolors=self.colors[indices], edgecolors='k'))
+        self._draw_planes(collections)
+
+    def render3d(self):
+        fig = plt.figure(figsize=(9, 6))
+        ax = fig.add_subplot(projection='3d')
+        ax.add_collection3d(Line3DCollection(self.edges, colors=np.repeat(self.edge_colors, EDGES_PER_CELL, axis=0),
+                                             linewidths=1.5, alpha=0.7))
+        lower, upper = self.mesh.extent()
+        ax.set(xlim=(lower[0], upper[0]), ylim=(lower[1], upper[1]), zlim=(lower[2], upper[2]))
+        fig.canvas.draw()
+        plt.close(fig)
+
+    def savefig(self):
+        """Полный рисунок plot_cell_mesh с сохранением в PNG 300 dpi"""
+        show_plots_script.plot_cell_mesh(self.mesh, output_image=io.BytesIO(), show=False)
+
+    def forward(self):
+        forward_model.compute_anomaly(self.mesh, self.sensors, workers=self.workers, mode=self.forward_mode)
+
+    def jacobian(self):
+        jacobian_builder.build_jacobian(self.mesh, self.sensors, dtype=np.float32,
+                                        out=os.path.join(os.path.dirname(self.paths['json']), 'jacobian.npy'))
+
+
+def measure(stage, track_memory: bool) -> float:
+    """Время этапа или, при track_memory, пиковый прирост памяти над уровнем до его начала (МБ)"""
+    if not track_memory:
+        start = time.perf_counter()
+        stage()
+        return time.perf_counter() - start
+
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    stage()
+    return (tracemalloc.get_traced_memory()[1] - before) / 2 ** 20
+
+
+def _run_stages(paths, stages, mesh_format, workers, forward_mode, track_memory) -> tuple[dict[str, float], int]:
+    runner = StageRunner(paths, mesh_format, workers, forward_mode)
+    # Загрузка и геометрия нужны следующим этапам, даже если их не замеряют
+    if 'load' not in stages:
+        runner.load()
+    if 'geometry' not in stages and {'projection', 'slice', 'render3d'} & set(stages):
+        runner.geometry()
+    values = {stage: measure(getattr(runner, stage), track_memory) for stage in stages}
+    return values, len(runner.mesh)
+
+
+def run_benchmark(
+        sizes,
+        kinds=MESH_KINDS,
+        stages=STAGES,
+        directory: str = 'bench_data',
+        sensors: int = 256,
+        repeat: int = 1,
+        mesh_format: str = 'json',
+        workers: int = 1,
+        forward_mode: str = 'hybrid',
+        track_memory: bool = True,
+        regenerate: bool = False
+) -> list[dict]:
+    """Замеры для всех сочетаний вида сетки и размера.
+
+    Время — минимум по repeat проходам без трассировки; память — отдельным
+    проходом под tracemalloc, который сильно замедляет отрисовку.
+    """
+    results = []
+    for kind in kinds:
+        for cells in sizes:
+            paths = generate_inputs(kind, cells, directory, sensors, regenerate)
+            timings = []
+            for _ in range(repeat):
+                seconds, actual = _run_stages(paths, stages, mesh_format, workers, forward_mode, False)
+                timings.append(seconds)
+
+            peaks = dict.fromkeys(stages)
+            if track_memory:
+                tracemalloc.start()
+                try:
+                    peaks, _ = _run_stages(paths, stages, mesh_format, workers, forward_mode, True)
+                finally:
+                    tracemalloc.stop()
+
+            for stage in stages:
+                results.append({
+                    'kind': kind,
+                    'cells': cells,
+                    'actual_cells': actual,
+                    'stage': stage,
+                    'seconds': min(run[stage] for run in timings),
+                    'peak_mb': peaks[stage]
+                })
+                print(f"{kind:>8} {cells:>8} {stage:>10}: {results[-1]['seconds']:9.3f} c"
+                      + (f", {peaks[stage]:9.1f} МБ" if track_memory else ''))
+    return results
+
+
+def environment() -> dict:
+    return {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'matplotlib': matplotlib.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+def compare_results(results: list[dict], baseline: list[dict], tolerance: float = DEFAULT_TOLERANCE) -> list[dict]:
+    """Сравнение с эталоном по (вид, размер, этап); regression — хуже допуска"""
+    reference = {(item['kind'], item['cells'], item['stage']): item for item in baseline}
+    rows = []
+    for item in results:
+        base = reference.get((item['kind'], item['cells'], item['stage']))
+        if base is None:
+            continue
+        slower = (item['seconds'] > base['seconds'] * (1 + tolerance)
+                  and item['seconds'] - base['seconds'] > MIN_SECONDS_DELTA)
+        heavier = (item.get('peak_mb') is not None and base.get('peak_mb') is not None
+                   and item['peak_mb'] > base['peak_mb'] * (1 + tolerance)
+                   and item['peak_mb'] - base['peak_mb'] > MIN_MEMORY_DELTA_MB)
+        rows.append({
+            'kind': item['kind'],
+            'cells': item['cells'],
+            'stage': item['stage'],
+            'time_ratio': item['seconds'] / base['seconds'] if base['seconds'] > 0 else float('inf'),
+            'memory_ratio': (item['peak_mb'] / base['peak_mb']
+                             if item.get('peak_mb') and base.get('peak_mb') else None),
+            'regression': slower or heavier
+        })
+    return rows
+
+
+def _read_results(file_path: str) -> list[dict]:
+    with open(file_path, 'r') as f:
+        return json.load(f)['results']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Замеры производительности на синтетических сетках',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('--sizes', nargs='+', default=[str(size) for size in DEFAULT_SIZES],
+                        help='Число ячеек (допускается запись 1e5)')
+    parser.add_argument('--kinds', nargs='+', choices=MESH_KINDS, default=list(MESH_KINDS))
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--sensors', type=int, default=256, help='Число сенсоров для forward и jacobian')
+    parser.add_argument('--format', dest='mesh_format', choices=('json', 'gxm'), default='json',
+                        help='Формат файла сетки на этапе load')
+    parser.add_argument('--forward-mode', choices=forward_model.KERNEL_MODES, default='hybrid')
+    parser.add_argument('--workers', type=int, default=1, help='Процессы прямой задачи (память замеряется при 1)')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--data-dir', default='bench_data', help='Каталог синтетических файлов')
+    parser.add_argument('--regenerate', action='store_true', help='Пересоздать синтетические файлы')
+    parser.add_argument('--no-memory', action='store_true', help='Не замерять память (без второго прохода)')
+    parser.add_argument('-o', '--output', default='benchmark.json', help='Файл результатов')
+    parser.add_argument('--baseline', help='Эталонные результаты для сравнения')
+    parser.add_argument('--compare', help='Сравнить готовый файл результатов с эталоном без замеров')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='Допустимое относительное ухудшение')
+
+    args = parser.parse_args()
+
+    if args.compare:
+        if not args.baseline:
+            print("Ошибка: для --compare нужен --baseline")
+            exit(1)
+        results = _read_results(args.compare)
+    else:
+        results = run_benchmark(
+            [int(float(size)) for size in args.sizes], args.kinds, args.stages, args.data_dir, args.sensors,
+            args.repeat, args.mesh_format, args.workers, args.forward_mode, not args.no_memory, args.regenerate
+        )
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'results': results}, f, indent=2)
+        print(f"Сохранено: {args.output}")
+
+    if args.baseline:
+        rows = compare_results(results, _read_results(args.baseline), args.tolerance)
+        for row in rows:
+            memory = f"{row['memory_ratio']:.2f}" if row['memory_ratio'] is not None else '—'
+            mark = '  РЕГРЕССИЯ' if row['regression'] else ''
+            print(f"{row['kind']:>8} {row['cells']:>8} {row['stage']:>10}: "
+                  f"время ×{row['time_ratio']:.2f}, память ×{memory}{mark}")
+        if any(row['regression'] for row in rows):
+            sys.exit(1)
@@ -0,0 +1,185 @@
+"""Сравнение истинной модели с результатом инверсии по ячейкам.
+
+Одинаковые ячейки сопоставляются соединением по квантованным центру и
+полуразмерам (сортировка, O(N log N)). Ячейки, раздроблённые в моделях
+по-разному, получают среднее плотности другой модели, взвешенное по
+объёму пересечения; кандидаты на пересечение ищутся KD-деревом. Всё
+считается на более мелкой из двух сеток. Ошибка по ячейкам сохраняется
+сеткой (Density = инверсия − истина), разница рисуется панелями
+show_plots_script.
+"""
+import argparse
+import json
+import os
+from dataclasses import dataclass
+
+import numpy as np
+
+from mesh_loader import MeshData, load_mesh, save_mesh
+
+# Шаг квантования ключей относительно наименьшего полуразмера ячейки
+KEY_QUANTUM = 1e-3
+# Ячеек целевой сетки в одном блоке поиска пересечений
+OVERLAP_BLOCK = 20000
+
+
+@dataclass(frozen=True)
+class Comparison:
+    """Обе модели на геометрии более мелкой сетки"""
+    mesh: MeshData  # геометрия сравнения, density — ошибка
+    reference: np.ndarray  # (N,) истинная плотность
+    inverted: np.ndarray  # (N,) плотность инверсии
+    matched: np.ndarray  # (N,) bool, ячейка совпала с ячейкой другой сетки
+    coverage: np.ndarray  # (N,) доля объёма ячейки, покрытая другой сеткой
+
+    @property
+    def error(self) -> np.ndarray:
+        return self.mesh.density
+
+    def summary(self) -> dict:
+        """RMS и максимум ошибки, смещение и доля совпавших ячеек по покрытым ячейкам"""
+        covered = np.isfinite(self.error)
+        error = self.error[covered]
+        volume = np.prod(2 * self.mesh.bound[covered], axis=1)
+        worst = int(np.argmax(np.abs(error))) if len(error) else 0
+        return {
+            'cells': len(self.error),
+            'matched': float(self.matched.mean()) if len(self.error) else 0.0,
+            'rms': float(np.sqrt(np.mean(error ** 2))) if len(error) else 0.0,
+            'volume_rms': float(np.sqrt(np.average(error ** 2, weights=volume))) if len(error) else 0.0,
+            'max_abs': float(abs(error[worst])) if len(error) else 0.0,
+            'max_abs_center': self.mesh.center[covered][worst].tolist() if len(error) else None,
+            'bias': float(np.mean(error)) if len(error) else 0.0,
+            'uncovered': int((self.coverage < 1 - 1e-9).sum())
+        }
+
+
+def geometry_keys(mesh: MeshData, quantum: float) -> np.ndarray:
+    """Целочисленные ключи (N, 6) по центру и полуразмерам"""
+    return np.round(np.column_stack([mesh.center, mesh.bound]) / quantum).astype(np.int64)
+
+
+def match_cells(source: MeshData, target: MeshData, quantum: float) -> np.ndarray:
+    """Индекс совпадающей ячейки source для каждой ячейки target, -1 — нет совпадения"""
+    keys = np.concatenate([geometry_keys(source, quantum), geometry_keys(target, quantum)])
+    _, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    lookup = np.full(inverse.max(initial=-1) + 1, -1, dtype=np.int64)
+    lookup[inverse[:len(source)]] = np.arange(len(source))
+    return lookup[inverse[len(source):]]
+
+
+def overlap_resample(source: MeshData, target: MeshData) -> tuple[np.ndarray, np.ndarray]:
+    """Среднее плотности source по объёму пересечения с каждой ячейкой target и доля покрытия"""
+    from scipy.spatial import cKDTree
+
+    values = np.full(len(target), np.nan)
+    coverage = np.zeros(len(target))
+    if len(source) == 0 or len(target) == 0:
+        return values, coverage
+
+    tree = cKDTree(source.center)
+    reach = source.bound.max()
+    target_volume = np.prod(2 * target.bound, axis=1)
+    for start in range(0, len(target), OVERLAP_BLOCK):
+        block = np.arange(start, min(start + OVERLAP_BLOCK, len(target)))
+        # Пересечение боксов — расстояние по максимуму координат меньше суммы полуразмеров
+        neighbours = tree.query_ball_point(target.center[block], reach + target.bound[block].max(axis=1), p=np.inf)
+        counts = np.fromiter(map(len, neighbours), dtype=np.int64, count=len(block))
+        if counts.sum() == 0:
+            continue
+        rows = np.repeat(block, counts)
+        cols = np.concatenate(neighbours).astype(np.int64)
+
+        low = np.maximum(target.lower[rows], source.lower[cols])
+        high = np.minimum(target.upper[rows], source.upper[cols])
+        overlap = np.prod(np.clip(high - low, 0, None), axis=1)
+
+        local = rows - start
+        weight = np.bincount(local, weights=overlap, minlength=len(block))
+        total = np.bincount(local, weights=overlap * source.density[cols], minlength=len(block))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values[block] = np.where(weight > 0, total / weight, np.nan)
+        coverage[block] = weight / target_volume[block]
+    return values, coverage
+
+
+def compare_models(reference: MeshData, inverted: MeshData, quantum: float = None) -> Comparison:
+    """Истинная и восстановленная плотность на более мелкой сетке, ошибка = инверсия − истина"""
+    target_is_reference = len(reference) >= len(inverted)
+    target, source = (reference, inverted) if target_is_reference else (inverted, reference)
+    if quantum is None:
+        smallest = min(np.min(reference.bound, initial=np.inf), np.min(inverted.bound, initial=np.inf))
+        quantum = KEY_QUANTUM * smallest if np.isfinite(smallest) and smallest > 0 else KEY_QUANTUM
+
+    match = match_cells(source, target, quantum)
+    matched = match >= 0
+    values = np.empty(len(target))
+    coverage = np.ones(len(target))
+    values[matched] = source.density[match[matched]]
+
+    # Ячейки, раздроблённые по-разному, — через пересечение объёмов
+    rest = np.flatnonzero(~matched)
+    values[rest], coverage[rest] = overlap_resample(source, target.subset(rest))
+
+    reference_values, inverted_values = ((target.density, values) if target_is_reference
+                                         else (values, target.density))
+    return Comparison(
+        mesh=target.with_density(inverted_values - reference_values),
+        reference=np.asarray(reference_values, dtype=np.float64),
+        inverted=np.asarray(inverted_values, dtype=np.float64),
+        matched=matched,
+        coverage=coverage
+    )
+
+
+def plot_difference(comparison: Comparison, output_image: str, **slices):
+    """Ошибка в раскладке show_plots_script: 3D вид и три проекции или сечения"""
+    from show_plots_script import plot_cell_mesh
+
+    covered = comparison.mesh.subset(np.isfinite(comparison.error))
+    limit = float(np.max(np.abs(covered.density), initial=0.0)) or 1.0
+    plot_cell_mesh(covered, output_image=output_image, show=False, value_label='Δρ (инверсия − истина)',
+                   cmap='RdBu_r', limits=(-limit, limit), **slices)
+
+
+def output_stem(output_dir: str, inverted_file: str) -> str:
+    return os.path.join(output_dir, os.path.splitext(os.path.basename(inverted_file))[0])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Сравнение истинной модели с результатами инверсии',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('reference', help='Истинная модель (JSON или .gxm)')
+    parser.add_argument('inverted', nargs='+', help='Модели после инверсии')
+    parser.add_argument('-o', '--output-dir', default='comparison', help='Каталог результатов')
+    parser.add_argument('--error-format', choices=['gxm', 'json'], default='gxm',
+                        help='Формат сетки с ошибкой по ячейкам')
+    parser.add_argument('--plot', action='store_true', help='Рисовать разницу для каждой модели')
+    parser.add_argument('-x', '--x-slice', type=float)
+    parser.add_argument('-y', '--y-slice', type=float)
+    parser.add_argument('-z', '--z-slice', type=float)
+    parser.add_argument('--quantum', type=float,
+                        help=f'Шаг квантования ключей (по умолчанию {KEY_QUANTUM} наименьшего полуразмера)')
+
+    args = parser.parse_args()
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    reference = load_mesh(args.reference)
+    summaries = {}
+    for inverted_file in args.inverted:
+        comparison = compare_models(reference, load_mesh(inverted_file), args.quantum)
+        stem = output_stem(args.output_dir, inverted_file)
+        save_mesh(comparison.mesh, f"{stem}_error.{args.error_format}")
+        if args.plot:
+            plot_difference(comparison, f"{stem}_error.png",
+                            x_slice=args.x_slice, y_slice=args.y_slice, z_slice=args.z_slice)
+
+        summary = summaries[inverted_file] = comparison.summary()
+        print(f"{inverted_file}: RMS={summary['rms']:.4g}, max={summary['max_abs']:.4g}, "
+              f"смещение={summary['bias']:.4g}, совпало {summary['matched']:.1%} ячеек")
+
+    with open(os.path.join(args.output_dir, 'summary.json'), 'w', encoding='utf-8') as f:
+        json.dump(summaries, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,256 @@
+"""Мониторинг сходимости инверсии по файлу метрик, растущему во время расчёта.
+
+Пример:
+    python convergence_dashboard.py inversion_metrics.jsonl -r inversion_residuals.gxm
+
+Метрики и карта невязки (InversionMetricsWriter.cs) пишутся, только если
+в inverse_options.json заданы MetricsLogPath и ResidualMapPath (по
+умолчанию пусто). Файл метрик читается как tail -f: с запомненного
+смещения дочитываются только новые полные строки. Карта невязки
+перечитывается не чаще --residual-interval и только если файл изменился.
+Процесс понижает свой приоритет, чтобы не отнимать ядра у расчёта
+якобиана; обновление раз в --refresh секунд.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Optional
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+from mesh_loader import load_mesh
+
+# Поля строки метрик, которые рисуются
+METRIC_FIELDS = ('iteration', 'functional', 'lambda', 'cells', 'forward_seconds', 'jacobian_seconds',
+                 'invert_seconds', 'elapsed_seconds')
+
+
+class MetricsTail:
+    """Дочитывание строк JSON с запомненного смещения; недописанная строка ждёт следующего чтения"""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.offset = 0
+        self._partial = b''
+
+    def read_new(self) -> list[dict]:
+        try:
+            size = os.path.getsize(self.file_path)
+        except OSError:
+            return []
+        if size < self.offset:
+            # Файл пересоздан новым запуском
+            self.offset = 0
+            self._partial = b''
+        if size == self.offset:
+            return []
+
+        with open(self.file_path, 'rb') as f:
+            f.seek(self.offset)
+            chunk = f.read(size - self.offset)
+        self.offset += len(chunk)
+
+        *lines, self._partial = (self._partial + chunk).split(b'\n')
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        return records
+
+
+class MetricsHistory:
+    """Накопленные значения метрик по итерациям"""
+
+    def __init__(self):
+        self.columns = {field: [] for field in METRIC_FIELDS}
+
+    def extend(self, records: list[dict]):
+        if records and self.columns['iteration'] and records[0].get('iteration', 0) <= self.columns['iteration'][-1]:
+            # Номера итераций пошли заново — новый запуск
+            self.columns = {field: [] for field in METRIC_FIELDS}
+        for record in records:
+            for field in METRIC_FIELDS:
+                # NaN в C# пишется строкой "NaN"
+                self.columns[field].append(float(record.get(field, np.nan)))
+
+    def __len__(self) -> int:
+        return len(self.columns['iteration'])
+
+    def array(self, field: str) -> np.ndarray:
+        return np.asarray(self.columns[field], dtype=np.float64)
+
+
+class ResidualMap:
+    """Карта невязки (.gxm без ячеек); перечитывается только при изменении файла"""
+
+    def __init__(self, file_path: Optional[str]):
+        self.file_path = file_path
+        self._stamp = None
+
+    def load_if_changed(self) -> Optional[tuple[np.ndarray, np.ndarray]]:
+        if not self.file_path:
+            return None
+        try:
+            stat = os.stat(self.file_path)
+        except OSError:
+            return None
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self._stamp:
+            return None
+
+        try:
+            mesh = load_mesh(self.file_path, mmap=False)
+        except (OSError, ValueError):
+            # Файл заменяется прямо сейчас — попробуем в следующий раз
+            return None
+        self._stamp = stamp
+        if mesh.sensor_values is None:
+            return None
+        return mesh.sensors, mesh.sensor_values
+
+
+def lower_priority():
+    """Понижение приоритета процесса относительно расчёта"""
+    if hasattr(os, 'nice'):
+        try:
+            os.nice(10)
+        except OSError:
+            pass
+        return
+    try:
+        import ctypes
+
+        below_normal_priority_class = 0x4000
+        ctypes.windll.kernel32.SetPriorityClass(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                below_normal_priority_class)
+    except (AttributeError, OSError):
+        pass
+
+
+class ConvergenceDashboard:
+    def __init__(self, metrics_file: str, residual_file: Optional[str] = None, residual_interval: float = 10.0):
+        self.tail = MetricsTail(metrics_file)
+        self.history = MetricsHistory()
+        self.residuals = ResidualMap(residual_file)
+        self.residual_interval = residual_interval
+        self._last_residual_check = -np.inf
+
+        self.fig, axes = plt.subplots(2, 3, figsize=(18, 10))
+        (self.ax_functional, self.ax_lambda, self.ax_residual), (self.ax_time, self.ax_cells, self.ax_ratio) = axes
+
+        self.lines = {
+            'functional': self.ax_functional.plot([], [], color='tab:blue')[0],
+            'lambda': self.ax_lambda.plot([], [], color='tab:purple')[0],
+            'forward_seconds': self.ax_time.plot([], [], label='Прямая задача')[0],
+            'jacobian_seconds': self.ax_time.plot([], [], label='Якобиан')[0],
+            'invert_seconds': self.ax_time.plot([], [], label='Шаг Гаусса–Ньютона')[0],
+            'cells': self.ax_cells.plot([], [], color='tab:green', drawstyle='steps-post')[0],
+            'ratio': self.ax_ratio.plot([], [], color='tab:red')[0]
+        }
+        for ax, title, scale in ((self.ax_functional, 'Функционал', 'log'), (self.ax_lambda, 'λ', 'log'),
+                                 (self.ax_time, 'Время итерации, с', 'linear'), (self.ax_cells, 'Ячеек', 'linear'),
+                                 (self.ax_ratio, 'Функционал / начальный', 'log')):
+            ax.set_title(title)
+            ax.set_xlabel('Итерация')
+            ax.set_yscale(scale)
+            ax.grid(True, which='both', linestyle='dotted', alpha=0.5)
+        self.ax_time.legend(loc='upper left', fontsize=8)
+
+        self.ax_residual.set_title('Невязка: наблюдение − модель')
+        self.ax_residual.set_aspect('equal')
+        self.residual_scatter = None
+        self.fig.tight_layout(rect=(0, 0, 1, 0.95))
+
+    def update(self) -> bool:
+        """Дочитать метрики и при необходимости карту невязки; True, если что-то изменилось"""
+        changed = self._update_metrics()
+        now = time.monotonic()
+        if now - self._last_residual_check >= self.residual_interval:
+            self._last_residual_check = now
+            changed |= self._update_residuals()
+        return changed
+
+    def _update_metrics(self) -> bool:
+        records = self.tail.read_new()
+        if not records:
+            return False
+        self.history.extend(records)
+
+        iterations = self.history.array('iteration')
+        functional = self.history.array('functional')
+        for field, line in self.lines.items():
+            if field == 'ratio':
+                line.set_data(iterations, functional / functional[0] if len(functional) else functional)
+            else:
+                line.set_data(iterations, self.history.array(field))
+        for ax in (self.ax_functional, self.ax_lambda, self.ax_time, self.ax_cells, self.ax_ratio):
+            ax.relim()
+            ax.autoscale_view()
+
+        last = len(self.history) - 1
+        self.fig.suptitle(f"Итерация {int(iterations[last])}: функционал={functional[last]:.6e}, "
+                          f"прошло {self.history.array('elapsed_seconds')[last]:.0f} c")
+        return True
+
+    def _update_residuals(self) -> bool:
+        loaded = self.residuals.load_if_changed()
+        if loaded is None:
+            return False
+        coords, values = loaded
+        limit = float(np.max(np.abs(values), initial=0.0)) or 1.0
+        if self.residual_scatter is None:
+            self.residual_scatter = self.ax_residual.scatter(coords[:, 0], coords[:, 1], c=values, s=8,
+                                                             cmap='RdBu_r', vmin=-limit, vmax=limit)
+            self.fig.colorbar(self.residual_scatter, ax=self.ax_residual, label='Δg')
+        else:
+            self.residual_scatter.set_offsets(coords[:, :2])
+            self.residual_scatter.set_array(values)
+            self.residual_scatter.set_clim(-limit, limit)
+        self.ax_residual.update_datalim(coords[:, :2])
+        self.ax_residual.autoscale_view()
+        return True
+
+    def run(self, refresh: float):
+        """Обновление раз в refresh секунд, пока окно открыто"""
+        plt.show(block=False)
+        while plt.fignum_exists(self.fig.number):
+            if self.update():
+                self.fig.canvas.draw_idle()
+            plt.pause(refresh)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Мониторинг сходимости инверсии',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('metrics', nargs='?', default='inversion_metrics.jsonl', help='Файл метрик (JSON Lines)')
+    parser.add_argument('-r', '--residuals', default='inversion_residuals.gxm', help='Карта невязки (.gxm)')
+    parser.add_argument('--refresh', type=float, default=2.0, help='Период обновления, с')
+    parser.add_argument('--residual-interval', type=float, default=10.0,
+                        help='Не перечитывать карту невязки чаще, с')
+    parser.add_argument('--once', metavar='IMAGE', help='Один раз прочитать файлы и сохранить изображение')
+    parser.add_argument('--normal-priority', action='store_true', help='Не понижать приоритет процесса')
+
+    args = parser.parse_args()
+    if not args.normal_priority:
+        lower_priority()
+
+    if args.once:
+        import matplotlib
+
+        matplotlib.use('Agg')
+
+    dashboard = ConvergenceDashboard(args.metrics, args.residuals, args.residual_interval)
+    if args.once:
+        dashboard.update()
+        dashboard.fig.savefig(args.once, dpi=150)
+        print(f"Сохранено изображение: {args.once}")
+        sys.exit(0)
+
+    dashboard.run(args.refresh)
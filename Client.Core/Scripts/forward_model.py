@@ -0,0 +1,452 @@
+"""Прямая задача гравиразведки на NumPy.
+
+Повторяет DirectTaskService.GetAnomaly/IntegralCalculation: правило средних
+точек по x (QUADRATURE_NODES узлов) и аналитические слагаемые asinh по y и z,
+умноженные на G·(ρ − ρ_base). Расчёт векторизован по парам (сенсор, ячейка)
+и ведётся блоками не более chunk_size пар; блоки сенсоров раздаются пулу процессов.
+
+Режим 'hybrid' считает точно только ближнюю зону, а дальние пары — как
+точечные массы G·Δρ·V·(zR − zc)/r³. Граница зон выбирается для каждой ячейки
+так, чтобы оценка погрешности точечной массы не превышала rel_tol от полного
+притяжения ячейки G·|Δρ|·V/r².
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from mesh_loader import MeshData, load_mesh, load_sensors, save_sensors
+
+# Common/Constants/PhysicalQuantities.cs
+GRAVITATIONAL_CONSTANT = 6.672e-8
+
+# Число узлов квадратуры по x (как в IntegralCalculation)
+QUADRATURE_NODES = 25
+
+# Число пар (сенсор, ячейка) в одном блоке расчёта
+DEFAULT_CHUNK_SIZE = 1 << 19
+
+# Оценка погрешности точечной массы: k2·A/r² + k4·d⁴/r⁴, где A = max b² − min b²
+# (квадрупольный момент вытянутой ячейки), d — полудиагональ. Коэффициенты
+# подобраны по худшему направлению для кубов, пластин и игл с запасом
+QUADRUPOLE_ERROR_FACTOR = 1.2
+OCTUPOLE_ERROR_FACTOR = 0.15
+
+# Ближе MIN_FAR_RATIO полудиагоналей разложение не используется
+MIN_FAR_RATIO = 3.0
+
+DEFAULT_REL_TOL = 1e-3
+KERNEL_MODES = ('exact', 'hybrid')
+
+# Геометрия ячеек в процессах пула, передаётся один раз при запуске
+_worker_cells = None
+
+
+@dataclass(frozen=True)
+class ForwardResult:
+    """Аномалия и оценка погрешности гибридного расчёта"""
+    values: np.ndarray  # (M,)
+    error_bound: np.ndarray  # (M,), оценка сверху абсолютной погрешности дальней зоны
+    near_pairs: int
+    total_pairs: int
+
+    @property
+    def near_fraction(self) -> float:
+        return self.near_pairs / self.total_pairs if self.total_pairs else 0.0
+
+    def relative_error_bound(self) -> float:
+        """Оценка погрешности относительно максимума модуля аномалии"""
+        scale = np.max(np.abs(self.values), initial=0.0) or 1.0
+        return float(np.max(self.error_bound, initial=0.0) / scale)
+
+
+def cell_geometry(mesh: MeshData, base_density: float = 0.0) -> np.ndarray:
+    """Колонки x0, x1, y0, y1, z0, z1 и множитель G·(ρ − ρ_base), форма (7, N)"""
+    lower, upper = mesh.lower, mesh.upper
+    scale = GRAVITATIONAL_CONSTANT * (np.asarray(mesh.density, dtype=np.float64) - base_density)
+    return np.vstack([lower[:, 0], upper[:, 0], lower[:, 1], upper[:, 1], lower[:, 2], upper[:, 2], scale])
+
+
+def _asinh_term(x_receiver, y_receiver, z_receiver, w, y, z):
+    """F(y, z) из IntegralCalculation с тем же порядком операций"""
+    x2 = x_receiver * x_receiver
+    w2 = w * w
+    top = (y_receiver - y) * np.sqrt(
+        4 * z_receiver * z_receiver
+        - 8 * z * z_receiver
+        + 4 * x2
+        - 8 * w * x_receiver
+        + 4 * w2
+        + 4 * z * z
+    )
+    bottom = (2 * z_receiver * z_receiver
+              - 4 * z * z_receiver
+              + 2 * x2
+              - 4 * w * x_receiver
+              + 2 * w2
+              + 2 * z * z)
+
+    ratio = top / bottom
+    ratio[np.isnan(ratio)] = 0.0
+    return np.arcsinh(ratio)
+
+
+def _prism_integral(x_receiver, y_receiver, z_receiver, x0, x1, y0, y1, z0, z1) -> np.ndarray:
+    """IntegralCalculation для массивов с общей формой после broadcasting"""
+    h = (x1 - x0) / QUADRATURE_NODES
+    result = np.zeros(np.broadcast_shapes(np.shape(x_receiver), np.shape(x0)))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for i in range(QUADRATURE_NODES):
+            w = x0 + h * (i + 0.5)
+            result += (_asinh_term(x_receiver, y_receiver, z_receiver, w, y0, z1)
+                       - _asinh_term(x_receiver, y_receiver, z_receiver, w, y1, z1)
+                       - _asinh_term(x_receiver, y_receiver, z_receiver, w, y0, z0)
+                       + _asinh_term(x_receiver, y_receiver, z_receiver, w, y1, z0))
+    return result * h
+
+
+def anomaly_terms(sensors: np.ndarray, cells: np.ndarray) -> np.ndarray:
+    """Вклады ячеек в аномалию сенсоров, форма (S, N)"""
+    receivers = (sensors[:, k:k + 1] for k in range(3))
+    x0, x1, y0, y1, z0, z1, scale = (cells[k][np.newaxis, :] for k in range(7))
+    return scale * _prism_integral(*receivers, x0, x1, y0, y1, z0, z1)
+
+
+def pair_terms(sensors: np.ndarray, cells: np.ndarray, sensor_index: np.ndarray,
+               cell_index: np.ndarray, chunk_size: int = DEFAULT_CHUNK_SIZE) -> np.ndarray:
+    """Точные вклады для списка пар (сенсор, ячейка), форма (P,)"""
+    terms = np.empty(len(sensor_index))
+    for start in range(0, len(sensor_index), chunk_size):
+        s = sensor_index[start:start + chunk_size]
+        c = cell_index[start:start + chunk_size]
+        receivers = (sensors[s, k] for k in range(3))
+        x0, x1, y0, y1, z0, z1, scale = cells[:, c]
+        terms[start:start + chunk_size] = scale * _prism_integral(*receivers, x0, x1, y0, y1, z0, z1)
+    return terms
+
+
+def _error_moments(half_sizes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Анизотропия A = max b² − min b² и квадрат полудиагонали по колонкам (3, N)"""
+    squares = half_sizes * half_sizes
+    return squares.max(axis=0) - squares.min(axis=0), squares.sum(axis=0)
+
+
+def point_mass_error(half_sizes: np.ndarray, distance: np.ndarray) -> np.ndarray:
+    """Оценка относительной погрешности точечной массы на расстоянии distance"""
+    anisotropy, diagonal2 = _error_moments(half_sizes)
+    inverse2 = 1.0 / (distance * distance)
+    return inverse2 * (QUADRUPOLE_ERROR_FACTOR * anisotropy
+                       + OCTUPOLE_ERROR_FACTOR * diagonal2 * diagonal2 * inverse2)
+
+
+def far_field_radius(half_sizes: np.ndarray, rel_tol: float) -> np.ndarray:
+    """Наименьшее расстояние, с которого оценка погрешности не превышает rel_tol"""
+    anisotropy, diagonal2 = _error_moments(half_sizes)
+    quadrupole = QUADRUPOLE_ERROR_FACTOR * anisotropy
+    # Корень k4·d⁴·u² + k2·A·u − ε = 0 относительно u = 1/r² в устойчивой форме
+    with np.errstate(divide='ignore'):
+        inverse2 = 2 * rel_tol / (quadrupole + np.sqrt(
+            quadrupole * quadrupole + 4 * OCTUPOLE_ERROR_FACTOR * diagonal2 * diagonal2 * rel_tol))
+        radius = np.where(diagonal2 > 0, 1.0 / np.sqrt(inverse2), 0.0)
+    return np.maximum(radius, MIN_FAR_RATIO * np.sqrt(diagonal2))
+
+
+def near_field_pairs(sensors: np.ndarray, centers: np.ndarray, radius: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Пары (сенсор, ячейка) ближе радиуса ячейки, упорядоченные по сенсору.
+
+    Ячейки группируются по порядку величины радиуса, для каждой группы —
+    один запрос к k-d дереву сенсоров с наибольшим радиусом группы.
+    """
+    from scipy.spatial import cKDTree
+
+    sensor_tree = cKDTree(sensors)
+    exponent = np.frexp(radius)[1]
+    sensor_parts, cell_parts = [], []
+    for value in np.unique(exponent):
+        group = np.flatnonzero(exponent == value)
+        found = sensor_tree.sparse_distance_matrix(cKDTree(centers[group]), radius[group].max(),
+                                                   output_type='ndarray')
+        keep = found['v'] < radius[group][found['j']]
+        sensor_parts.append(found['i'][keep])
+        cell_parts.append(group[found['j'][keep]])
+
+    sensor_index = np.concatenate(sensor_parts).astype(np.int64)
+    cell_index = np.concatenate(cell_parts).astype(np.int64)
+    order = np.lexsort((cell_index, sensor_index))
+    return sensor_index[order], cell_index[order]
+
+
+def _point_mass_block(sensors: np.ndarray, cells: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Вклады точечных масс и оценка их погрешности, формы (S, N)"""
+    half_sizes = (cells[1::2, :] - cells[0:6:2, :]) / 2
+    centers = (cells[1:6:2, :] + cells[0:6:2, :]) / 2
+    mass = cells[6] * 8 * np.prod(half_sizes, axis=0)
+
+    dx = sensors[:, 0:1] - centers[0]
+    dy = sensors[:, 1:2] - centers[1]
+    dz = sensors[:, 2:3] - centers[2]
+    distance2 = dx * dx + dy * dy + dz * dz
+    distance = np.sqrt(distance2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        terms = mass * dz / (distance2 * distance)
+        error = np.abs(mass) / distance2 * point_mass_error(half_sizes, distance)
+    return terms, error
+
+
+def _sensor_block(sensors: np.ndarray, cells: np.ndarray, cells_per_block: int) -> np.ndarray:
+    """Аномалия блока сенсоров; ячейки суммируются по порядку, как в GetAnomalyMapFast"""
+    total = np.zeros(len(sensors))
+    for start in range(0, cells.shape[1], cells_per_block):
+        terms = anomaly_terms(sensors, cells[:, start:start + cells_per_block])
+        # cumsum складывает строго слева направо, в отличие от попарного np.sum
+        total = np.cumsum(np.column_stack([total, terms]), axis=1)[:, -1]
+    return total
+
+
+def _hybrid_block(sensors: np.ndarray, cells: np.ndarray, cells_per_block: int,
+                  pairs: tuple[np.ndarray, np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    """Блок сенсоров в гибридном режиме; pairs — ближние пары с локальными номерами сенсоров"""
+    sensor_index, cell_index = pairs
+    values = np.zeros(len(sensors))
+    bound = np.zeros(len(sensors))
+
+    for start in range(0, cells.shape[1], cells_per_block):
+        stop = min(start + cells_per_block, cells.shape[1])
+        terms, error = _point_mass_block(sensors, cells[:, start:stop])
+        near = (cell_index >= start) & (cell_index < stop)
+        terms[sensor_index[near], cell_index[near] - start] = 0.0
+        error[sensor_index[near], cell_index[near] - start] = 0.0
+        values += terms.sum(axis=1)
+        bound += error.sum(axis=1)
+
+    exact = pair_terms(sensors, cells, sensor_index, cell_index, cells_per_block)
+    values += np.bincount(sensor_index, weights=exact, minlength=len(sensors))
+    return values, bound
+
+
+def _init_worker(cells: np.ndarray):
+    global _worker_cells
+    _worker_cells = cells
+
+
+def _worker_block(sensors: np.ndarray, cells_per_block: int) -> np.ndarray:
+    return _sensor_block(sensors, _worker_cells, cells_per_block)
+
+
+def _worker_hybrid_block(sensors: np.ndarray, cells_per_block: int, pairs) -> tuple[np.ndarray, np.ndarray]:
+    return _hybrid_block(sensors, _worker_cells, cells_per_block, pairs)
+
+
+def _block_sizes(n_sensors: int, n_cells: int, chunk_size: int, workers: int) -> tuple[int, int]:
+    """Размеры блоков: пары в блоке ≤ chunk_size, блоков сенсоров не меньше числа процессов"""
+    cells_per_block = max(1, min(n_cells, chunk_size))
+    sensors_per_block = max(1, chunk_size // cells_per_block)
+    sensors_per_block = min(sensors_per_block, max(1, -(-n_sensors // workers)))
+    return sensors_per_block, cells_per_block
+
+
+def compute_anomaly(
+        mesh: MeshData,
+        sensors: np.ndarray,
+        base_density: float = 0.0,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        workers: Optional[int] = None,
+        mode: str = 'exact',
+        rel_tol: float = DEFAULT_REL_TOL
+) -> np.ndarray:
+    """Аномалия Δg в точках sensors (M, 3) от всех ячеек сетки.
+
+    Пиковая память ограничена chunk_size парам (сенсор, ячейка) на процесс.
+    workers=1 считает в текущем процессе. mode='hybrid' — см. compute_anomaly_hybrid.
+    """
+    if mode not in KERNEL_MODES:
+        raise ValueError(f"Неизвестный режим расчёта: {mode}")
+    if mode == 'hybrid':
+        return compute_anomaly_hybrid(mesh, sensors, base_density, rel_tol, chunk_size, workers).values
+
+    sensors = np.ascontiguousarray(sensors, dtype=np.float64).reshape(-1, 3)
+    if len(sensors) == 0 or len(mesh) == 0:
+        return np.zeros(len(sensors))
+
+    cells = cell_geometry(mesh, base_density)
+    workers = workers or os.cpu_count() or 1
+    sensors_per_block, cells_per_block = _block_sizes(len(sensors), cells.shape[1], chunk_size, workers)
+    blocks = [sensors[start:start + sensors_per_block] for start in range(0, len(sensors), sensors_per_block)]
+
+    if workers == 1 or len(blocks) == 1:
+        return np.concatenate([_sensor_block(block, cells, cells_per_block) for block in blocks])
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(blocks)), initializer=_init_worker,
+                             initargs=(cells,)) as executor:
+        results = executor.map(_worker_block, blocks, [cells_per_block] * len(blocks))
+        return np.concatenate(list(results))
+
+
+def compute_anomaly_hybrid(
+        mesh: MeshData,
+        sensors: np.ndarray,
+        base_density: float = 0.0,
+        rel_tol: float = DEFAULT_REL_TOL,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        workers: Optional[int] = None
+) -> ForwardResult:
+    """Точный интеграл в ближней зоне, точечные массы в дальней.
+
+    Для каждой пары дальней зоны погрешность точечной массы не превышает
+    rel_tol от G·|Δρ|·V/r²; сумма этих оценок по сенсору — error_bound.
+    """
+    sensors = np.ascontiguousarray(sensors, dtype=np.float64).reshape(-1, 3)
+    total_pairs = len(sensors) * len(mesh)
+    if total_pairs == 0:
+        return ForwardResult(np.zeros(len(sensors)), np.zeros(len(sensors)), 0, 0)
+
+    cells = cell_geometry(mesh, base_density)
+    sensor_index, cell_index = near_field_pairs(sensors, np.asarray(mesh.center),
+                                                far_field_radius(np.asarray(mesh.bound).T, rel_tol))
+
+    workers = workers or os.cpu_count() or 1
+    sensors_per_block, cells_per_block = _block_sizes(len(sensors), cells.shape[1], chunk_size, workers)
+    starts = range(0, len(sensors), sensors_per_block)
+    blocks = [sensors[start:start + sensors_per_block] for start in starts]
+    bounds = np.searchsorted(sensor_index, [*starts, len(sensors)])
+    pairs = [(sensor_index[lo:hi] - start, cell_index[lo:hi])
+             for start, lo, hi in zip(starts, bounds[:-1], bounds[1:])]
+
+    if workers == 1 or len(blocks) == 1:
+        results = [_hybrid_block(block, cells, cells_per_block, block_pairs)
+                   for block, block_pairs in zip(blocks, pairs)]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(blocks)), initializer=_init_worker,
+                                 initargs=(cells,)) as executor:
+            results = list(executor.map(_worker_hybrid_block, blocks, [cells_per_block] * len(blocks), pairs))
+
+    return ForwardResult(
+        values=np.concatenate([values for values, _ in results]),
+        error_bound=np.concatenate([bound for _, bound in results]),
+        near_pairs=len(sensor_index),
+        total_pairs=total_pairs
+    )
+
+
+def sensitivity_matrix(
+        mesh: MeshData,
+        sensors: np.ndarray,
+        mode: str = 'exact',
+        rel_tol: float = DEFAULT_REL_TOL,
+        chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> np.ndarray:
+    """Производные ∂Δg/∂ρ (M, N): вклад ячейки единичной плотности.
+
+    В режиме 'hybrid' дальние пары — точечные массы (как JacobianService),
+    ближние — точный интеграл призмы.
+    """
+    if mode not in KERNEL_MODES:
+        raise ValueError(f"Неизвестный режим расчёта: {mode}")
+
+    sensors = np.ascontiguousarray(sensors, dtype=np.float64).reshape(-1, 3)
+    cells = cell_geometry(mesh)
+    cells[6] = GRAVITATIONAL_CONSTANT
+    matrix = np.empty((len(sensors), len(mesh)))
+    if matrix.size == 0:
+        return matrix
+
+    rows = max(1, chunk_size // len(mesh))
+    for start in range(0, len(sensors), rows):
+        block = sensors[start:start + rows]
+        if mode == 'exact':
+            matrix[start:start + rows] = anomaly_terms(block, cells)
+        else:
+            matrix[start:start + rows] = _point_mass_block(block, cells)[0]
+
+    if mode == 'hybrid':
+        sensor_index, cell_index = near_field_pairs(sensors, np.asarray(mesh.center),
+                                                    far_field_radius(np.asarray(mesh.bound).T, rel_tol))
+        matrix[sensor_index, cell_index] = pair_terms(sensors, cells, sensor_index, cell_index, chunk_size)
+    return matrix
+
+
+def compare_with_reference(values: np.ndarray, reference: np.ndarray) -> dict[str, float]:
+    """Максимальные абсолютное и относительное расхождения с эталоном"""
+    difference = np.abs(values - reference)
+    scale = np.max(np.abs(reference), initial=0.0) or 1.0
+    return {
+        'max_abs': float(np.max(difference, initial=0.0)),
+        'max_rel': float(np.max(difference, initial=0.0) / scale)
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Расчёт аномалии Δg по сетке (как DirectTaskService)',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('mesh', help='Файл сетки (JSON или .gxm)')
+    parser.add_argument('sensors', nargs='?', help='Файл сенсоров; по умолчанию сенсоры из файла сетки')
+    parser.add_argument('-o', '--output', default='anomaly_data.json', help='Выходной файл сенсоров со значениями')
+    parser.add_argument('--base-density', type=float, default=0.0, help='Фоновая плотность ρ_base')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='Число пар (сенсор, ячейка) в одном блоке')
+    parser.add_argument('-j', '--workers', type=int, help='Число процессов (по умолчанию — все ядра)')
+    parser.add_argument('--mode', choices=KERNEL_MODES, default='exact',
+                        help='exact — интеграл для всех пар, hybrid — точечные массы в дальней зоне')
+    parser.add_argument('--rel-tol', type=float, default=DEFAULT_REL_TOL,
+                        help='Допустимая погрешность точечной массы относительно притяжения ячейки')
+    parser.add_argument('--validate', type=int, default=0,
+                        help='Проверить гибридный расчёт точным на N случайных сенсорах')
+    parser.add_argument('--check', help='Эталонный файл аномалии (вывод C#) для сверки')
+    parser.add_argument('--rtol', type=float, default=1e-9, help='Допустимое относительное расхождение')
+    parser.add_argument('--plot', help='Сохранить карту аномалии в изображение')
+
+    args = parser.parse_args()
+
+    mesh = load_mesh(args.mesh)
+    coords = load_sensors(args.sensors)[0] if args.sensors else mesh.sensors
+    if args.check and not args.sensors:
+        coords = load_sensors(args.check)[0]
+    if len(coords) == 0:
+        print("Ошибка: нет сенсоров для расчёта")
+        exit(1)
+
+    start = time.perf_counter()
+    if args.mode == 'hybrid':
+        result = compute_anomaly_hybrid(mesh, coords, args.base_density, args.rel_tol, args.chunk_size, args.workers)
+        values = result.values
+    else:
+        values = compute_anomaly(mesh, coords, args.base_density, args.chunk_size, args.workers)
+    print(f"Сенсоров: {len(coords)}, ячеек: {len(mesh)}, время: {time.perf_counter() - start:.3f} c")
+
+    if args.mode == 'hybrid':
+        print(f"Ближних пар: {result.near_pairs} из {result.total_pairs} ({100 * result.near_fraction:.2f}%)")
+        print(f"Оценка погрешности дальней зоны: {result.relative_error_bound():.3e} от max|Δg|")
+
+        if args.validate:
+            sample = np.random.default_rng(0).choice(len(coords), min(args.validate, len(coords)), replace=False)
+            exact = compute_anomaly(mesh, coords[sample], args.base_density, args.chunk_size, args.workers)
+            actual = np.abs(values[sample] - exact)
+            print(f"Фактическая погрешность на {len(sample)} сенсорах: "
+                  f"{np.max(actual) / (np.max(np.abs(exact)) or 1.0):.3e} от max|Δg|, "
+                  f"доля оценки: {np.max(actual / np.maximum(result.error_bound[sample], 1e-300)):.3f}")
+
+    save_sensors(args.output, coords, values)
+    print(f"Сохранено: {args.output}")
+
+    if args.plot:
+        import anomaly_chart
+
+        anomaly_chart.plot_sensors(coords, values, output_image=args.plot)
+
+    if args.check:
+        reference_coords, reference = load_sensors(args.check)
+        if reference is None or len(reference) != len(values) or not np.allclose(reference_coords, coords):
+            print("Ошибка: эталон не совпадает с сенсорами расчёта")
+            exit(1)
+        report = compare_with_reference(values, reference)
+        print(f"Расхождение с эталоном: абсолютное {report['max_abs']:.3e}, относительное {report['max_rel']:.3e}")
+        if report['max_rel'] > args.rtol:
+            print("Ошибка: расхождение превышает допустимое", file=sys.stderr)
+            exit(1)
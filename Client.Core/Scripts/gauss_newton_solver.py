@@ -0,0 +1,254 @@
+"""Шаг Гаусса–Ньютона без формирования JᵀJ.
+
+Решает ту же систему, что GaussNewtonInversionService.Invert:
+
+    (JᵀJ + D)·δ = Jᵀ·r,   r = g_obs − g_calc,
+
+где D — диагональ регуляризации: effectiveLambda для всех ячеек (первый
+порядок) плюс effectiveLambda·SecondOrderRegularizationLambdaMultiplier для
+ячеек с |p[i−1] − 2p[i] + p[i+1]| > GradientThreshold (второй порядок).
+LSQR работает с расширенной системой [J; √D]·δ ≈ [r; 0], CG — с нормальными
+уравнениями и предобуславливателем Якоби. Нужны только J·v и Jᵀ·u, которые
+считаются блоками строк, поэтому J может лежать в np.memmap.
+"""
+import argparse
+import json
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+import numpy as np
+
+from mesh_loader import load_mesh, load_sensors, save_mesh_binary
+
+SOLVER_METHODS = ('lsqr', 'cg', 'dense')
+
+# Число элементов J в одном блоке строк при умножениях
+DEFAULT_BLOCK_SIZE = 1 << 22
+
+
+@dataclass(frozen=True)
+class InverseOptions:
+    """Параметры регуляризации из Common/Models/InverseOptions.cs"""
+    base_lambda: float = 0.0
+    min_lambda: float = 0.0
+    lambda_decay: float = 1.0
+    use_tikhonov_first_order: bool = False
+    use_tikhonov_second_order: bool = False
+    second_order_multiplier: float = 1.0
+    auto_adjust_regularization: bool = False
+    gradient_threshold: float = 0.0
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'InverseOptions':
+        """Из JSON в формате C# (inverse_options.json)"""
+        defaults = cls()
+        return cls(
+            base_lambda=data.get('Lambda', defaults.base_lambda),
+            min_lambda=data.get('MinLambda', defaults.min_lambda),
+            lambda_decay=data.get('LambdaDecay', defaults.lambda_decay),
+            use_tikhonov_first_order=data.get('UseTikhonovFirstOrder', defaults.use_tikhonov_first_order),
+            use_tikhonov_second_order=data.get('UseTikhonovSecondOrder', defaults.use_tikhonov_second_order),
+            second_order_multiplier=data.get('SecondOrderRegularizationLambdaMultiplier',
+                                             defaults.second_order_multiplier),
+            auto_adjust_regularization=data.get('AutoAdjustRegularization', defaults.auto_adjust_regularization),
+            gradient_threshold=data.get('GradientThreshold', defaults.gradient_threshold)
+        )
+
+    @classmethod
+    def load(cls, file_path: str) -> 'InverseOptions':
+        with open(file_path, 'r', encoding='utf-8-sig') as f:
+            return cls.from_dict(json.load(f))
+
+
+@dataclass(frozen=True)
+class StepReport:
+    """Сводка одного шага"""
+    method: str
+    iterations: int
+    residual_norm: float  # ‖r‖ до шага
+    regularized_norm: float  # ‖[J; √D]·δ − [r; 0]‖ после шага
+    normal_residual: float  # ‖Jᵀr − (JᵀJ + D)·δ‖ / ‖Jᵀr‖
+    effective_lambda: float
+    seconds: float
+
+
+def effective_lambda(options: InverseOptions, iteration: int) -> float:
+    """λ с затуханием по итерациям, как в Invert"""
+    value = options.base_lambda
+    if options.auto_adjust_regularization:
+        value = max(options.base_lambda * options.lambda_decay ** iteration, options.min_lambda)
+    return value
+
+
+def regularization_diagonal(parameters: np.ndarray, options: InverseOptions, lam: float) -> np.ndarray:
+    """Диагональ D, добавляемая к JᵀJ"""
+    diagonal = np.zeros(len(parameters))
+    if options.use_tikhonov_first_order:
+        diagonal += lam
+    if options.use_tikhonov_second_order and len(parameters) > 2:
+        curvature = parameters[:-2] - 2 * parameters[1:-1] + parameters[2:]
+        diagonal[1:-1] += np.where(np.abs(curvature) > options.gradient_threshold,
+                                   lam * options.second_order_multiplier, 0.0)
+    return diagonal
+
+
+class BlockedJacobian:
+    """Умножения J·v и Jᵀ·u блоками строк (J в памяти или в np.memmap)"""
+
+    def __init__(self, jacobian: np.ndarray, block_size: int = DEFAULT_BLOCK_SIZE):
+        self.jacobian = jacobian
+        self.shape = jacobian.shape
+        self.rows = max(1, block_size // max(1, jacobian.shape[1]))
+        self.products = 0
+
+    def _blocks(self):
+        for start in range(0, self.shape[0], self.rows):
+            yield start, np.asarray(self.jacobian[start:start + self.rows], dtype=np.float64)
+
+    def matvec(self, v: np.ndarray) -> np.ndarray:
+        self.products += 1
+        out = np.empty(self.shape[0])
+        for start, block in self._blocks():
+            out[start:start + len(block)] = block @ v
+        return out
+
+    def rmatvec(self, u: np.ndarray) -> np.ndarray:
+        self.products += 1
+        out = np.zeros(self.shape[1])
+        for start, block in self._blocks():
+            out += block.T @ u[start:start + len(block)]
+        return out
+
+    def column_norms2(self) -> np.ndarray:
+        """diag(JᵀJ) для предобуславливателя Якоби"""
+        out = np.zeros(self.shape[1])
+        for _, block in self._blocks():
+            out += np.einsum('ij,ij->j', block, block)
+        return out
+
+
+def _solve_lsqr(operator: BlockedJacobian, residual, diagonal, tol, max_iter):
+    from scipy.sparse.linalg import LinearOperator, lsqr
+
+    m, n = operator.shape
+    root = np.sqrt(diagonal)
+    stacked = LinearOperator(
+        (m + n, n),
+        matvec=lambda v: np.concatenate([operator.matvec(v), root * v]),
+        rmatvec=lambda u: operator.rmatvec(u[:m]) + root * u[m:],
+        dtype=np.float64
+    )
+    result = lsqr(stacked, np.concatenate([residual, np.zeros(n)]), atol=tol, btol=tol, iter_lim=max_iter)
+    return result[0], int(result[2])
+
+
+def _solve_cg(operator: BlockedJacobian, gradient, diagonal, tol, max_iter):
+    from scipy.sparse.linalg import LinearOperator, cg
+
+    n = operator.shape[1]
+    normal = LinearOperator((n, n), matvec=lambda v: operator.rmatvec(operator.matvec(v)) + diagonal * v,
+                            dtype=np.float64)
+    preconditioner = operator.column_norms2() + diagonal
+    preconditioner[preconditioner <= 0] = 1.0
+    jacobi = LinearOperator((n, n), matvec=lambda v: v / preconditioner, dtype=np.float64)
+
+    iterations = 0
+
+    def count(_):
+        nonlocal iterations
+        iterations += 1
+
+    delta, _ = cg(normal, gradient, rtol=tol, maxiter=max_iter, M=jacobi, callback=count)
+    return delta, iterations
+
+
+def _solve_dense(operator: BlockedJacobian, gradient, diagonal):
+    """Как в C#: явная JᵀJ и прямое решение (для сверки на небольших задачах)"""
+    normal = np.zeros((operator.shape[1], operator.shape[1]))
+    for _, block in operator._blocks():
+        normal += block.T @ block
+    normal[np.diag_indices_from(normal)] += diagonal
+    return np.linalg.solve(normal, gradient), 1
+
+
+def solve_step(
+        jacobian: np.ndarray,
+        model_values: np.ndarray,
+        observed_values: np.ndarray,
+        parameters: np.ndarray,
+        options: InverseOptions,
+        iteration: int,
+        method: str = 'lsqr',
+        tol: float = 1e-8,
+        max_iter: Optional[int] = None,
+        block_size: int = DEFAULT_BLOCK_SIZE
+) -> tuple[np.ndarray, StepReport]:
+    """Обновлённые параметры p + δ и сводка шага"""
+    if method not in SOLVER_METHODS:
+        raise ValueError(f"Неизвестный метод решения: {method}")
+
+    start = time.perf_counter()
+    parameters = np.asarray(parameters, dtype=np.float64)
+    residual = np.asarray(observed_values, dtype=np.float64) - np.asarray(model_values, dtype=np.float64)
+    lam = effective_lambda(options, iteration)
+    diagonal = regularization_diagonal(parameters, options, lam)
+
+    operator = BlockedJacobian(jacobian, block_size)
+    gradient = operator.rmatvec(residual)
+
+    if method == 'lsqr':
+        delta, iterations = _solve_lsqr(operator, residual, diagonal, tol, max_iter)
+    elif method == 'cg':
+        delta, iterations = _solve_cg(operator, gradient, diagonal, tol, max_iter)
+    else:
+        delta, iterations = _solve_dense(operator, gradient, diagonal)
+
+    # Контроль: невязки расширенной и нормальной систем
+    fitted = operator.matvec(delta)
+    normal = operator.rmatvec(fitted) + diagonal * delta
+    report = StepReport(
+        method=method,
+        iterations=iterations,
+        residual_norm=float(np.linalg.norm(residual)),
+        regularized_norm=float(np.sqrt(np.sum((fitted - residual) ** 2) + np.sum(diagonal * delta * delta))),
+        normal_residual=float(np.linalg.norm(gradient - normal) / (np.linalg.norm(gradient) or 1.0)),
+        effective_lambda=lam,
+        seconds=time.perf_counter() - start
+    )
+    return parameters + delta, report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Один шаг Гаусса–Ньютона по готовому Якобиану',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('jacobian', help='Матрица Якобиана (.npy, открывается через np.memmap)')
+    parser.add_argument('mesh', help='Текущая сетка (JSON или .gxm), плотности — параметры модели')
+    parser.add_argument('observed', help='Наблюдённая аномалия (файл сенсоров)')
+    parser.add_argument('model', help='Расчётная аномалия текущей модели (файл сенсоров)')
+    parser.add_argument('--options', default='Properties/inverse_options.json', help='InverseOptions в формате C#')
+    parser.add_argument('--iteration', type=int, default=0, help='Номер итерации для затухания λ')
+    parser.add_argument('--method', choices=SOLVER_METHODS, default='lsqr')
+    parser.add_argument('--tol', type=float, default=1e-8)
+    parser.add_argument('--max-iter', type=int)
+    parser.add_argument('-o', '--output', default='updated.gxm', help='Сетка с обновлёнными плотностями')
+
+    args = parser.parse_args()
+
+    mesh = load_mesh(args.mesh)
+    jacobian = np.load(args.jacobian, mmap_mode='r')
+    _, observed = load_sensors(args.observed)
+    _, model = load_sensors(args.model)
+    if observed is None or model is None:
+        print("Ошибка: в файлах сенсоров нет значений")
+        exit(1)
+    if jacobian.shape != (len(observed), len(mesh)):
+        print(f"Ошибка: размер Якобиана {jacobian.shape} не совпадает с ({len(observed)}, {len(mesh)})")
+        exit(1)
+
+    parameters, step = solve_step(jacobian, model, observed, mesh.density, InverseOptions.load(args.options),
+                                  args.iteration, args.method, args.tol, args.max_iter)
+    save_mesh_binary(mesh.with_density(parameters), args.output)
+    print(json.dumps(asdict(step), ensure_ascii=False))
@@ -1,26 +1,69 @@
-import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 import matplotlib.pyplot as plt
 import numpy as np
+from matplotlib.collections import PolyCollection
 from matplotlib.widgets import Button
-from matplotlib.patches import Rectangle
 from mpl_toolkits.mplot3d import Axes3D
+from mpl_toolkits.mplot3d.art3d import Poly3DCollection
+
+from mesh_geometry import FACES_PER_CELL, cell_corners, cell_faces, projection_rectangles
+from mesh_loader import MeshData, load_mesh
+from mesh_lod import DEFAULT_RENDER_BUDGET, reduce_to_budget
+from projection_raster import rasterize_projection
+from slice_index import SliceIndex
+from voxel_export import mesh_surfaces, plot_surfaces
+
+# Число шагов среза на весь диапазон оси (как у кнопок X±/Y±/Z±)
+SLICE_STEPS = 20
+
+# Панели срезов: ось сечения -> оси панели
+SLICE_PANELS = {'z': ('X', 'Y'), 'x': ('Y', 'Z'), 'y': ('X', 'Z')}
+
+
+class SliceCache:
+    """LRU-кэш готовой геометрии срезов, безопасный для фоновых потоков"""
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
 
-def load_mesh(filepath):
-    try:
-        with open(filepath, 'r') as f:
-            data = json.load(f)
-        return data.get('Cells', [])
-    except Exception as e:
-        print(f"Ошибка загрузки файла: {e}")
-        return []
 
 class InteractiveSliceViewer:
-    def __init__(self, cells):
-        if not cells:
-            print("Нет данных для визуализации!")
-            return
+    def __init__(self, mesh: MeshData, workers: int = None, cache_size: int = 128,
+                 render_mode: str = 'patches', resolution: int = 512,
+                 render_budget: int = DEFAULT_RENDER_BUDGET, show: bool = True, surface_levels=None):
+        if len(mesh) == 0:
+            raise ValueError("Нет данных для визуализации")
 
-        self.cells = cells
+        self.mesh = mesh
+        self.index = SliceIndex(mesh)
+        self.render_mode = render_mode
+        self.resolution = resolution
+        self.render_budget = render_budget
+        # Уровни изоповерхностей для 3D вида; None — ячейки
+        self.surface_levels = surface_levels
+        self._surfaces = None
+        self._plotted_3d = False
         self.fig = plt.figure(figsize=(18, 8))
 
         # Рассчет границ
@@ -28,35 +71,43 @@ class InteractiveSliceViewer:
         self.y_bounds = self._calculate_bounds('Y')
         self.z_bounds = self._calculate_bounds('Z')
 
-        # Инициализация срезов
-        self.current_slice = {
+        # Инициализация срезов: позиция хранится как номер шага от центра
+        self.slice_center = {
             'x': np.mean(self.x_bounds),
             'y': np.mean(self.y_bounds),
             'z': np.mean(self.z_bounds)
         }
+        self.slice_steps = {'x': 0, 'y': 0, 'z': 0}
+        self.current_slice = dict(self.slice_center)
+
+        # Фоновый расчёт всех позиций срезов — только для интерактивного окна,
+        # без него рисуются лишь текущие срезы
+        self.cache = SliceCache(cache_size)
+        self._pending = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers or min(4, os.cpu_count() or 1))
+        if show:
+            self._precompute_slices()
 
         # Создание графиков
         self.ax_3d = self.fig.add_subplot(144, projection='3d')
         self.ax_xy = self.fig.add_subplot(141)
         self.ax_yz = self.fig.add_subplot(142)
         self.ax_xz = self.fig.add_subplot(143)
+        self.panel_axes = {'z': self.ax_xy, 'x': self.ax_yz, 'y': self.ax_xz}
+        self.panel_artists = {}
 
         self._create_controls()
         self.update_all_plots()
-        plt.show()
+        if show:
+            plt.show()
+            self.close()
+
+    def close(self):
+        """Останавливает фоновый расчёт срезов"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
 
     def _calculate_bounds(self, axis):
-        min_val = max_val = None
-        for cell in self.cells:
-            center = cell[f"Center{axis}"]
-            bound = cell[f"Bound{axis}"]
-            low = center - bound
-            high = center + bound
-            if min_val is None or low < min_val:
-                min_val = low
-            if max_val is None or high > max_val:
-                max_val = high
-        return (min_val, max_val) if min_val is not None else (0, 1)
+        return self.index.bounds(axis)
 
     def _create_controls(self):
         plt.subplots_adjust(left=0.1, right=0.9, bottom=0.25, top=0.95)
@@ -79,17 +130,73 @@ class InteractiveSliceViewer:
         self.buttons['z+'].on_clicked(lambda e: self.adjust_slice('z', 1))
         self.buttons['z-'].on_clicked(lambda e: self.adjust_slice('z', -1))
 
+    def _step(self, axis):
+        low, high = self.__getattribute__(f'{axis}_bounds')
+        return (high - low) / SLICE_STEPS
+
+    def _slice_position(self, axis, steps):
+        return float(np.clip(self.slice_center[axis] + steps * self._step(axis),
+                             *self.__getattribute__(f'{axis}_bounds')))
+
     def adjust_slice(self, axis, direction):
-        step = (self.__getattribute__(f'{axis}_bounds')[1] -
-                self.__getattribute__(f'{axis}_bounds')[0]) / 20
-        new_val = self.current_slice[axis] + direction * step
-        self.current_slice[axis] = np.clip(new_val, *self.__getattribute__(f'{axis}_bounds'))
-        self.update_all_plots()
+        max_steps = SLICE_STEPS // 2
+        self.slice_steps[axis] = int(np.clip(self.slice_steps[axis] + direction, -max_steps, max_steps))
+        self.current_slice[axis] = self._slice_position(axis, self.slice_steps[axis])
+        self._plot_projection(axis)
+        self.fig.canvas.draw_idle()
 
     def _filter_cells(self, axis, value):
-        return [cell for cell in self.cells
-                if (cell[f"Center{axis}"] - cell[f"Bound{axis}"] <= value <=
-                    cell[f"Center{axis}"] + cell[f"Bound{axis}"])]
+        return self.mesh.subset(self.index.query(axis, value))
+
+    def _compute_slice(self, axis, steps):
+        """Геометрия и цвета среза: чистый NumPy, выполняется в фоновых потоках"""
+        x_axis, y_axis = SLICE_PANELS[axis]
+        plane = (x_axis + y_axis).lower()
+        cells = self._filter_cells(axis.upper(), self._slice_position(axis, steps))
+
+        if self.render_mode == 'raster':
+            if len(cells) == 0:
+                return np.full((1, 1), np.nan), (0, 1, 0, 1), (0, 1)
+            extent = (*self.__getattribute__(f"{x_axis.lower()}_bounds"),
+                      *self.__getattribute__(f"{y_axis.lower()}_bounds"))
+            image, extent = rasterize_projection(cells, plane, resolution=self.resolution,
+                                                 reducer='max', extent=extent)
+            return image, extent, (cells.density.min(), cells.density.max())
+
+        if len(cells) == 0:
+            return np.empty((0, 4, 2)), np.empty((0, 4))
+
+        min_d, max_d = cells.density.min(), cells.density.max()
+        range_d = max_d - min_d if max_d != min_d else 1.0
+        colors = plt.cm.gray(1 - (cells.density - min_d) / range_d)
+        colors[:, 3] = 0.7
+
+        return projection_rectangles(cells, plane), colors
+
+    def _precompute_slices(self):
+        max_steps = SLICE_STEPS // 2
+        for axis in SLICE_PANELS:
+            for steps in sorted(range(-max_steps, max_steps + 1), key=abs):
+                key = (axis, steps)
+                self._pending[key] = self._executor.submit(self._cache_slice, key)
+
+    def _cache_slice(self, key):
+        value = self._compute_slice(*key)
+        self.cache.put(key, value)
+        return value
+
+    def _get_slice(self, axis, steps):
+        key = (axis, steps)
+        value = self.cache.get(key)
+        if value is not None:
+            return value
+
+        future = self._pending.get(key)
+        if future is not None and not future.cancelled():
+            value = future.result()
+            self.cache.put(key, value)
+            return value
+        return self._cache_slice(key)
 
     def _set_square_aspect(self, ax, x_range, y_range):
         """Устанавливает квадратное соотношение осей с разными диапазонами"""
@@ -97,62 +204,80 @@ class InteractiveSliceViewer:
         # Или для более старых версий:
         # ax.set_aspect(y_range / x_range, adjustable='datalim')
 
-    def _plot_projection(self, ax, cells, x_axis, y_axis, fixed_axis):
-        ax.clear()
-
-        if not cells:
-            ax.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
-            return
+    def _create_panel(self, axis):
+        """Оси и артисты панели создаются один раз, дальше меняются только данные"""
+        ax = self.panel_axes[axis]
+        x_axis, y_axis = SLICE_PANELS[axis]
 
         # Рассчет диапазонов для осей
         x_min, x_max = self.__getattribute__(f"{x_axis.lower()}_bounds")
         y_min, y_max = self.__getattribute__(f"{y_axis.lower()}_bounds")
-        x_range = x_max - x_min
-        y_range = y_max - y_min
 
         # Установка квадратного соотношения
-        self._set_square_aspect(ax, x_range, y_range)
-
-        densities = [c["Density"] for c in cells]
-        min_d, max_d = min(densities), max(densities)
-        range_d = max_d - min_d if max_d != min_d else 1.0
-
-        for cell in cells:
-            x = cell[f"Center{x_axis}"] - cell[f"Bound{x_axis}"]
-            y = cell[f"Center{y_axis}"] - cell[f"Bound{y_axis}"]
-            width = 2 * cell[f"Bound{x_axis}"]
-            height = 2 * cell[f"Bound{y_axis}"]
+        self._set_square_aspect(ax, x_max - x_min, y_max - y_min)
 
-            color_value = 1 - (cell["Density"] - min_d) / range_d
-            rect = Rectangle((x, y), width, height,
-                             edgecolor='k', facecolor=plt.cm.gray(color_value), alpha=0.7)
-            ax.add_patch(rect)
+        if self.render_mode == 'raster':
+            collection = ax.imshow(np.full((1, 1), np.nan), origin='lower', cmap='gray_r',
+                                   interpolation='nearest', alpha=0.7, aspect='auto')
+        else:
+            collection = PolyCollection([], edgecolors='k')
+            ax.add_collection(collection)
+        empty_label = ax.text(0.5, 0.5, 'Нет данных', ha='center', va='center',
+                              transform=ax.transAxes, visible=False)
 
         ax.set_xlabel(x_axis)
         ax.set_ylabel(y_axis)
-        ax.set_title(f"{x_axis}{y_axis} Срез ({fixed_axis} = {self.current_slice[fixed_axis.lower()]:.2f})")
         ax.set_xlim(x_min, x_max)
         ax.set_ylim(y_min, y_max)
         ax.grid(True)
+        self.panel_artists[axis] = (collection, empty_label)
+
+    def _plot_projection(self, axis):
+        """Перерисовка одной панели для сдвинутой оси"""
+        if axis not in self.panel_artists:
+            self._create_panel(axis)
+
+        ax = self.panel_axes[axis]
+        x_axis, y_axis = SLICE_PANELS[axis]
+        collection, empty_label = self.panel_artists[axis]
+
+        data = self._get_slice(axis, self.slice_steps[axis])
+        if self.render_mode == 'raster':
+            image, extent, clim = data
+            collection.set_data(image)
+            collection.set_extent(extent)
+            collection.set_clim(*clim)
+            empty_label.set_visible(bool(np.isnan(image).all()))
+        else:
+            verts, colors = data
+            collection.set_verts(verts)
+            collection.set_facecolor(colors)
+            empty_label.set_visible(len(verts) == 0)
+
+        ax.set_title(f"{x_axis}{y_axis} Срез ({axis.upper()} = {self.current_slice[axis]:.2f})")
 
     def _plot_3d(self):
         self.ax_3d.clear()
-        densities = [c["Density"] for c in self.cells]
-        min_d, max_d = min(densities), max(densities)
-
-        for cell in self.cells:
-            x = cell["CenterX"]
-            y = cell["CenterY"]
-            z = cell["CenterZ"]
-            dx = cell["BoundX"] * 2
-            dy = cell["BoundY"] * 2
-            dz = cell["BoundZ"] * 2
+        min_d, max_d = self.mesh.density.min(), self.mesh.density.max()
+        range_d = max_d - min_d if max_d != min_d else 1.0
 
-            color_value = 1 - (cell["Density"] - min_d) / (max_d - min_d)
-            color = plt.cm.gray(color_value)
+        if self.surface_levels is not None:
+            # Изоповерхности плотности вместо ячеек, считаются один раз
+            if self._surfaces is None:
+                self._surfaces = mesh_surfaces(self.mesh, self.surface_levels)
+            plot_surfaces(self.ax_3d, self._surfaces, plt.cm.gray_r, plt.Normalize(min_d, min_d + range_d))
+        else:
+            # Уровень детализации по бюджету отрисовки, все грани одной коллекцией
+            visible = reduce_to_budget(self.mesh, self.render_budget)
+            colors = plt.cm.gray(1 - (visible.density - min_d) / range_d)
+            colors[:, 3] = 0.3
 
-            self.ax_3d.bar3d(x - cell["BoundX"], y - cell["BoundY"], z - cell["BoundZ"],
-                             dx, dy, dz, color=color, alpha=0.3, edgecolor='k')
+            self.ax_3d.add_collection3d(Poly3DCollection(
+                cell_faces(cell_corners(visible)),
+                facecolors=np.repeat(colors, FACES_PER_CELL, axis=0),
+                edgecolors='k',
+                linewidths=0.5
+            ))
 
         self.ax_3d.set_xlim(*self.x_bounds)
         self.ax_3d.set_ylim(*self.y_bounds)
@@ -161,21 +286,27 @@ class InteractiveSliceViewer:
         self.ax_3d.set_ylabel('Y')
         self.ax_3d.set_zlabel('Z')
         self.ax_3d.set_title('3D View')
+        self._plotted_3d = True
 
     def update_all_plots(self):
         # Обновление 2D проекций
-        self._plot_projection(self.ax_xy, self._filter_cells('Z', self.current_slice['z']), 'X', 'Y', 'Z')
-        self._plot_projection(self.ax_yz, self._filter_cells('X', self.current_slice['x']), 'Y', 'Z', 'X')
-        self._plot_projection(self.ax_xz, self._filter_cells('Y', self.current_slice['y']), 'X', 'Z', 'Y')
+        for axis in SLICE_PANELS:
+            self._plot_projection(axis)
 
-        # Обновление 3D вида
-        self._plot_3d()
+        # 3D вид не зависит от положения срезов и строится один раз
+        if not self._plotted_3d:
+            self._plot_3d()
 
         self.fig.canvas.draw_idle()
 
 if __name__ == '__main__':
-    cells = load_mesh('inverse.json')
-    if cells:
-        InteractiveSliceViewer(cells)
+    try:
+        mesh = load_mesh(sys.argv[1] if len(sys.argv) > 1 else 'inverse.json')
+    except Exception as e:
+        print(f"Ошибка загрузки файла: {e}")
+        mesh = None
+
+    if mesh is not None and len(mesh):
+        InteractiveSliceViewer(mesh)
     else:
         print("Ошибка: Не удалось загрузить данные")
\ No newline at end of file
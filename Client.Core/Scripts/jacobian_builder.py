@@ -0,0 +1,273 @@
+"""Матрица Якобиана ∂Δg/∂ρ [сенсоры × ячейки] блоками строк.
+
+Элементы зависят только от геометрии сенсоров и ячеек, поэтому столбцы
+кэшируются по хэшу геометрии ячейки: после прохода MeshRefinerService
+пересчитываются только новые и изменённые ячейки. Матрица может храниться
+во float32 и записываться сразу в .npy файл через np.memmap. Кэш с файлом
+тоже хранит столбцы в .npy рядом с ним и читается блоками строк, так что
+ни матрица, ни кэш целиком в память не попадают.
+"""
+import argparse
+import hashlib
+import os
+import time
+from typing import Optional
+
+import numpy as np
+
+import forward_model
+from mesh_loader import MeshData, load_mesh, load_sensors
+
+# JacobianService.ComputePartialDerivative
+JACOBIAN_GRAVITATIONAL_CONSTANT = 6.67430e-11
+MIN_DISTANCE = 1e-6
+
+JACOBIAN_KERNELS = ('point_mass', 'exact', 'hybrid')
+
+# Число элементов матрицы в одном блоке строк
+DEFAULT_BLOCK_SIZE = 1 << 22
+
+
+def point_mass_derivatives(sensors: np.ndarray, mesh: MeshData) -> np.ndarray:
+    """Производные как в JacobianService: G·V/r³, V = BoundX·BoundY·BoundZ"""
+    center = np.asarray(mesh.center)
+    dx = sensors[:, 0:1] - center[:, 0]
+    dy = sensors[:, 1:2] - center[:, 1]
+    dz = sensors[:, 2:3] - center[:, 2]
+    r_squared = dx * dx + dy * dy + dz * dz
+    # Как в C#: ограничивается только r, квадрат расстояния остаётся прежним
+    r = np.maximum(np.sqrt(r_squared), MIN_DISTANCE)
+    volume = np.prod(np.asarray(mesh.bound), axis=1)
+    return JACOBIAN_GRAVITATIONAL_CONSTANT * volume / (r_squared * r)
+
+
+def _kernel_block(sensors: np.ndarray, mesh: MeshData, kernel: str, rel_tol: float) -> np.ndarray:
+    if kernel == 'point_mass':
+        return point_mass_derivatives(sensors, mesh)
+    return forward_model.sensitivity_matrix(mesh, sensors, mode=kernel, rel_tol=rel_tol)
+
+
+def _mix64(values: np.ndarray) -> np.ndarray:
+    """Перемешивание битов splitmix64 (переполнение uint64 ожидаемо)"""
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def geometry_hashes(mesh: MeshData) -> np.ndarray:
+    """64-битный хэш центра и размеров каждой ячейки, форма (N,)"""
+    columns = np.column_stack([mesh.center, mesh.bound]).astype(np.float64)
+    # +0.0 приводит -0.0 к 0.0, чтобы одинаковая геометрия давала одинаковый хэш
+    bits = np.ascontiguousarray(columns + 0.0).view(np.uint64)
+    hashes = np.zeros(len(mesh), dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for k in range(bits.shape[1]):
+            hashes = _mix64(hashes ^ (bits[:, k] + np.uint64(0x9E3779B97F4A7C15) * np.uint64(k + 1)))
+    return hashes
+
+
+def sensors_digest(sensors: np.ndarray, kernel: str, rel_tol: float) -> str:
+    """Ключ набора сенсоров и ядра: при его смене кэш столбцов недействителен"""
+    digest = hashlib.sha1(np.ascontiguousarray(sensors, dtype=np.float64).tobytes())
+    digest.update(f"{kernel}:{rel_tol!r}".encode())
+    return digest.hexdigest()
+
+
+class ColumnCache:
+    """Столбцы Якобиана по хэшу геометрии ячейки для одного набора сенсоров.
+
+    С file_path ключи хранятся в .npz, а столбцы — в соседнем .npy (np.memmap),
+    который перезаписывается блоками строк; без файла столбцы копируются в память.
+    """
+
+    def __init__(self, file_path: Optional[str] = None):
+        self.file_path = file_path
+        self.digest = None
+        self.keys = np.empty(0, dtype=np.uint64)  # отсортированы
+        self.columns = np.empty((0, 0))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def columns_path(self) -> Optional[str]:
+        return f"{os.path.splitext(self.file_path)[0]}_columns.npy" if self.file_path else None
+
+    def lookup(self, digest: str, hashes: np.ndarray) -> np.ndarray:
+        """Номер столбца в кэше для каждой ячейки или -1"""
+        if digest != self.digest or len(self.keys) == 0:
+            return np.full(len(hashes), -1)
+        position = np.minimum(np.searchsorted(self.keys, hashes), len(self.keys) - 1)
+        return np.where(self.keys[position] == hashes, position, -1)
+
+    def replace(self, digest: str, hashes: np.ndarray, matrix: np.ndarray, block_size: int = DEFAULT_BLOCK_SIZE):
+        """Кэш становится столбцами текущей сетки: устаревшие ячейки отбрасываются"""
+        keys, first = np.unique(hashes, return_index=True)
+        if self.file_path is None:
+            self.columns = np.array(matrix[:, first])
+        else:
+            # Новый файл столбцов пишется рядом и подменяет старый целиком
+            temporary = f"{self.columns_path}.tmp"
+            columns = np.lib.format.open_memmap(temporary, mode='w+', dtype=matrix.dtype,
+                                                shape=(matrix.shape[0], len(keys)))
+            rows = max(1, block_size // max(1, len(keys)))
+            for start in range(0, matrix.shape[0], rows):
+                columns[start:start + rows] = matrix[start:start + rows][:, first]
+            columns.flush()
+            del columns
+            self.columns = np.empty((0, 0))
+            os.replace(temporary, self.columns_path)
+            self.columns = np.load(self.columns_path, mmap_mode='r')
+        self.digest = digest
+        self.keys = keys
+        if self.file_path is not None:
+            self.save()
+
+    def save(self):
+        """Ключи и ключ сенсоров; столбцы уже лежат в columns_path"""
+        with open(self.file_path, 'wb') as f:
+            np.savez(f, digest=np.array(self.digest or ''), keys=self.keys)
+
+    @classmethod
+    def load(cls, file_path: str) -> 'ColumnCache':
+        """Кэш из файла; отсутствующий или несогласованный кэш — пустой"""
+        cache = cls(file_path)
+        try:
+            with np.load(file_path) as data:
+                digest, keys = str(data['digest']) or None, data['keys']
+            columns = np.load(cache.columns_path, mmap_mode='r')
+        except (OSError, KeyError, ValueError):
+            return cache
+        if columns.ndim == 2 and columns.shape[1] == len(keys):
+            cache.digest, cache.keys, cache.columns = digest, keys, columns
+        return cache
+
+
+def _allocate(shape: tuple[int, int], dtype, out: Optional[str]) -> np.ndarray:
+    if out is None:
+        return np.empty(shape, dtype=dtype)
+    return np.lib.format.open_memmap(out, mode='w+', dtype=dtype, shape=shape)
+
+
+def build_jacobian(
+        mesh: MeshData,
+        sensors: np.ndarray,
+        kernel: str = 'point_mass',
+        dtype=np.float64,
+        out: Optional[str] = None,
+        cache: Optional[ColumnCache] = None,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        rel_tol: float = forward_model.DEFAULT_REL_TOL
+) -> np.ndarray:
+    """Якобиан (M, N) блоками строк не более block_size элементов.
+
+    out — путь к .npy файлу: матрица пишется в np.memmap и не держится в памяти.
+    cache — столбцы уже посчитанных ячеек берутся из кэша, после расчёта кэш
+    обновляется столбцами текущей сетки.
+    """
+    if kernel not in JACOBIAN_KERNELS:
+        raise ValueError(f"Неизвестное ядро Якобиана: {kernel}")
+
+    sensors = np.ascontiguousarray(sensors, dtype=np.float64).reshape(-1, 3)
+    jacobian = _allocate((len(sensors), len(mesh)), dtype, out)
+    if jacobian.size == 0:
+        return jacobian
+
+    missing = np.arange(len(mesh))
+    if cache is not None:
+        digest = sensors_digest(sensors, kernel, rel_tol)
+        hashes = geometry_hashes(mesh)
+        found = cache.lookup(digest, hashes)
+        cached = np.flatnonzero(found >= 0)
+        missing = np.flatnonzero(found < 0)
+        rows = max(1, block_size // max(1, len(cached)))
+        for start in range(0, len(sensors) if len(cached) else 0, rows):
+            jacobian[start:start + rows, cached] = cache.columns[start:start + rows][:, found[cached]]
+
+    if len(missing):
+        cells = mesh if len(missing) == len(mesh) else mesh.subset(missing)
+        rows = max(1, block_size // len(missing))
+        for start in range(0, len(sensors), rows):
+            block = _kernel_block(sensors[start:start + rows], cells, kernel, rel_tol)
+            if len(missing) == len(mesh):
+                jacobian[start:start + rows] = block
+            else:
+                jacobian[start:start + rows, missing] = block
+
+    if cache is not None:
+        cache.replace(digest, hashes, jacobian, block_size)
+    if isinstance(jacobian, np.memmap):
+        jacobian.flush()
+    return jacobian
+
+
+def sensitivity(jacobian: np.ndarray, block_size: int = DEFAULT_BLOCK_SIZE) -> np.ndarray:
+    """Интегральная чувствительность ячеек: норма столбцов Якобиана"""
+    total = np.zeros(jacobian.shape[1])
+    rows = max(1, block_size // max(1, jacobian.shape[1]))
+    for start in range(0, jacobian.shape[0], rows):
+        block = np.asarray(jacobian[start:start + rows], dtype=np.float64)
+        total += np.einsum('ij,ij->j', block, block)
+    return np.sqrt(total)
+
+
+def plot_sensitivity(mesh: MeshData, values: np.ndarray, output_image: str = 'sensitivity.png',
+                     show: bool = False, **options):
+    """Карта чувствительности в раскладке show_plots_script (десятичный логарифм)"""
+    import show_plots_script
+
+    positive = values[values > 0]
+    floor = positive.min() if len(positive) else 1.0
+    show_plots_script.plot_cell_mesh(
+        mesh.with_density(np.log10(np.maximum(values, floor))),
+        output_image=output_image,
+        show=show,
+        value_label='lg S',
+        **options
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Построение матрицы Якобиана и карты чувствительности',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('mesh', help='Файл сетки (JSON или .gxm)')
+    parser.add_argument('sensors', nargs='?', help='Файл сенсоров; по умолчанию сенсоры из файла сетки')
+    parser.add_argument('--kernel', choices=JACOBIAN_KERNELS, default='point_mass',
+                        help='point_mass — как JacobianService, exact — интеграл призмы, hybrid — по зонам')
+    parser.add_argument('--rel-tol', type=float, default=forward_model.DEFAULT_REL_TOL,
+                        help='Допустимая погрешность ядра hybrid')
+    parser.add_argument('--float32', action='store_true', help='Хранить матрицу во float32')
+    parser.add_argument('-o', '--output', help='Записать матрицу в .npy файл (np.memmap)')
+    parser.add_argument('--cache', help='Файл кэша столбцов (.npz, столбцы — в соседнем _columns.npy), '
+                                        'читается и обновляется')
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE,
+                        help='Число элементов матрицы в блоке строк')
+    parser.add_argument('--plot', help='Сохранить карту чувствительности в изображение')
+
+    args = parser.parse_args()
+
+    mesh = load_mesh(args.mesh)
+    coords = load_sensors(args.sensors)[0] if args.sensors else mesh.sensors
+    if len(coords) == 0:
+        print("Ошибка: нет сенсоров для расчёта")
+        exit(1)
+
+    cache = None
+    if args.cache:
+        cache = ColumnCache.load(args.cache)
+        hits = np.count_nonzero(cache.lookup(sensors_digest(coords, args.kernel, args.rel_tol),
+                                             geometry_hashes(mesh)) >= 0)
+        print(f"Столбцов из кэша: {hits} из {len(mesh)}")
+
+    start = time.perf_counter()
+    jacobian = build_jacobian(mesh, coords, args.kernel, np.float32 if args.float32 else np.float64,
+                              args.output, cache, args.block_size, args.rel_tol)
+    elapsed = time.perf_counter() - start
+    print(f"Якобиан {jacobian.shape[0]}×{jacobian.shape[1]} ({jacobian.nbytes / 2 ** 20:.1f} МБ), "
+          f"время: {elapsed:.3f} c")
+
+    if args.plot:
+        plot_sensitivity(mesh, sensitivity(jacobian), output_image=args.plot)
+        print(f"Сохранено изображение: {args.plot}")
@@ -0,0 +1,189 @@
+"""Потоковое чтение больших массивов из JSON без загрузки всего документа.
+
+Файл читается кусками по CHUNK_SIZE символов. Верхний уровень — объект
+или массив; из объекта отдаются только элементы массивов с нужными
+ключами, остальные значения пропускаются сканированием скобок без
+разбора. Элементы разбираются по одному (json.JSONDecoder.raw_decode) и
+отдаются пачками по batch_size, поэтому в памяти одновременно не больше
+пачки словарей и одного куска файла. Колонки копятся в ColumnBuffer с
+удвоением ёмкости.
+"""
+import json
+import re
+from typing import Iterator, Optional, TextIO
+
+import numpy as np
+
+CHUNK_SIZE = 1 << 20
+DEFAULT_BATCH = 4096
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# Строки (с экранированием) и скобки — всё, что нужно для пропуска значения;
+# одиночная кавычка — строка, не поместившаяся в буфер
+_STRUCTURE = re.compile(r'"(?:[^"\\]|\\.)*"|"|[\[\]{}]')
+_DECODER = json.JSONDecoder()
+
+
+class _Scanner:
+    """Буфер поверх файла: позиция разбора и дочитывание следующих кусков"""
+
+    def __init__(self, f: TextIO, file_path: str):
+        self.f = f
+        self.file_path = file_path
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Дочитать кусок; разобранная часть буфера отбрасывается"""
+        if self.eof:
+            return False
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def error(self, message: str) -> ValueError:
+        return ValueError(f"Ошибка парсинга JSON в файле {self.file_path}: {message}")
+
+    def peek(self) -> str:
+        """Следующий значимый символ ('' в конце файла)"""
+        while True:
+            self.position = _WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.fill():
+                return ''
+
+    def expect(self, symbol: str):
+        if self.peek() != symbol:
+            raise self.error(f"ожидалось '{symbol}'")
+        self.position += 1
+
+    def decode(self):
+        """Одно значение целиком; недочитанное значение ждёт следующего куска"""
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise self.error("неожиданный конец файла")
+            # Число на границе куска могло оборваться
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.position = end
+            return value
+
+    def skip(self):
+        """Пропуск значения без построения объектов"""
+        if self.peek() not in '[{':
+            self.decode()
+            return
+        depth = 0
+        while True:
+            for match in _STRUCTURE.finditer(self.buffer, self.position):
+                token = match.group()
+                if token == '"':
+                    # Строка оборвана концом буфера — дочитываем с её начала
+                    break
+                self.position = match.end()
+                if token in '[{':
+                    depth += 1
+                elif token in ']}':
+                    depth -= 1
+                    if depth == 0:
+                        return
+            else:
+                # Хвост буфера без скобок и строк уже не нужен
+                self.position = len(self.buffer)
+            if not self.fill():
+                raise self.error("неожиданный конец файла")
+
+    def items(self, batch_size: int) -> Iterator[list]:
+        """Элементы массива в текущей позиции пачками"""
+        self.expect('[')
+        batch = []
+        if self.peek() == ']':
+            # Пустой массив — одна пустая пачка, чтобы ключ был виден вызывающему
+            self.position += 1
+            yield batch
+            return
+        while True:
+            batch.append(self.decode())
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+            symbol = self.peek()
+            self.position += 1
+            if symbol == ']':
+                break
+            if symbol != ',':
+                raise self.error("ожидалась ',' или ']' в массиве")
+        if batch:
+            yield batch
+
+
+def iter_array_batches(file_path: str, keys: tuple[str, ...],
+                       batch_size: int = DEFAULT_BATCH) -> Iterator[tuple[Optional[str], list]]:
+    """Пачки элементов массивов верхнего уровня: (ключ, список словарей).
+
+    Если документ — массив, он отдаётся с ключом None; пустой массив — одной
+    пустой пачкой.
+    """
+    try:
+        with open(file_path, 'r', encoding='utf-8-sig') as f:
+            scanner = _Scanner(f, file_path)
+            symbol = scanner.peek()
+            if symbol == '[':
+                for batch in scanner.items(batch_size):
+                    yield None, batch
+                return
+            scanner.expect('{')
+            if scanner.peek() == '}':
+                return
+            while True:
+                key = scanner.decode()
+                if not isinstance(key, str):
+                    raise scanner.error("ключ объекта не является строкой")
+                scanner.expect(':')
+                if key in keys and scanner.peek() == '[':
+                    for batch in scanner.items(batch_size):
+                        yield key, batch
+                else:
+                    scanner.skip()
+                symbol = scanner.peek()
+                scanner.position += 1
+                if symbol == '}':
+                    return
+                if symbol != ',':
+                    raise scanner.error("ожидалась ',' или '}' в объекте")
+    except FileNotFoundError:
+        raise ValueError(f"Файл {file_path} не найден")
+
+
+class ColumnBuffer:
+    """Растущая таблица (N, width) float64 с удвоением ёмкости"""
+
+    def __init__(self, width: int, capacity: int = DEFAULT_BATCH):
+        self._data = np.empty((max(capacity, 1), width), dtype=np.float64)
+        self.size = 0
+
+    def append(self, rows: np.ndarray):
+        needed = self.size + len(rows)
+        if needed > len(self._data):
+            grown = np.empty((max(needed, 2 * len(self._data)), self._data.shape[1]), dtype=np.float64)
+            grown[:self.size] = self._data[:self.size]
+            self._data = grown
+        self._data[self.size:needed] = rows
+        self.size = needed
+
+    def result(self) -> np.ndarray:
+        """Заполненная часть; лишняя ёмкость освобождается"""
+        if self.size == len(self._data):
+            return self._data
+        return self._data[:self.size].copy()
@@ -0,0 +1,117 @@
+"""Бинарный колоночный формат сетки (.gxm).
+
+Все числа little-endian. Заголовок 32 байта:
+
+    magic      8s   b'GXMESH\\0\\0'
+    version    u32  FORMAT_VERSION
+    flags      u32  FLAG_SENSOR_VALUES — у сенсоров есть значения
+    n_cells    u64
+    n_sensors  u64
+
+Далее float64 колонки по порядку: 8 колонок ячеек по n_cells значений
+(CenterX, CenterY, CenterZ, BoundX, BoundY, BoundZ, Density, SubdivisionLevel)
+и 4 колонки сенсоров по n_sensors значений (X, Y, Z, Value). Колонки читаются
+без копирования через np.memmap. Запись на стороне C#: Common/Services/MeshBinaryWriter.cs.
+"""
+import struct
+from typing import Optional
+
+import numpy as np
+
+MAGIC = b'GXMESH\x00\x00'
+FORMAT_VERSION = 1
+FLAG_SENSOR_VALUES = 1
+
+HEADER = struct.Struct('<8sIIQQ')
+CELL_COLUMNS = 8
+SENSOR_COLUMNS = 4
+DTYPE = np.dtype('<f8')
+
+
+def is_binary_mesh(file_path: str) -> bool:
+    """Проверка сигнатуры файла"""
+    try:
+        with open(file_path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def _read_header(file_path: str) -> tuple[int, int, int]:
+    with open(file_path, 'rb') as f:
+        raw = f.read(HEADER.size)
+    if len(raw) < HEADER.size:
+        raise ValueError(f"Файл {file_path} повреждён: неполный заголовок")
+
+    magic, version, flags, n_cells, n_sensors = HEADER.unpack(raw)
+    if magic != MAGIC:
+        raise ValueError(f"Файл {file_path} не является бинарной сеткой")
+    if version > FORMAT_VERSION:
+        raise ValueError(f"Неподдерживаемая версия формата {version} в файле {file_path}")
+    return flags, n_cells, n_sensors
+
+
+def read_binary_mesh(file_path: str, mmap: bool = True) -> tuple[np.ndarray, np.ndarray, bool]:
+    """Блоки ячеек (8, N) и сенсоров (4, M) и признак наличия значений у сенсоров.
+
+    mmap=True отображает файл в память без копирования (массивы только для
+    чтения); mmap=False читает данные одним вызовом, не удерживая файл открытым.
+    """
+    try:
+        flags, n_cells, n_sensors = _read_header(file_path)
+    except FileNotFoundError:
+        raise ValueError(f"Файл {file_path} не найден")
+
+    count = CELL_COLUMNS * n_cells + SENSOR_COLUMNS * n_sensors
+    if count == 0:
+        data = np.empty(0, dtype=DTYPE)
+    elif mmap:
+        data = np.memmap(file_path, dtype=DTYPE, mode='r', offset=HEADER.size, shape=(count,))
+    else:
+        data = np.fromfile(file_path, dtype=DTYPE, count=count, offset=HEADER.size)
+    if data.shape[0] != count:
+        raise ValueError(f"Файл {file_path} повреждён: ожидалось {count} значений")
+
+    cells = data[:CELL_COLUMNS * n_cells].reshape(CELL_COLUMNS, n_cells)
+    sensors = data[CELL_COLUMNS * n_cells:].reshape(SENSOR_COLUMNS, n_sensors)
+    return cells, sensors, bool(flags & FLAG_SENSOR_VALUES)
+
+
+def write_binary_mesh(file_path: str, cells: np.ndarray, sensors: Optional[np.ndarray] = None,
+                      sensor_values: Optional[np.ndarray] = None):
+    """Запись блока ячеек (8, N) и координат сенсоров (M, 3) со значениями"""
+    cells = np.ascontiguousarray(cells, dtype=DTYPE)
+    sensors = np.empty((0, 3)) if sensors is None else np.asarray(sensors)
+    block = np.zeros((SENSOR_COLUMNS, len(sensors)), dtype=DTYPE)
+    block[:3] = sensors.T
+    if sensor_values is not None:
+        block[3] = sensor_values
+
+    flags = FLAG_SENSOR_VALUES if sensor_values is not None else 0
+    with open(file_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, flags, cells.shape[1], block.shape[1]))
+        f.write(cells.tobytes())
+        f.write(block.tobytes())
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    from mesh_loader import load_mesh, save_mesh_binary
+
+    parser = argparse.ArgumentParser(description='Перевод сетки из JSON в бинарный формат и обратная проверка')
+    parser.add_argument('input', help='JSON файл сетки')
+    parser.add_argument('output', help='Выходной .gxm файл')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    mesh = load_mesh(args.input)
+    parsed = time.perf_counter()
+    save_mesh_binary(mesh, args.output)
+    start_binary = time.perf_counter()
+    loaded = load_mesh(args.output)
+    finished = time.perf_counter()
+
+    print(f"Ячеек: {len(loaded)}, сенсоров: {len(loaded.sensors)}")
+    print(f"JSON: {parsed - start:.3f} c, бинарный: {finished - start_binary:.4f} c")
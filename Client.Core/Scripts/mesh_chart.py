@@ -1,83 +1,191 @@
-﻿import sys
+﻿"""Отрисовка слоёв (strata) в проекциях XY, XZ, YZ с обрезкой по domain.
+
+Вход — JSON {"domain": {...}, "strata": [...], "projection": "XY"} или со
+списком "projections"; необязательный "sensors_grid" (SensorsGrid из C#)
+рисуется точками приёмников. За один разбор файла строится любой набор проекций,
+каждая в своё изображение: в шаблоне имени {projection} заменяется на
+название проекции, без него к имени добавляется суффикс _XY и т.п.
+"""
+import argparse
 import json
-import matplotlib.pyplot as plt
+import os
+from typing import Optional
 
-json_file = sys.argv[1]
-output_image = sys.argv[2]
-
-# Читаем данные
-with open(json_file, "r") as f:
-    data = json.load(f)
-
-domain = data["domain"]
-strata = data["strata"]
-projection = data.get("projection", "XY")  # По умолчанию XY
-
-fig, ax = plt.subplots(figsize=(8, 6))
-
-# Определяем оси и метки
-if projection == "XY":
-    x_start, x_end = domain["StartX"], domain["EndX"]
-    y_start, y_end = domain["StartY"], domain["EndY"]
-    x_label, y_label = "X", "Y"
-elif projection == "XZ":
-    x_start, x_end = domain["StartX"], domain["EndX"]
-    y_start, y_end = domain["StartZ"], domain["EndZ"]
-    x_label, y_label = "X", "Z"
-elif projection == "YZ":
-    x_start, x_end = domain["StartY"], domain["EndY"]
-    y_start, y_end = domain["StartZ"], domain["EndZ"]
-    x_label, y_label = "Y", "Z"
-else:
-    raise ValueError(f"Неизвестная проекция: {projection}")
-
-# Настраиваем оси
-ax.set_xticks([x_start + i * (x_end - x_start) / domain["SplitsXCount"] for i in range(domain["SplitsXCount"] + 1)])
-ax.set_yticks([y_start + i * (y_end - y_start) / domain["SplitsYCount"] for i in range(domain["SplitsYCount"] + 1)])
-ax.grid(True, linestyle="--", linewidth=0.5, alpha=0.7)
-
-# Границы области
-rect = plt.Rectangle((x_start, y_start), x_end - x_start, y_end - y_start, linewidth=2, edgecolor='r', facecolor='none')
-ax.add_patch(rect)
-
-print(f"Проекция: {projection}, Domain: {domain}")
-
-# Отрисовка слоёв
-for stratum in strata:
-    if projection == "XY":
-        x_min, x_max = stratum["StartX"], stratum["EndX"]
-        y_min, y_max = stratum["StartY"], stratum["EndY"]
-    elif projection == "XZ":
-        x_min, x_max = stratum["StartX"], stratum["EndX"]
-        y_min, y_max = stratum["StartZ"], stratum["EndZ"]
-    elif projection == "YZ":
-        x_min, x_max = stratum["StartY"], stratum["EndY"]
-        y_min, y_max = stratum["StartZ"], stratum["EndZ"]
-
-    is_active = stratum.get("IsActive", True)
-    alpha = 1.0 if is_active else 0.5
-
-    # Обрезаем прямоугольник по границам области
-    x_min = max(x_min, x_start)
-    y_min = max(y_min, y_start)
-    x_max = min(x_max, x_end)
-    y_max = min(y_max, y_end)
-
-    width = x_max - x_min
-    height = y_max - y_min
-
-    print(f"Stratum: Start=({x_min},{y_min}), End=({x_max},{y_max}), Active={is_active}")
-
-    # Рисуем обрезанный прямоугольник
-    obj_rect = plt.Rectangle((x_min, y_min), width, height, linewidth=1.5, edgecolor='blue', facecolor='lightblue', alpha=alpha)
-    ax.add_patch(obj_rect)
-
-    ax.text((x_min + x_max) / 2, (y_min + y_max) / 2, f"{stratum['Density']:.1f}", fontsize=8, ha='center', va='center', color='black')
-
-ax.set_xlim(x_start, x_end)
-ax.set_ylim(y_start, y_end)
-ax.set_xlabel(x_label)
-ax.set_ylabel(y_label)
-
-plt.savefig(output_image, dpi=300, bbox_inches='tight')
-print(f"Сохранено изображение: {output_image}")
+import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.collections import PathCollection, PolyCollection
+from matplotlib.colors import to_rgba
+from matplotlib.path import Path
+from matplotlib.textpath import TextPath
+from matplotlib.transforms import Affine2D
+
+import telemetry
+from mesh_geometry import rectangles
+
+PROJECTIONS = ('XY', 'XZ', 'YZ')
+STRATUM_FIELDS = ('StartX', 'EndX', 'StartY', 'EndY', 'StartZ', 'EndZ', 'Density')
+
+
+def strata_columns(strata: list) -> dict[str, np.ndarray]:
+    """Поля слоёв в колонки; IsActive по умолчанию True"""
+    columns = {field: np.fromiter((s[field] for s in strata), dtype=np.float64, count=len(strata))
+               for field in STRATUM_FIELDS}
+    columns['IsActive'] = np.fromiter((s.get('IsActive', True) for s in strata), dtype=bool, count=len(strata))
+    return columns
+
+
+def clip_strata(columns: dict[str, np.ndarray], domain: dict, projection: str):
+    """Прямоугольники слоёв в проекции, обрезанные по области: lower, upper (N, 2) и маска непустых"""
+    if projection not in PROJECTIONS:
+        raise ValueError(f"Неизвестная проекция: {projection}")
+
+    axes = tuple(projection)
+    lower = np.column_stack([columns[f"Start{axis}"] for axis in axes])
+    upper = np.column_stack([columns[f"End{axis}"] for axis in axes])
+    domain_lower = np.array([domain[f"Start{axis}"] for axis in axes], dtype=np.float64)
+    domain_upper = np.array([domain[f"End{axis}"] for axis in axes], dtype=np.float64)
+
+    lower = np.maximum(lower, domain_lower)
+    upper = np.minimum(upper, domain_upper)
+    return lower, upper, np.all(upper > lower, axis=1)
+
+
+def sensor_points(grid: dict, projection: str) -> np.ndarray:
+    """Приёмники сетки SensorsGrid в проекции (K, 2); точки по осям — как SensorsStorage в C#"""
+    coordinates = {
+        'X': np.linspace(grid['StartX'], grid['EndX'], int(grid['SplitsXCount'])),
+        'Y': np.linspace(grid['StartY'], grid['EndY'], int(grid['SplitsYCount'])),
+        'Z': np.array([grid.get('StartZ', 0.0)])
+    }
+    x, y = np.meshgrid(coordinates[projection[0]], coordinates[projection[1]])
+    return np.column_stack([x.ravel(), y.ravel()])
+
+
+def label_collection(ax, positions: np.ndarray, labels: list[str], fontsize: float = 8) -> PathCollection:
+    """Подписи одной коллекцией контуров текста вместо ax.text на каждую"""
+    paths = {}
+    for label in set(labels):
+        path = TextPath((0, 0), label, size=fontsize)
+        # Выравнивание по центру, как ha='center', va='center'
+        extents = path.get_extents()
+        paths[label] = Path(path.vertices - (extents.min + extents.max) / 2, path.codes)
+    fig = ax.get_figure()
+    collection = PathCollection(
+        [paths[label] for label in labels],
+        offsets=positions,
+        offset_transform=ax.transData,
+        transform=Affine2D().scale(1 / 72) + fig.dpi_scale_trans,
+        facecolors='black',
+        edgecolors='none'
+    )
+    ax.add_collection(collection, autolim=False)
+    return collection
+
+
+def _draw_projection(domain: dict, columns: dict[str, np.ndarray], projection: str, output_image: str,
+                     verbose: bool, sensors_grid: Optional[dict] = None):
+    x_axis, y_axis = projection
+    x_start, x_end = domain[f"Start{x_axis}"], domain[f"End{x_axis}"]
+    y_start, y_end = domain[f"Start{y_axis}"], domain[f"End{y_axis}"]
+    x_splits = int(domain["SplitsXCount"])
+    y_splits = int(domain["SplitsYCount"])
+
+    fig, ax = plt.subplots(figsize=(8, 6))
+
+    # Настраиваем оси
+    ax.set_xticks(np.linspace(x_start, x_end, x_splits + 1))
+    ax.set_yticks(np.linspace(y_start, y_end, y_splits + 1))
+    ax.grid(True, linestyle="--", linewidth=0.5, alpha=0.7)
+
+    # Границы области
+    ax.add_patch(plt.Rectangle((x_start, y_start), x_end - x_start, y_end - y_start,
+                               linewidth=2, edgecolor='r', facecolor='none'))
+
+    lower, upper, visible = clip_strata(columns, domain, projection)
+    alpha = np.where(columns['IsActive'], 1.0, 0.5)[visible]
+    face_colors = np.tile(to_rgba('lightblue'), (len(alpha), 1))
+    edge_colors = np.tile(to_rgba('blue'), (len(alpha), 1))
+    face_colors[:, 3] = alpha
+    edge_colors[:, 3] = alpha
+
+    # Все слои одной коллекцией
+    ax.add_collection(PolyCollection(rectangles(lower[visible], upper[visible]),
+                                     facecolors=face_colors, edgecolors=edge_colors, linewidths=1.5))
+
+    centers = (lower[visible] + upper[visible]) / 2
+    label_collection(ax, centers, [f"{density:.1f}" for density in columns['Density'][visible]])
+
+    if sensors_grid:
+        points = sensor_points(sensors_grid, projection)
+        ax.scatter(points[:, 0], points[:, 1], s=6, color='tab:red', zorder=3)
+
+    if verbose:
+        print(f"Проекция: {projection}, Domain: {domain}")
+        for (x_min, y_min), (x_max, y_max), is_active in zip(lower[visible], upper[visible],
+                                                              columns['IsActive'][visible]):
+            print(f"Stratum: Start=({x_min},{y_min}), End=({x_max},{y_max}), Active={is_active}")
+
+    ax.set_xlim(x_start, x_end)
+    ax.set_ylim(y_start, y_end)
+    ax.set_xlabel(x_axis)
+    ax.set_ylabel(y_axis)
+    telemetry.checkpoint('draw', strata=int(visible.sum()))
+
+    plt.savefig(output_image, dpi=300, bbox_inches='tight')
+    telemetry.checkpoint('save', figure=fig)
+    plt.close(fig)
+    print(f"Сохранено изображение: {output_image}")
+
+
+def projection_outputs(output_image: str, projections) -> dict[str, str]:
+    """Имя изображения для каждой проекции по шаблону output_image"""
+    if '{projection}' in output_image:
+        return {projection: output_image.replace('{projection}', projection) for projection in projections}
+    if len(projections) == 1:
+        return {projections[0]: output_image}
+    root, extension = os.path.splitext(output_image)
+    return {projection: f"{root}_{projection}{extension or '.png'}" for projection in projections}
+
+
+def plot_projections(data: dict, output_image: str, projections=None, verbose: bool = False) -> dict[str, str]:
+    """Все запрошенные проекции за один разбор данных; возвращает {проекция: изображение}"""
+    if projections is None:
+        projections = data.get("projections") or [data.get("projection", "XY")]
+    projections = [projection.upper() for projection in projections]
+    for projection in projections:
+        if projection not in PROJECTIONS:
+            raise ValueError(f"Неизвестная проекция: {projection}")
+
+    columns = strata_columns(data["strata"])
+    outputs = projection_outputs(output_image, projections)
+    for projection, image in outputs.items():
+        _draw_projection(data["domain"], columns, projection, image, verbose, data.get("sensors_grid"))
+    return outputs
+
+
+def plot_strata(data, output_image, verbose: bool = False):
+    """Отрисовка слоёв в проекции data["projection"] с обрезкой по domain"""
+    plot_projections(data, output_image, [data.get("projection", "XY")], verbose)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Отрисовка слоёв в проекциях',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('input', help='JSON с domain и strata')
+    parser.add_argument('output', nargs='?', default='mesh_chart.png',
+                        help='Изображение; {projection} в имени заменяется на проекцию')
+    parser.add_argument('-p', '--projections', nargs='+', type=str.upper, choices=PROJECTIONS,
+                        help='Проекции (по умолчанию из файла: projections или projection)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Печатать область и каждый слой')
+
+    args = parser.parse_args()
+
+    with telemetry.session('mesh_chart'):
+        # Читаем данные
+        with open(args.input, "r", encoding='utf-8-sig') as f:
+            data = json.load(f)
+        telemetry.checkpoint('load')
+
+        plot_projections(data, args.output, args.projections, args.verbose)
@@ -0,0 +1,99 @@
+import numpy as np
+
+from mesh_loader import AXES, MeshData
+
+# Знаки углов относительно центра ячейки (порядок как у FiniteElement)
+CORNER_SIGNS = np.array([
+    [-1, -1, -1], [1, -1, -1], [1, 1, -1], [-1, 1, -1],
+    [-1, -1, 1], [1, -1, 1], [1, 1, 1], [-1, 1, 1]
+], dtype=np.float64)
+
+# Рёбра куба как пары индексов углов
+EDGE_INDICES = np.array([
+    [0, 1], [1, 2], [2, 3], [3, 0],
+    [4, 5], [5, 6], [6, 7], [7, 4],
+    [0, 4], [1, 5], [2, 6], [3, 7]
+])
+
+EDGES_PER_CELL = len(EDGE_INDICES)
+
+# Грани куба как четвёрки индексов углов: нижняя, верхняя, левая, правая, передняя, задняя
+FACE_INDICES = np.array([
+    [0, 1, 2, 3], [4, 5, 6, 7],
+    [0, 3, 7, 4], [1, 2, 6, 5],
+    [0, 1, 5, 4], [3, 2, 6, 7]
+])
+
+FACES_PER_CELL = len(FACE_INDICES)
+
+
+def cell_corners(mesh: MeshData) -> np.ndarray:
+    """Углы всех ячеек одним проходом, форма (N, 8, 3)"""
+    return mesh.center[:, None, :] + CORNER_SIGNS[None, :, :] * mesh.bound[:, None, :]
+
+
+def cell_edges(corners: np.ndarray) -> np.ndarray:
+    """Рёбра всех ячеек, форма (N * 12, 2, 3)"""
+    return corners[:, EDGE_INDICES, :].reshape(-1, 2, 3)
+
+
+def cell_faces(corners: np.ndarray) -> np.ndarray:
+    """Грани всех ячеек, форма (N * 6, 4, 3)"""
+    return corners[:, FACE_INDICES, :].reshape(-1, 4, 3)
+
+
+def cell_colors(values: np.ndarray, cmap, norm) -> np.ndarray:
+    """RGBA цвета ячеек, форма (N, 4)"""
+    return cmap(norm(values))
+
+
+# Индексы осей координат для каждой плоскости проекции
+PLANE_AXES = {'xy': (0, 1), 'xz': (0, 2), 'yz': (1, 2)}
+
+# Плоскость, остающаяся после сечения по оси
+SLICE_PLANES = {'X': 'yz', 'Y': 'xz', 'Z': 'xy'}
+
+
+def rectangles(lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    """Прямоугольники по нижним и верхним углам (K, 2), форма (K, 4, 2)"""
+    return np.stack([
+        lower,
+        np.column_stack([upper[:, 0], lower[:, 1]]),
+        upper,
+        np.column_stack([lower[:, 0], upper[:, 1]])
+    ], axis=1)
+
+
+def grid_index_ranges(low: np.ndarray, high: np.ndarray, start: float, size: float, count: int):
+    """Полуинтервалы [i0, i1) пикселей или вокселей решётки, центры которых попадают в [low, high).
+
+    Ячейка тоньше шага решётки получает хотя бы узел, содержащий её центр.
+    """
+    i0 = np.ceil((low - start) / size - 0.5).astype(np.int64)
+    i1 = np.ceil((high - start) / size - 0.5).astype(np.int64)
+    thin = i1 <= i0
+    i0[thin] = np.floor(((low[thin] + high[thin]) / 2 - start) / size).astype(np.int64)
+    i1[thin] = i0[thin] + 1
+    return np.clip(i0, 0, count), np.clip(i1, 0, count)
+
+
+def projection_rectangles(mesh: MeshData, plane: str) -> np.ndarray:
+    """Проекции ячеек на плоскость: осевые коробки проецируются в прямоугольники"""
+    axes = list(PLANE_AXES[plane])
+    center = mesh.center[:, axes]
+    bound = mesh.bound[:, axes]
+    return rectangles(center - bound, center + bound)
+
+
+def slice_mask(mesh: MeshData, axis: str, position: float) -> np.ndarray:
+    """Маска ячеек, пересечённых плоскостью axis = position"""
+    index = AXES.index(axis)
+    center = mesh.center[:, index]
+    bound = mesh.bound[:, index]
+    return (center - bound <= position) & (position <= center + bound)
+
+
+def slice_rectangles(mesh: MeshData, axis: str, position: float) -> tuple[np.ndarray, np.ndarray]:
+    """Сечение сетки плоскостью: индексы пересечённых ячеек и их прямоугольники"""
+    indices = np.flatnonzero(slice_mask(mesh, axis, position))
+    return indices, projection_rectangles(mesh.subset(indices), SLICE_PLANES[axis])
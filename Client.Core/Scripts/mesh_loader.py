@@ -0,0 +1,303 @@
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+
+from json_stream import ColumnBuffer, iter_array_batches
+from mesh_binary import is_binary_mesh, read_binary_mesh, write_binary_mesh
+
+CELL_FIELDS = ('CenterX', 'CenterY', 'CenterZ', 'BoundX', 'BoundY', 'BoundZ', 'Density', 'SubdivisionLevel')
+AXES = ('X', 'Y', 'Z')
+SENSOR_KEYS = ('sensors', 'Sensors')
+
+# JSON больше этого размера читается потоком, а не json.load целиком
+STREAM_THRESHOLD = 64 << 20
+
+
+@dataclass(frozen=True)
+class MeshData:
+    """Сетка в колоночном виде (struct-of-arrays)"""
+    center: np.ndarray  # (N, 3)
+    bound: np.ndarray  # (N, 3), полуразмеры ячеек
+    density: np.ndarray  # (N,)
+    level: np.ndarray  # (N,)
+    sensors: np.ndarray  # (M, 3)
+    sensor_values: Optional[np.ndarray] = None  # (M,)
+
+    def __len__(self) -> int:
+        return self.density.shape[0]
+
+    @property
+    def lower(self) -> np.ndarray:
+        return self.center - self.bound
+
+    @property
+    def upper(self) -> np.ndarray:
+        return self.center + self.bound
+
+    def extent(self) -> tuple[np.ndarray, np.ndarray]:
+        """Габариты всей сетки по трём осям"""
+        if len(self) == 0:
+            return np.zeros(3), np.ones(3)
+        return self.lower.min(axis=0), self.upper.max(axis=0)
+
+    def axis_bounds(self, axis: str) -> tuple[float, float]:
+        """Габариты сетки вдоль одной оси ('X', 'Y' или 'Z')"""
+        min_vals, max_vals = self.extent()
+        index = AXES.index(axis.upper())
+        return float(min_vals[index]), float(max_vals[index])
+
+    def subset(self, mask: np.ndarray) -> 'MeshData':
+        """Подмножество ячеек по маске или индексам, сенсоры сохраняются"""
+        return MeshData(
+            center=self.center[mask],
+            bound=self.bound[mask],
+            density=self.density[mask],
+            level=self.level[mask],
+            sensors=self.sensors,
+            sensor_values=self.sensor_values
+        )
+
+    def with_density(self, density: np.ndarray) -> 'MeshData':
+        """Та же геометрия с другими значениями в ячейках"""
+        return MeshData(
+            center=self.center,
+            bound=self.bound,
+            density=np.asarray(density, dtype=np.float64),
+            level=self.level,
+            sensors=self.sensors,
+            sensor_values=self.sensor_values
+        )
+
+
+def _read_json(file_path: str):
+    try:
+        with open(file_path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise ValueError(f"Файл {file_path} не найден")
+    except json.JSONDecodeError:
+        raise ValueError(f"Ошибка парсинга JSON в файле {file_path}")
+
+
+def _column(items: list, key: str, default: Optional[float] = None) -> np.ndarray:
+    if default is None:
+        return np.fromiter((item[key] for item in items), dtype=np.float64, count=len(items))
+    return np.fromiter((item.get(key, default) for item in items), dtype=np.float64, count=len(items))
+
+
+def cells_to_columns(cells: list) -> dict[str, np.ndarray]:
+    """Переводит список словарей ячеек в колонки без промежуточных объектов"""
+    return {
+        field: _column(cells, field, 0.0 if field == 'SubdivisionLevel' else None)
+        for field in CELL_FIELDS
+    }
+
+
+def sensors_to_arrays(sensors: list) -> tuple[np.ndarray, Optional[np.ndarray]]:
+    """Сенсоры в форматах {Position: {X, Y, Z}} и {X, Y, Z, Value}"""
+    if not sensors:
+        return np.empty((0, 3)), None
+
+    positions = [s['Position'] if 'Position' in s else s for s in sensors]
+    coords = np.column_stack([_column(positions, axis) for axis in AXES])
+    values = _column(sensors, 'Value') if 'Value' in sensors[0] else None
+    return coords, values
+
+
+def mesh_from_columns(columns: dict[str, np.ndarray],
+                      sensors: Optional[np.ndarray] = None,
+                      sensor_values: Optional[np.ndarray] = None) -> MeshData:
+    return MeshData(
+        center=np.column_stack([columns['CenterX'], columns['CenterY'], columns['CenterZ']]),
+        bound=np.column_stack([columns['BoundX'], columns['BoundY'], columns['BoundZ']]),
+        density=columns['Density'],
+        level=columns['SubdivisionLevel'],
+        sensors=np.empty((0, 3)) if sensors is None else sensors,
+        sensor_values=sensor_values
+    )
+
+
+def _mesh_from_binary(file_path: str, mmap: bool) -> MeshData:
+    """Колонки бинарного файла как представления (N, 3) без копирования"""
+    cells, sensors, has_values = read_binary_mesh(file_path, mmap=mmap)
+    return MeshData(
+        center=cells[0:3].T,
+        bound=cells[3:6].T,
+        density=cells[6],
+        level=cells[7],
+        sensors=sensors[0:3].T,
+        sensor_values=sensors[3] if has_values else None
+    )
+
+
+@dataclass(frozen=True)
+class CellFilter:
+    """Отбор ячеек при загрузке: пересечение с боксом и/или с плоскостями сечений"""
+    lower: Optional[np.ndarray] = None  # (3,) нижний угол бокса
+    upper: Optional[np.ndarray] = None  # (3,) верхний угол бокса
+    planes: dict[str, float] = field(default_factory=dict)  # ось -> координата плоскости
+
+    @classmethod
+    def from_slices(cls, x_slice: Optional[float] = None, y_slice: Optional[float] = None,
+                    z_slice: Optional[float] = None, **_) -> 'CellFilter':
+        """Только ячейки, пересечённые хотя бы одной из заданных плоскостей"""
+        planes = {axis: position for axis, position in zip(AXES, (x_slice, y_slice, z_slice))
+                  if position is not None}
+        return cls(planes=planes)
+
+    def mask(self, center: np.ndarray, bound: np.ndarray) -> np.ndarray:
+        keep = np.ones(len(center), dtype=bool)
+        if self.lower is not None:
+            keep &= np.all(center + bound >= self.lower, axis=1)
+        if self.upper is not None:
+            keep &= np.all(center - bound <= self.upper, axis=1)
+        if self.planes:
+            crossed = np.zeros(len(center), dtype=bool)
+            for axis, position in self.planes.items():
+                index = AXES.index(axis.upper())
+                crossed |= np.abs(center[:, index] - position) <= bound[:, index]
+            keep &= crossed
+        return keep
+
+
+def _missing_cells(file_path: str) -> ValueError:
+    return ValueError(f"В файле {file_path} нет ячеек (Cells)")
+
+
+def _stream_json(file_path: str, size: int) -> bool:
+    return size is not None and os.path.getsize(file_path) > size
+
+
+def _mesh_from_stream(file_path: str, cell_filter: Optional[CellFilter]) -> MeshData:
+    """Ячейки и сенсоры пачками в растущие колонки; отфильтрованные ячейки не сохраняются"""
+    cells = ColumnBuffer(len(CELL_FIELDS))
+    sensors = ColumnBuffer(4)
+    has_values = True
+    keys = set()
+    for key, batch in iter_array_batches(file_path, ('Cells', 'sensors')):
+        keys.add(key)
+        if key == 'sensors':
+            coords, values = sensors_to_arrays(batch)
+            has_values &= values is not None
+            sensors.append(np.column_stack([coords, values if values is not None else np.zeros(len(coords))]))
+            continue
+        # key None — документ-массив ячеек, как в json.load-ветке
+        columns = np.column_stack([cells_to_columns(batch)[name] for name in CELL_FIELDS])
+        if cell_filter is not None:
+            columns = columns[cell_filter.mask(columns[:, 0:3], columns[:, 3:6])]
+        cells.append(columns)
+
+    if not keys & {'Cells', None}:
+        raise _missing_cells(file_path)
+
+    cells, sensors = cells.result(), sensors.result()
+    return MeshData(
+        center=cells[:, 0:3],
+        bound=cells[:, 3:6],
+        density=cells[:, 6],
+        level=cells[:, 7],
+        sensors=sensors[:, 0:3],
+        sensor_values=sensors[:, 3] if has_values and len(sensors) else None
+    )
+
+
+def load_mesh(file_path: str, mmap: bool = True, cell_filter: Optional[CellFilter] = None,
+              stream_threshold: Optional[int] = STREAM_THRESHOLD) -> MeshData:
+    """Загрузка сетки (и сенсоров, если есть) из JSON или бинарного файла.
+
+    JSON больше stream_threshold байт (или с фильтром) читается потоком,
+    None — всегда json.load.
+    """
+    if is_binary_mesh(file_path):
+        mesh = _mesh_from_binary(file_path, mmap)
+        return mesh if cell_filter is None else mesh.subset(cell_filter.mask(mesh.center, mesh.bound))
+
+    if cell_filter is not None or _stream_json(file_path, stream_threshold):
+        return _mesh_from_stream(file_path, cell_filter)
+
+    data = _read_json(file_path)
+    if isinstance(data, dict) and 'Cells' not in data:
+        raise _missing_cells(file_path)
+    cells = data['Cells'] if isinstance(data, dict) else data
+    sensors = data.get('sensors', []) if isinstance(data, dict) else []
+
+    coords, values = sensors_to_arrays(sensors)
+    return mesh_from_columns(cells_to_columns(cells), coords, values)
+
+
+def _sensors_from_stream(file_path: str) -> tuple[np.ndarray, Optional[np.ndarray]]:
+    """Сенсоры пачками; как и в json.load-ветке, 'sensors' важнее 'Sensors'"""
+    found = {}
+    for key, batch in iter_array_batches(file_path, SENSOR_KEYS):
+        coords, values = sensors_to_arrays(batch)
+        buffer, has_values = found.get(key, (ColumnBuffer(4), True))
+        has_values &= values is not None
+        buffer.append(np.column_stack([coords, values if values is not None else np.zeros(len(coords))]))
+        found[key] = buffer, has_values
+
+    key = next((key for key in ('sensors', 'Sensors', None) if key in found), None)
+    if key not in found:
+        return np.empty((0, 3)), None
+    buffer, has_values = found[key]
+    sensors = buffer.result()
+    return sensors[:, 0:3], sensors[:, 3] if has_values else None
+
+
+def load_sensors(file_path: str,
+                 stream_threshold: Optional[int] = STREAM_THRESHOLD) -> tuple[np.ndarray, Optional[np.ndarray]]:
+    """Загрузка сенсоров (X, Y, Z, Value) из JSON или бинарного файла"""
+    if is_binary_mesh(file_path):
+        _, sensors, has_values = read_binary_mesh(file_path, mmap=False)
+        return sensors[0:3].T, sensors[3] if has_values else None
+
+    if _stream_json(file_path, stream_threshold):
+        return _sensors_from_stream(file_path)
+
+    data = _read_json(file_path)
+    if isinstance(data, dict):
+        data = data.get('sensors', data.get('Sensors', []))
+    return sensors_to_arrays(data)
+
+
+def detect_kind(file_path: str) -> str:
+    """'mesh' для сетки с ячейками, 'sensors' для карты сенсоров.
+
+    Для JSON читается только начало: ключ 'Cells' или первый элемент массива
+    (CenterX — ячейка, X или Position — сенсор).
+    """
+    if is_binary_mesh(file_path):
+        cells, _, _ = read_binary_mesh(file_path)
+        return 'mesh' if cells.shape[1] else 'sensors'
+    for key, batch in iter_array_batches(file_path, ('Cells',), batch_size=1):
+        first = batch[0] if batch else None
+        return 'mesh' if key == 'Cells' or isinstance(first, dict) and 'CenterX' in first else 'sensors'
+    return 'sensors'
+
+
+def save_sensors(file_path: str, coords: np.ndarray, values: np.ndarray):
+    """Сохранение сенсоров в JSON в формате Sensor из C# (X, Y, Z, Value)"""
+    data = [{'X': float(x), 'Y': float(y), 'Z': float(z), 'Value': float(value)}
+            for (x, y, z), value in zip(coords, values)]
+    with open(file_path, 'w') as f:
+        json.dump(data, f)
+
+
+def save_mesh_binary(mesh: MeshData, file_path: str):
+    """Сохранение сетки в бинарном колоночном формате"""
+    cells = np.vstack([mesh.center.T, mesh.bound.T, mesh.density, mesh.level])
+    write_binary_mesh(file_path, cells, mesh.sensors, mesh.sensor_values)
+
+
+def save_mesh(mesh: MeshData, file_path: str):
+    """Сохранение сетки: .gxm — бинарный формат, иначе JSON в формате Mesh из C#"""
+    if file_path.lower().endswith('.gxm'):
+        save_mesh_binary(mesh, file_path)
+        return
+
+    columns = np.column_stack([mesh.center, mesh.bound, mesh.density, mesh.level])
+    cells = [dict(zip(CELL_FIELDS, row)) for row in columns.tolist()]
+    with open(file_path, 'w') as f:
+        json.dump({'Cells': cells}, f)
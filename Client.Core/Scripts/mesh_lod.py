@@ -0,0 +1,124 @@
+import numpy as np
+
+from mesh_loader import MeshData
+
+# Бюджет числа ячеек для 3D отрисовки по умолчанию
+DEFAULT_RENDER_BUDGET = 20000
+
+# Квантование размеров ячеек при поиске соседей-октантов
+SIZE_QUANTUM = 2.0 ** 20
+
+
+def _group_keys(lower, extent, origin, scale, bin_size=None):
+    """Ключи групп: одинаковый размер и общий родительский бокс"""
+    if bin_size is None:
+        size_key = np.round(extent / scale * SIZE_QUANTUM).astype(np.int64)
+        parent = np.floor((lower - origin) / (2 * extent) + 1e-9).astype(np.int64)
+        keys = np.column_stack([size_key, parent])
+    else:
+        centers = lower + extent / 2
+        keys = np.floor((centers - origin) / bin_size).astype(np.int64)
+    return _dense_ids(keys)
+
+
+def _dense_ids(keys: np.ndarray) -> np.ndarray:
+    """Номера групп по строкам целочисленных ключей (упаковка в int64, если помещается)"""
+    keys = keys - keys.min(axis=0)
+    spans = keys.max(axis=0) + 1
+    if np.sum(np.log2(spans.astype(np.float64))) < 62:
+        packed = np.ravel_multi_index(keys.T, spans)
+        _, inverse = np.unique(packed, return_inverse=True)
+    else:
+        _, inverse = np.unique(keys, axis=0, return_inverse=True)
+    return inverse.ravel()
+
+
+def _merge_plan(inverse, values, volume, lower, upper, require_tiling):
+    """Группы-кандидаты на слияние и их стоимость (разброс значений внутри)"""
+    groups = inverse.max() + 1
+    count = np.bincount(inverse, minlength=groups)
+    group_volume = np.bincount(inverse, weights=volume, minlength=groups)
+    mean = np.bincount(inverse, weights=values * volume, minlength=groups) / group_volume
+    square = np.bincount(inverse, weights=values * values * volume, minlength=groups) / group_volume
+    cost = np.sqrt(np.maximum(square - mean * mean, 0.0))
+
+    candidates = count > 1
+    if require_tiling:
+        # Сливаются только ячейки, целиком замощающие общий бокс, чтобы не перекрыть соседей
+        box_lower = np.full((groups, 3), np.inf)
+        box_upper = np.full((groups, 3), -np.inf)
+        np.minimum.at(box_lower, inverse, lower)
+        np.maximum.at(box_upper, inverse, upper)
+        box_volume = np.prod(box_upper - box_lower, axis=1)
+        candidates &= np.abs(box_volume - group_volume) <= 1e-9 * box_volume
+
+    return np.flatnonzero(candidates), count, cost
+
+
+def reduce_to_budget(mesh: MeshData, budget: int = DEFAULT_RENDER_BUDGET) -> MeshData:
+    """Уровень детализации: слияние соседних октантов в родительские боксы.
+
+    Пока ячеек больше бюджета, сливаются группы ячеек одного размера с общим
+    родителем, начиная с самых однородных: детализация сохраняется у
+    градиентов плотности. Значение объединённой ячейки — среднее, взвешенное
+    по объёму. Если октанты больше не сливаются, ячейки объединяются по
+    регулярной сетке с растущим шагом.
+    """
+    if budget <= 0 or len(mesh) <= budget:
+        return mesh
+
+    lower, upper = mesh.lower, mesh.upper
+    values = mesh.density.astype(np.float64)
+    level = mesh.level.astype(np.float64)
+    origin = lower.min(axis=0)
+    scale = float(np.max(upper.max(axis=0) - origin)) or 1.0
+    bin_size = None
+
+    while len(values) > budget:
+        extent = upper - lower
+        volume = np.prod(extent, axis=1)
+        inverse = _group_keys(lower, extent, origin, scale, bin_size)
+        candidates, count, cost = _merge_plan(inverse, values, volume, lower, upper, bin_size is None)
+
+        if len(candidates) == 0:
+            # Октодерево исчерпано: переход на сетку с удвоением шага
+            bin_size = 2 * np.median(extent, axis=0) if bin_size is None else 2 * bin_size
+            continue
+
+        # Самые однородные группы, пока их слияние не уложит сетку в бюджет
+        candidates = candidates[np.argsort(cost[candidates], kind='stable')]
+        reduction = np.cumsum(count[candidates] - 1)
+        needed = len(values) - budget
+        chosen = candidates[:int(np.searchsorted(reduction, needed)) + 1]
+
+        merge = np.zeros(inverse.max() + 1, dtype=bool)
+        merge[chosen] = True
+        merged = merge[inverse]
+
+        group_index = np.full(len(merge), -1)
+        group_index[chosen] = np.arange(len(chosen))
+        target = group_index[inverse[merged]]
+
+        new_lower = np.full((len(chosen), 3), np.inf)
+        new_upper = np.full((len(chosen), 3), -np.inf)
+        np.minimum.at(new_lower, target, lower[merged])
+        np.maximum.at(new_upper, target, upper[merged])
+        new_volume = np.bincount(target, weights=volume[merged], minlength=len(chosen))
+        new_values = np.bincount(target, weights=values[merged] * volume[merged], minlength=len(chosen)) / new_volume
+        new_level = np.full(len(chosen), np.inf)
+        np.minimum.at(new_level, target, level[merged])
+
+        keep = ~merged
+        lower = np.concatenate([lower[keep], new_lower])
+        upper = np.concatenate([upper[keep], new_upper])
+        values = np.concatenate([values[keep], new_values])
+        level = np.concatenate([level[keep], np.maximum(new_level - 1, 0)])
+
+    return MeshData(
+        center=(lower + upper) / 2,
+        bound=(upper - lower) / 2,
+        density=values,
+        level=level,
+        sensors=mesh.sensors,
+        sensor_values=mesh.sensor_values
+    )
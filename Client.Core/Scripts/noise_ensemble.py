@@ -0,0 +1,258 @@
+"""Статистика по ансамблю зашумлённых реализаций за один проход.
+
+Пример:
+    python noise_ensemble.py "realizations/*.gxm" -o ensemble --plot std -z -100
+
+Реализации — сетки (значения в ячейках) или карты сенсоров (значения в
+сенсорах) одной геометрии. Файлы читаются потоком: в памяти только
+накопители размера O(ячеек) — среднее и сумма квадратов отклонений по
+Уэлфорду, минимум, максимум и гистограмма на ячейку для квантилей.
+Границы гистограмм берутся по первым файлам с запасом; выпавшие
+значения попадают в корзины «ниже» и «выше», ограниченные точными
+минимумом и максимумом. Файлы делятся между процессами,
+частичные накопители объединяются формулами Чана.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from mesh_binary import is_binary_mesh, read_binary_mesh
+from mesh_loader import detect_kind, load_mesh, load_sensors, save_mesh
+
+KINDS = ('auto', 'mesh', 'sensors')
+STATISTICS = ('std', 'mean', 'min', 'max', 'cv')
+
+# Корзин гистограммы на ячейку и число файлов для оценки её границ
+DEFAULT_BINS = 64
+PILOT_FILES = 16
+# Запас границ гистограммы относительно разброса по первым файлам
+RANGE_MARGIN = 1.0
+
+
+def read_values(file_path: str, kind: str) -> np.ndarray:
+    """Значения одной реализации: плотности ячеек или значения сенсоров"""
+    if kind == 'mesh':
+        if is_binary_mesh(file_path):
+            # Из бинарного файла копируется только колонка плотности
+            cells, _, _ = read_binary_mesh(file_path)
+            return np.array(cells[6], dtype=np.float64)
+        return load_mesh(file_path).density
+    _, values = load_sensors(file_path)
+    if values is None:
+        raise ValueError(f"В файле {file_path} нет значений сенсоров")
+    return values
+
+
+@dataclass
+class EnsembleAccumulator:
+    """Накопители по ячейкам: моменты по Уэлфорду, экстремумы и гистограмма"""
+    count: int
+    mean: np.ndarray
+    m2: np.ndarray
+    minimum: np.ndarray
+    maximum: np.ndarray
+    low: np.ndarray  # левая граница гистограммы
+    width: np.ndarray  # ширина корзины
+    histogram: np.ndarray  # (N, bins + 2) uint32, первая и последняя — вне границ
+
+    @classmethod
+    def empty(cls, low: np.ndarray, high: np.ndarray, bins: int = DEFAULT_BINS) -> 'EnsembleAccumulator':
+        size = len(low)
+        return cls(
+            count=0,
+            mean=np.zeros(size),
+            m2=np.zeros(size),
+            minimum=np.full(size, np.inf),
+            maximum=np.full(size, -np.inf),
+            low=low,
+            width=np.maximum(high - low, 1e-12) / bins,
+            histogram=np.zeros((size, bins + 2), dtype=np.uint32)
+        )
+
+    @property
+    def bins(self) -> int:
+        return self.histogram.shape[1] - 2
+
+    def add(self, values: np.ndarray):
+        """Одна реализация"""
+        if len(values) != len(self.mean):
+            raise ValueError(f"Реализация из {len(values)} значений, ожидалось {len(self.mean)}")
+        self.count += 1
+        delta = values - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (values - self.mean)
+        np.minimum(self.minimum, values, out=self.minimum)
+        np.maximum(self.maximum, values, out=self.maximum)
+
+        # По одному попаданию на ячейку, поэтому индексы не повторяются
+        bin_index = np.clip(np.floor((values - self.low) / self.width) + 1, 0, self.bins + 1).astype(np.int64)
+        self.histogram[np.arange(len(values)), bin_index] += 1
+
+    def merge(self, other: 'EnsembleAccumulator') -> 'EnsembleAccumulator':
+        """Объединение частичных накопителей (формулы Чана)"""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            return other
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.count / count
+        self.m2 = self.m2 + other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        np.minimum(self.minimum, other.minimum, out=self.minimum)
+        np.maximum(self.maximum, other.maximum, out=self.maximum)
+        self.histogram += other.histogram
+        return self
+
+    @property
+    def variance(self) -> np.ndarray:
+        """Несмещённая дисперсия"""
+        return self.m2 / (self.count - 1) if self.count > 1 else np.zeros_like(self.m2)
+
+    def quantile(self, q: float) -> np.ndarray:
+        """Квантиль по гистограмме с линейной интерполяцией внутри корзины.
+
+        Корзины вне границ гистограммы простираются до точных минимума и максимума.
+        """
+        inner = self.low[:, np.newaxis] + self.width[:, np.newaxis] * np.arange(self.bins + 1)
+        edges = np.column_stack([self.minimum, inner, self.maximum])
+        edges = np.clip(edges, self.minimum[:, np.newaxis], self.maximum[:, np.newaxis])
+        last = self.histogram.shape[1] - 1
+        cumulative = np.cumsum(self.histogram, axis=1)
+        target = q * self.count
+
+        rows = np.arange(len(self.mean))
+        bin_index = np.minimum((cumulative < target).sum(axis=1), last)
+        below = np.where(bin_index > 0, cumulative[rows, bin_index - 1], 0)
+        inside = self.histogram[rows, bin_index]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fraction = np.where(inside > 0, (target - below) / inside, 0.0)
+        return edges[rows, bin_index] + np.clip(fraction, 0, 1) * (edges[rows, bin_index + 1] - edges[rows, bin_index])
+
+    def statistics(self, quantiles=()) -> dict[str, np.ndarray]:
+        std = np.sqrt(self.variance)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cv = np.where(self.mean != 0, std / np.abs(self.mean), np.nan)
+        result = {'mean': self.mean, 'std': std, 'min': self.minimum, 'max': self.maximum, 'cv': cv}
+        for q in quantiles:
+            result[f"q{q:g}"] = self.quantile(q)
+        return result
+
+
+def histogram_range(files: list[str], kind: str) -> tuple[np.ndarray, np.ndarray]:
+    """Границы гистограмм по первым файлам с запасом по разбросу"""
+    low = high = None
+    for file_path in files[:PILOT_FILES]:
+        values = read_values(file_path, kind)
+        low = values.copy() if low is None else np.minimum(low, values)
+        high = values.copy() if high is None else np.maximum(high, values)
+    span = high - low
+    # Без разброса в пилотных файлах — запас относительно значения
+    margin = np.where(span > 0, RANGE_MARGIN * span, 0.05 * np.maximum(np.abs(low), 1e-9))
+    return low - margin, high + margin
+
+
+def accumulate(files: list[str], kind: str, low: np.ndarray, high: np.ndarray, bins: int) -> EnsembleAccumulator:
+    """Задача пула: последовательный проход по своей части файлов"""
+    accumulator = EnsembleAccumulator.empty(low, high, bins)
+    for file_path in files:
+        accumulator.add(read_values(file_path, kind))
+    return accumulator
+
+
+def run_ensemble(files: list[str], kind: str = 'auto', bins: int = DEFAULT_BINS,
+                 workers: Optional[int] = None) -> tuple[EnsembleAccumulator, str]:
+    """Накопители по всем файлам; файлы делятся на непрерывные части по процессам"""
+    if not files:
+        raise ValueError("Нет файлов реализаций")
+    if kind == 'auto':
+        kind = detect_kind(files[0])
+    low, high = histogram_range(files, kind)
+
+    parts = max(1, min(workers or os.cpu_count() or 1, len(files)))
+    chunks = [list(chunk) for chunk in np.array_split(np.array(files, dtype=object), parts) if len(chunk)]
+    if len(chunks) == 1:
+        return accumulate(chunks[0], kind, low, high, bins), kind
+
+    result = EnsembleAccumulator.empty(low, high, bins)
+    with ProcessPoolExecutor(max_workers=len(chunks)) as executor:
+        for partial in executor.map(accumulate, chunks, [kind] * len(chunks), [low] * len(chunks),
+                                    [high] * len(chunks), [bins] * len(chunks)):
+            result = result.merge(partial)
+    return result, kind
+
+
+def expand_inputs(patterns: list[str]) -> list[str]:
+    """Каталоги, маски и отдельные файлы в отсортированный список"""
+    files = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            files.update(path for path in glob.glob(os.path.join(pattern, '*'))
+                         if path.lower().endswith(('.json', '.gxm')))
+        else:
+            files.update(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+    return sorted(files)
+
+
+def plot_statistic(template_file: str, kind: str, values: np.ndarray, name: str, output_image: str, slices: dict):
+    """Статистика в раскладке show_plots_script (сетка) или anomaly_chart (сенсоры)"""
+    if kind == 'mesh':
+        from show_plots_script import plot_cell_mesh
+
+        mesh = load_mesh(template_file).with_density(values)
+        plot_cell_mesh(mesh, output_image=output_image, show=False, value_label=name, **slices)
+    else:
+        from anomaly_chart import plot_sensors
+
+        coords, _ = load_sensors(template_file)
+        plot_sensors(coords, values, output_image=output_image)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Статистика ансамбля зашумлённых реализаций',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('inputs', nargs='+', help='Каталоги, маски или файлы реализаций (JSON или .gxm)')
+    parser.add_argument('-o', '--output-prefix', default='ensemble', help='Префикс выходных файлов')
+    parser.add_argument('--kind', choices=KINDS, default='auto')
+    parser.add_argument('-q', '--quantiles', type=float, nargs='*', default=[0.05, 0.5, 0.95])
+    parser.add_argument('--bins', type=int, default=DEFAULT_BINS, help='Корзин гистограммы на ячейку')
+    parser.add_argument('-j', '--workers', type=int, help='Число процессов (по умолчанию — все ядра)')
+    parser.add_argument('--plot', nargs='*', choices=STATISTICS, default=[], help='Нарисовать статистики')
+    parser.add_argument('-x', '--x-slice', type=float)
+    parser.add_argument('-y', '--y-slice', type=float)
+    parser.add_argument('-z', '--z-slice', type=float)
+
+    args = parser.parse_args()
+
+    files = expand_inputs(args.inputs)
+    start = time.perf_counter()
+    try:
+        accumulator, kind = run_ensemble(files, args.kind, args.bins, args.workers)
+    except (OSError, ValueError) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        exit(1)
+    stats = accumulator.statistics(args.quantiles)
+    print(f"Реализаций: {accumulator.count}, значений в каждой: {len(accumulator.mean)}, "
+          f"{time.perf_counter() - start:.2f} c")
+
+    directory = os.path.dirname(args.output_prefix)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    np.savez(f"{args.output_prefix}_stats.npz", count=accumulator.count, **stats)
+    if kind == 'mesh':
+        template = load_mesh(files[0])
+        for name in ('mean', 'std'):
+            save_mesh(template.with_density(stats[name]), f"{args.output_prefix}_{name}.gxm")
+
+    slices = {'x_slice': args.x_slice, 'y_slice': args.y_slice, 'z_slice': args.z_slice}
+    for name in args.plot:
+        plot_statistic(files[0], kind, stats[name], name, f"{args.output_prefix}_{name}.png", slices)
@@ -0,0 +1,102 @@
+from typing import Optional
+
+import numpy as np
+
+from mesh_geometry import PLANE_AXES, grid_index_ranges
+from mesh_loader import MeshData
+
+REDUCERS = ('max', 'mean', 'volume')
+
+# Ограничение числа пар (ячейка, пиксель), разворачиваемых за один раз
+MAX_PIXELS_PER_CHUNK = 1 << 22
+
+
+def _box_sum(values, i0, i1, j0, j1, nx, ny) -> np.ndarray:
+    """Сумма значений по прямоугольникам пикселей через разностный массив"""
+    diff = np.zeros((ny + 1) * (nx + 1))
+    width = nx + 1
+    for rows, cols, sign in ((j0, i0, 1), (j0, i1, -1), (j1, i0, -1), (j1, i1, 1)):
+        diff += sign * np.bincount(rows * width + cols, weights=values, minlength=diff.size)
+    return diff.reshape(ny + 1, nx + 1).cumsum(axis=0).cumsum(axis=1)[:ny, :nx]
+
+
+def _box_max(values, i0, i1, j0, j1, nx, ny) -> np.ndarray:
+    """Максимум по прямоугольникам: развёртка пар (ячейка, пиксель) порциями"""
+    image = np.full(ny * nx, -np.inf)
+    widths = i1 - i0
+    counts = widths * (j1 - j0)
+    cumulative = np.cumsum(counts)
+
+    start = 0
+    while start < len(values):
+        limit = (cumulative[start - 1] if start else 0) + MAX_PIXELS_PER_CHUNK
+        stop = max(start + 1, int(np.searchsorted(cumulative, limit, side='right')))
+        chunk = slice(start, stop)
+
+        cell = np.repeat(np.arange(stop - start), counts[chunk])
+        offsets = np.cumsum(counts[chunk]) - counts[chunk]
+        local = np.arange(len(cell)) - offsets[cell]
+        width = widths[chunk][cell]
+        rows = j0[chunk][cell] + local // width
+        cols = i0[chunk][cell] + local % width
+        np.maximum.at(image, rows * nx + cols, values[chunk][cell])
+        start = stop
+
+    return image.reshape(ny, nx)
+
+
+def rasterize_projection(
+        mesh: MeshData,
+        plane: str,
+        resolution: int = 512,
+        reducer: str = 'mean',
+        extent: Optional[tuple[float, float, float, float]] = None,
+        values: Optional[np.ndarray] = None
+) -> tuple[np.ndarray, tuple[float, float, float, float]]:
+    """Проекция ячеек на регулярную 2D сетку с агрегацией по глубине.
+
+    reducer: 'max' — максимум вдоль проецируемой оси, 'mean' — среднее по
+    ячейкам, 'volume' — среднее, взвешенное по объёму (толщине) ячеек.
+    Возвращает изображение (ny, nx) с NaN в пустых пикселях и extent для imshow.
+    """
+    if reducer not in REDUCERS:
+        raise ValueError(f"Неизвестный способ агрегации: {reducer}")
+
+    values = mesh.density if values is None else values
+    x_index, y_index = PLANE_AXES[plane]
+    depth_index = 3 - x_index - y_index
+    lower, upper = mesh.lower, mesh.upper
+
+    if extent is None:
+        extent = (lower[:, x_index].min(), upper[:, x_index].max(),
+                  lower[:, y_index].min(), upper[:, y_index].max())
+    x_min, x_max, y_min, y_max = extent
+
+    # Квадратные пиксели, большая сторона получает resolution пикселей
+    size = max(x_max - x_min, y_max - y_min) / resolution
+    nx = max(1, int(np.ceil((x_max - x_min) / size)))
+    ny = max(1, int(np.ceil((y_max - y_min) / size)))
+
+    i0, i1 = grid_index_ranges(lower[:, x_index], upper[:, x_index], x_min, size, nx)
+    j0, j1 = grid_index_ranges(lower[:, y_index], upper[:, y_index], y_min, size, ny)
+    visible = (i1 > i0) & (j1 > j0)
+    i0, i1, j0, j1, values = i0[visible], i1[visible], j0[visible], j1[visible], values[visible]
+
+    if reducer == 'max':
+        image = _box_max(values, i0, i1, j0, j1, nx, ny)
+        image[np.isneginf(image)] = np.nan
+    else:
+        weights = (2 * mesh.bound[visible, depth_index] if reducer == 'volume'
+                   else np.ones_like(values))
+        total = _box_sum(values * weights, i0, i1, j0, j1, nx, ny)
+        weight = _box_sum(weights, i0, i1, j0, j1, nx, ny)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            image = np.where(weight > 0.5 * weights.min(initial=np.inf), total / weight, np.nan)
+
+    return image, (x_min, x_min + nx * size, y_min, y_min + ny * size)
+
+
+def draw_raster(ax, image: np.ndarray, extent, cmap, norm, **kwargs):
+    """Отрисовка растровой проекции одним изображением"""
+    return ax.imshow(image, extent=extent, origin='lower', cmap=cmap, norm=norm,
+                     interpolation='nearest', **kwargs)
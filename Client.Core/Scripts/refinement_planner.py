@@ -0,0 +1,375 @@
+"""План дробления и слияния ячеек по невязке (как MeshRefinerService).
+
+Решения те же, что в RefineOrMergeCellsAdvanced: пороги невязки,
+MinCellSizeFraction/MaxCellSizeFraction, MaxSubdivisionLevel, дробление
+на 8 дочерних ячеек с той же геометрией и слияние удвоением размеров.
+
+Локальная невязка — взвешивание 1/(d + ε) по всем сенсорам. Сенсоры
+группируются в кластеры; дальние кластеры учитываются одним слагаемым по
+центру масс, ближние (ближе cluster_radius / theta) — по каждому сенсору,
+пары находятся запросом к k-d дереву. theta=0 — точная сумма по всем сенсорам;
+она же используется, пока пар (ячейка, сенсор) не больше EXACT_PAIRS_LIMIT,
+где приближение не даёт выигрыша. С приближением решения у самых порогов
+могут отличаться от MeshRefinerService.
+Проверка соседей при слиянии — пакетный запрос радиуса к дереву сенсоров,
+у которых невязка выше порога слияния.
+"""
+import argparse
+import json
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from mesh_loader import MeshData, load_mesh, load_sensors, save_mesh
+
+# Эпсилон из CalculateLocalResidual (константа float 1e-3f)
+RESIDUAL_EPSILON = float(np.float32(1e-3))
+
+# Радиус проверки соседей при слиянии в размерах ячейки (CanMergeWithNeighbors)
+MERGE_INFLUENCE_FACTOR = 2.5
+
+# Порядок дочерних ячеек SplitCell: dx, dy, dz по −1, 1
+CHILD_SIGNS = np.array([[dx, dy, dz] for dx in (-1, 1) for dy in (-1, 1) for dz in (-1, 1)], dtype=np.float64)
+
+KEEP, REFINE, MERGE = 0, 1, 2
+
+DEFAULT_THETA = 0.25
+SENSORS_PER_CLUSTER = 16
+
+# До этого числа пар (ячейка, сенсор) точная сумма не медленнее кластеров
+EXACT_PAIRS_LIMIT = 1 << 27
+
+# Число пар (ячейка, сенсор или кластер) в одном блоке
+DEFAULT_BLOCK_SIZE = 1 << 22
+
+
+@dataclass(frozen=True)
+class RefinementOptions:
+    """Параметры из Common/Models/MeshRefinementOptions.cs"""
+    min_cell_size_fraction: float = 0.1
+    max_cell_size_fraction: float = 0.5
+    max_subdivision_level: int = 5
+    initial_refine_threshold: float = 1e-4
+    initial_merge_threshold: float = 1e-6
+    refinement_decay: float = 0.8
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'RefinementOptions':
+        """Из JSON в формате C# (mesh_refinement_options.json)"""
+        defaults = cls()
+        return cls(
+            min_cell_size_fraction=data.get('MinCellSizeFraction', defaults.min_cell_size_fraction),
+            max_cell_size_fraction=data.get('MaxCellSizeFraction', defaults.max_cell_size_fraction),
+            max_subdivision_level=data.get('MaxSubdivisionLevel', defaults.max_subdivision_level),
+            initial_refine_threshold=data.get('InitialRefineThreshold', defaults.initial_refine_threshold),
+            initial_merge_threshold=data.get('InitialMergeThreshold', defaults.initial_merge_threshold),
+            refinement_decay=data.get('RefinementDecay', defaults.refinement_decay)
+        )
+
+    @classmethod
+    def load(cls, file_path: str) -> 'RefinementOptions':
+        with open(file_path, 'r', encoding='utf-8-sig') as f:
+            return cls.from_dict(json.load(f))
+
+    def thresholds(self, iteration: int) -> tuple[float, float]:
+        """Пороги дробления и слияния с затуханием RefinementDecay"""
+        decay = self.refinement_decay ** iteration
+        return self.initial_refine_threshold * decay, self.initial_merge_threshold * decay
+
+
+@dataclass(frozen=True)
+class RefinementPlan:
+    """Новая сетка и решение для каждой исходной ячейки"""
+    mesh: MeshData
+    actions: np.ndarray  # (N,), KEEP / REFINE / MERGE
+    local_residual: np.ndarray  # (N,)
+    source: np.ndarray  # (K,), номер исходной ячейки для каждой новой
+
+    def counts(self) -> dict[str, int]:
+        return {name: int(np.count_nonzero(self.actions == action))
+                for name, action in (('refined', REFINE), ('merged', MERGE), ('kept', KEEP))}
+
+
+def _inverse_distance(points: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """Веса 1/(d + ε), расстояние во float32, как Vector3.Distance"""
+    delta = points[:, np.newaxis, :] - targets[np.newaxis, :, :]
+    distance = np.sqrt(np.einsum('ijk,ijk->ij', delta, delta)).astype(np.float64)
+    return 1.0 / (distance + RESIDUAL_EPSILON)
+
+
+def _dense_residual(centers, sensors, magnitude, counts, block_size):
+    """Σ w·|r| и Σ w по всем точкам targets блоками ячеек (counts — кратности точек)"""
+    weighted = np.empty(len(centers))
+    total = np.empty(len(centers))
+    rows = max(1, block_size // max(1, len(sensors)))
+    for start in range(0, len(centers), rows):
+        weights = _inverse_distance(centers[start:start + rows], sensors)
+        weighted[start:start + rows] = weights @ magnitude
+        total[start:start + rows] = weights @ counts
+    return weighted, total
+
+
+def _sensor_clusters(sensors: np.ndarray) -> tuple[np.ndarray, float]:
+    """Номер кластера каждого сенсора по регулярной сетке и наибольшее удаление от центра масс"""
+    low = sensors.min(axis=0)
+    extent = sensors.max(axis=0) - low
+    spanned = extent[extent > 0]
+    if len(spanned) == 0:
+        return np.zeros(len(sensors), dtype=np.int64), 0.0
+
+    # Сетка по занятым осям (обычно плоскость съёмки), около SENSORS_PER_CLUSTER сенсоров в кластере
+    clusters = max(1.0, len(sensors) / SENSORS_PER_CLUSTER)
+    size = (np.prod(spanned) / clusters) ** (1.0 / len(spanned))
+    keys = np.floor((sensors - low) / size).astype(np.int64)
+    _, labels = np.unique(keys, axis=0, return_inverse=True)
+    return labels.ravel(), float(np.sqrt(len(spanned)) * size)
+
+
+def local_residuals(centers: np.ndarray, sensors: np.ndarray, residuals: np.ndarray,
+                    theta: float = DEFAULT_THETA, block_size: int = DEFAULT_BLOCK_SIZE) -> np.ndarray:
+    """Локальная невязка CalculateLocalResidual для всех ячеек.
+
+    theta > 0 включает приближение дальних кластеров, если пар больше EXACT_PAIRS_LIMIT.
+    """
+    centers = np.asarray(centers, dtype=np.float32)
+    sensors = np.asarray(sensors, dtype=np.float32)
+    magnitude = np.abs(np.asarray(residuals, dtype=np.float64))
+    if len(sensors) == 0:
+        return np.zeros(len(centers))
+
+    if theta <= 0 or len(centers) * len(sensors) <= EXACT_PAIRS_LIMIT:
+        weighted, total = _dense_residual(centers, sensors, magnitude, np.ones(len(sensors)), block_size)
+        return weighted / total
+
+    from scipy.spatial import cKDTree
+
+    labels, radius = _sensor_clusters(sensors.astype(np.float64))
+    count = np.bincount(labels).astype(np.float64)
+    centroid = np.column_stack([np.bincount(labels, weights=sensors[:, k]) for k in range(3)]) / count[:, None]
+    cluster_magnitude = np.bincount(labels, weights=magnitude)
+
+    # Все кластеры одним слагаемым: n/(D + ε) и Σ|r|/(D + ε)
+    weighted, total = _dense_residual(centers, centroid.astype(np.float32), cluster_magnitude, count, block_size)
+
+    # Ближние кластеры: слагаемое по центру масс заменяется суммой по сенсорам
+    order = np.argsort(labels, kind='stable')
+    starts = np.concatenate([[0], np.cumsum(count.astype(np.int64))])
+    cluster_tree = cKDTree(centroid)
+    cells_per_block = max(1, block_size // (64 * SENSORS_PER_CLUSTER))
+
+    for block_start in range(0, len(centers), cells_per_block):
+        block = centers[block_start:block_start + cells_per_block].astype(np.float64)
+        pairs = cluster_tree.sparse_distance_matrix(cKDTree(block), radius / theta, output_type='ndarray')
+        cluster_index = pairs['i'].astype(np.int64)
+        cell_index = pairs['j'].astype(np.int64) + block_start
+
+        approximate = 1.0 / (pairs['v'] + RESIDUAL_EPSILON)
+        weighted -= np.bincount(cell_index, weights=approximate * cluster_magnitude[cluster_index],
+                                minlength=len(centers))
+        total -= np.bincount(cell_index, weights=approximate * count[cluster_index], minlength=len(centers))
+
+        # Развёртка пар (ячейка, кластер) в пары (ячейка, сенсор кластера)
+        sizes = count.astype(np.int64)[cluster_index]
+        pair = np.repeat(np.arange(len(cluster_index)), sizes)
+        offset = np.arange(len(pair)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        members = order[starts[cluster_index][pair] + offset]
+        cells = cell_index[pair]
+
+        delta = centers[cells] - sensors[members]
+        weights = 1.0 / (np.sqrt(np.einsum('ij,ij->i', delta, delta)).astype(np.float64) + RESIDUAL_EPSILON)
+        weighted += np.bincount(cells, weights=weights * magnitude[members], minlength=len(centers))
+        total += np.bincount(cells, weights=weights, minlength=len(centers))
+
+    return weighted / total
+
+
+def merge_allowed(mesh: MeshData, sensors: np.ndarray, residuals: np.ndarray, threshold_merge: float,
+                  candidates: Optional[np.ndarray] = None) -> np.ndarray:
+    """CanMergeWithNeighbors: в радиусе 2.5·max(Bound) нет сенсоров с |r| > порога"""
+    from scipy.spatial import cKDTree
+
+    candidates = np.arange(len(mesh)) if candidates is None else candidates
+    allowed = np.ones(len(candidates), dtype=bool)
+    loud = np.abs(residuals) > threshold_merge
+    if len(candidates) == 0 or not loud.any():
+        return allowed
+
+    tree = cKDTree(np.asarray(sensors, dtype=np.float32)[loud].astype(np.float64))
+    radius = MERGE_INFLUENCE_FACTOR * np.asarray(mesh.bound)[candidates].max(axis=1)
+    centers = np.asarray(mesh.center, dtype=np.float32)[candidates].astype(np.float64)
+    return tree.query_ball_point(centers, radius, return_length=True) == 0
+
+
+def split_cells(mesh: MeshData, indices: np.ndarray) -> MeshData:
+    """Дочерние ячейки SplitCell для ячеек indices, по 8 подряд на каждую"""
+    half = np.repeat(np.asarray(mesh.bound)[indices] / 2, len(CHILD_SIGNS), axis=0)
+    signs = np.tile(CHILD_SIGNS, (len(indices), 1))
+    return MeshData(
+        center=np.repeat(np.asarray(mesh.center)[indices], len(CHILD_SIGNS), axis=0) + signs * half / 2,
+        bound=half,
+        density=np.repeat(np.asarray(mesh.density)[indices], len(CHILD_SIGNS)),
+        level=np.repeat(np.asarray(mesh.level)[indices] + 1, len(CHILD_SIGNS)),
+        sensors=mesh.sensors,
+        sensor_values=mesh.sensor_values
+    )
+
+
+def plan_refinement(
+        mesh: MeshData,
+        sensors: np.ndarray,
+        residuals: np.ndarray,
+        threshold_refine: float,
+        threshold_merge: float,
+        options: RefinementOptions,
+        grid_width: Optional[float] = None,
+        max_residual: Optional[float] = None,
+        theta: float = DEFAULT_THETA
+) -> RefinementPlan:
+    """Решения RefineOrMergeCellsAdvanced и новая сетка в том же порядке ячеек.
+
+    grid_width — EndX − StartX сетки сенсоров (по умолчанию размах сенсоров по X),
+    max_residual — по умолчанию max|r|. При theta > 0 на больших сетках решения
+    у самых порогов могут отличаться от MeshRefinerService; theta=0 — точно как в C#.
+    """
+    sensors = np.asarray(sensors, dtype=np.float64)
+    residuals = np.asarray(residuals, dtype=np.float64)
+    if grid_width is None:
+        grid_width = float(np.ptp(sensors[:, 0])) if len(sensors) else 0.0
+    if max_residual is None:
+        max_residual = float(np.max(np.abs(residuals), initial=0.0))
+
+    local = local_residuals(mesh.center, sensors, residuals, theta)
+    bound = np.asarray(mesh.bound)
+    level = np.asarray(mesh.level)
+
+    refine = ((local > threshold_refine)
+              & (local > 0.2 * max_residual)
+              & (bound[:, 0] > options.min_cell_size_fraction * grid_width)
+              & (level < options.max_subdivision_level))
+    merge = ~refine & (local < threshold_merge) & (bound[:, 0] * 2 <= options.max_cell_size_fraction * grid_width)
+    merge[merge] = merge_allowed(mesh, sensors, residuals, threshold_merge, np.flatnonzero(merge))
+
+    actions = np.full(len(mesh), KEEP, dtype=np.int8)
+    actions[refine] = REFINE
+    actions[merge] = MERGE
+
+    # Новые ячейки на месте исходных: 8 дочерних вместо дробимой
+    copies = np.where(refine, len(CHILD_SIGNS), 1)
+    source = np.repeat(np.arange(len(mesh)), copies)
+    center = np.asarray(mesh.center)[source].copy()
+    new_bound = bound[source].copy()
+    new_level = level[source].astype(np.float64)
+
+    merged_rows = np.flatnonzero(merge[source])
+    new_bound[merged_rows] *= 2
+    new_level[merged_rows] = np.maximum(0, new_level[merged_rows] - 1)
+
+    child_rows = np.flatnonzero(refine[source])
+    children = split_cells(mesh, np.flatnonzero(refine))
+    center[child_rows] = children.center
+    new_bound[child_rows] = children.bound
+    new_level[child_rows] = children.level
+
+    return RefinementPlan(
+        mesh=MeshData(center=center, bound=new_bound, density=np.asarray(mesh.density)[source], level=new_level,
+                      sensors=mesh.sensors, sensor_values=mesh.sensor_values),
+        actions=actions,
+        local_residual=local,
+        source=source
+    )
+
+
+def plot_plan(plan: RefinementPlan, sensors: np.ndarray, residuals: np.ndarray,
+              output_image: str = 'refinement_plan.png', show: bool = False):
+    """Проекции новой сетки с раскраской по решению и невязка на сенсорах"""
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import PolyCollection
+    from matplotlib.patches import Patch
+
+    from mesh_geometry import PLANE_AXES, projection_rectangles
+
+    action_colors = np.array([[0.8, 0.8, 0.8, 0.4], [0.9, 0.4, 0.1, 0.8], [0.2, 0.4, 0.9, 0.8]])
+    colors = action_colors[plan.actions[plan.source]]
+    # Дроблённые и слитые ячейки рисуются поверх сохранённых
+    order = np.argsort(plan.actions[plan.source], kind='stable')
+
+    fig, axes = plt.subplots(1, 3, figsize=(20, 7))
+    for ax, plane in zip(axes[:2], ('xy', 'xz')):
+        ax.add_collection(PolyCollection(projection_rectangles(plan.mesh.subset(order), plane),
+                                         facecolors=colors[order], edgecolors='k', linewidths=0.3))
+        x_index, y_index = PLANE_AXES[plane]
+        lower, upper = plan.mesh.extent()
+        ax.set_xlim(lower[x_index], upper[x_index])
+        ax.set_ylim(lower[y_index], upper[y_index])
+        ax.set_aspect('equal')
+        ax.set_title(f"{plane.upper()} Projection")
+
+    counts = plan.counts()
+    axes[0].legend(handles=[Patch(color=action_colors[REFINE], label=f"Дробление: {counts['refined']}"),
+                            Patch(color=action_colors[MERGE], label=f"Слияние: {counts['merged']}"),
+                            Patch(color=action_colors[KEEP], label=f"Без изменений: {counts['kept']}")],
+                   loc='upper right', fontsize=8)
+
+    scatter = axes[2].scatter(sensors[:, 0], sensors[:, 1], c=np.abs(residuals), cmap='viridis', s=12)
+    fig.colorbar(scatter, ax=axes[2], label='|r|')
+    axes[2].set_aspect('equal')
+    axes[2].set_title('Невязка на сенсорах')
+
+    fig.savefig(output_image, dpi=200, bbox_inches='tight')
+    if show:
+        plt.show()
+    plt.close(fig)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='План дробления и слияния ячеек по невязке',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('mesh', help='Текущая сетка (JSON или .gxm)')
+    parser.add_argument('observed', help='Наблюдённая аномалия (файл сенсоров)')
+    parser.add_argument('model', help='Расчётная аномалия текущей модели (файл сенсоров)')
+    parser.add_argument('--options', default='Properties/mesh_refinement_options.json',
+                        help='MeshRefinementOptions в формате C#')
+    parser.add_argument('--iteration', type=int, default=0, help='Номер итерации для затухания порогов')
+    parser.add_argument('--threshold-refine', type=float, help='Порог дробления (по умолчанию из параметров)')
+    parser.add_argument('--threshold-merge', type=float, help='Порог слияния (по умолчанию из параметров)')
+    parser.add_argument('--grid-width', type=float, help='EndX − StartX сетки сенсоров')
+    parser.add_argument('--theta', type=float, default=DEFAULT_THETA,
+                        help='Точность учёта дальних кластеров сенсоров (0 — точная сумма, как в C#); '
+                             'при > 0 на больших сетках решения у порогов могут отличаться от MeshRefinerService')
+    parser.add_argument('-o', '--output', default='refined.gxm', help='Новая сетка (.gxm или .json)')
+    parser.add_argument('--plot', help='Сохранить диагностический график')
+
+    args = parser.parse_args()
+
+    try:
+        options = RefinementOptions.load(args.options)
+    except FileNotFoundError:
+        options = RefinementOptions()
+    threshold_refine, threshold_merge = options.thresholds(args.iteration)
+
+    mesh = load_mesh(args.mesh)
+    coords, observed = load_sensors(args.observed)
+    _, model = load_sensors(args.model)
+    if observed is None or model is None:
+        print("Ошибка: в файлах сенсоров нет значений")
+        exit(1)
+    residuals = observed - model
+
+    start = time.perf_counter()
+    plan = plan_refinement(
+        mesh, coords, residuals,
+        args.threshold_refine if args.threshold_refine is not None else threshold_refine,
+        args.threshold_merge if args.threshold_merge is not None else threshold_merge,
+        options, args.grid_width, theta=args.theta
+    )
+    counts = plan.counts()
+    print(f"→ Refined: {counts['refined']}, Merged: {counts['merged']}, Kept: {counts['kept']} "
+          f"({time.perf_counter() - start:.3f} c)")
+
+    save_mesh(plan.mesh, args.output)
+    if args.plot:
+        plot_plan(plan, coords, residuals, output_image=args.plot)
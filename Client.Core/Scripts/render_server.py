@@ -0,0 +1,149 @@
+"""Долгоживущий сервер отрисовки графиков.
+
+Протокол: по одному JSON-объекту на строку в stdin, по одному ответу на строку
+в stdout (в стиле JSON-RPC):
+
+    {"id": 1, "method": "render", "params": {"script": "testing_chart",
+     "input": "mesh_data.json", "output": "mesh_chart.png", "options": {}}}
+    {"id": 1, "result": {"image": "mesh_chart.png", "seconds": 0.42}}
+    {"id": 1, "error": {"message": "..."}}
+
+Методы: render, ping, shutdown. Вывод самих скриптов перенаправляется в stderr,
+чтобы не смешиваться с протоколом. Библиотеки импортируются один раз.
+"""
+import contextlib
+import json
+import os
+import sys
+import time
+import traceback
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+
+import anomaly_chart
+import inverse_chart
+import mesh_chart
+import show_plots_script
+import telemetry
+import testing_chart
+from mesh_loader import load_mesh, load_sensors
+
+
+class InputCache:
+    """Кэш разобранных входных файлов по (путь, время изменения, размер)"""
+
+    def __init__(self, maxsize: int = 4):
+        self.maxsize = maxsize
+        self._items = {}
+
+    def get(self, path: str, loader):
+        stat = os.stat(path)
+        key = (os.path.abspath(path), loader.__name__, stat.st_mtime_ns, stat.st_size)
+        cached = key in self._items
+        if not cached:
+            if len(self._items) >= self.maxsize:
+                self._items.pop(next(iter(self._items)))
+            self._items[key] = loader(path)
+        telemetry.checkpoint('load', cached=cached)
+        return self._items[key]
+
+
+def _load_mesh(path: str):
+    # Без отображения в память: файл перезаписывается клиентом, пока данные лежат в кэше
+    return load_mesh(path, mmap=False)
+
+
+def _read_json(path: str):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def _render_show_plots(cache, input_path, output, options):
+    show_plots_script.plot_cell_mesh(cache.get(input_path, _load_mesh), output_image=output, show=False, **options)
+
+
+def _render_testing_chart(cache, input_path, output, options):
+    testing_chart.plot_mesh(cache.get(input_path, _load_mesh), output_image=output, **options)
+
+
+def _render_mesh_chart(cache, input_path, output, options):
+    mesh_chart.plot_projections(cache.get(input_path, _read_json), output, **options)
+
+
+def _render_anomaly_chart(cache, input_path, output, options):
+    coords, values = cache.get(input_path, load_sensors)
+    anomaly_chart.plot_sensors(coords, values, output_image=output, **options)
+
+
+def _render_inverse_chart(cache, input_path, output, options):
+    viewer = inverse_chart.InteractiveSliceViewer(cache.get(input_path, _load_mesh), show=False, **options)
+    telemetry.checkpoint('draw')
+    viewer.fig.savefig(output, dpi=300)
+    telemetry.checkpoint('save', figure=viewer.fig)
+    viewer.close()
+
+
+RENDERERS = {
+    'show_plots_script': _render_show_plots,
+    'testing_chart': _render_testing_chart,
+    'mesh_chart': _render_mesh_chart,
+    'anomaly_chart': _render_anomaly_chart,
+    'inverse_chart': _render_inverse_chart
+}
+
+
+def render(cache: InputCache, params: dict) -> dict:
+    script = params['script']
+    if script not in RENDERERS:
+        raise ValueError(f"Неизвестный скрипт: {script}")
+
+    start = time.perf_counter()
+    try:
+        with telemetry.session(script):
+            RENDERERS[script](cache, params['input'], params['output'], params.get('options') or {})
+    finally:
+        plt.close('all')
+    return {'image': params['output'], 'seconds': time.perf_counter() - start}
+
+
+def serve(stdin=sys.stdin, stdout=sys.stdout):
+    cache = InputCache()
+
+    for line in stdin:
+        if not line.strip():
+            continue
+
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            method = request.get('method')
+
+            if method == 'shutdown':
+                response = {'id': request_id, 'result': {'stopped': True}}
+            elif method == 'ping':
+                response = {'id': request_id, 'result': {'pid': os.getpid()}}
+            elif method == 'render':
+                with contextlib.redirect_stdout(sys.stderr):
+                    response = {'id': request_id, 'result': render(cache, request['params'])}
+            else:
+                raise ValueError(f"Неизвестный метод: {method}")
+        except Exception as e:
+            traceback.print_exc(file=sys.stderr)
+            response = {'id': request_id, 'error': {'message': str(e), 'type': type(e).__name__}}
+
+        stdout.write(json.dumps(response, ensure_ascii=False) + '\n')
+        stdout.flush()
+
+        if response.get('result', {}).get('stopped'):
+            break
+
+
+if __name__ == '__main__':
+    sys.stdin.reconfigure(encoding='utf-8')
+    sys.stdout.reconfigure(encoding='utf-8')
+    serve()
@@ -1,124 +1,50 @@
 import argparse
-import json
-from dataclasses import dataclass
-from typing import List, Optional
+from typing import Optional
 
 import matplotlib.pyplot as plt
 import numpy as np
 from matplotlib.cm import ScalarMappable
-from matplotlib.patches import Polygon
+from matplotlib.collections import PolyCollection
 from mpl_toolkits.mplot3d.art3d import Line3DCollection
-from scipy.spatial import ConvexHull
 
-
-@dataclass(frozen=True)
-class Point3D:
-    X: float
-    Y: float
-    Z: float
-
-
-@dataclass(frozen=True)
-class Sensor:
-    Position: Point3D
-    ComponentDirection: str
-
-
-@dataclass
-class Cell:
-    CenterX: float
-    CenterY: float
-    CenterZ: float
-    BoundX: float
-    BoundY: float
-    BoundZ: float
-    Density: float
-    SubdivisionLevel: float
-
-
-def load_from_json(file_path: str) -> tuple[List[Cell], List[Sensor]]:
-    """Загрузка данных из JSON файла"""
-    try:
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-    except FileNotFoundError:
-        raise ValueError(f"Файл {file_path} не найден")
-    except json.JSONDecodeError:
-        raise ValueError(f"Ошибка парсинга JSON в файле {file_path}")
-
-    cells = []
-    for cell_data in data['Cells']:
-        cell = Cell(
-            CenterX=cell_data['CenterX'],
-            CenterY=cell_data['CenterY'],
-            CenterZ=cell_data['CenterZ'],
-            BoundX=cell_data['BoundX'],
-            BoundY=cell_data['BoundY'],
-            BoundZ=cell_data['BoundZ'],
-            Density=cell_data['Density'],
-            SubdivisionLevel=cell_data['SubdivisionLevel']
-        )
-        cells.append(cell)
-
-    sensors = []
-    for sensor_data in data.get('sensors', []):
-        pos_data = sensor_data['Position']
-        sensors.append(Sensor(
-            Position=Point3D(
-                X=pos_data['X'],
-                Y=pos_data['Y'],
-                Z=pos_data['Z']
-            ),
-            ComponentDirection=sensor_data['ComponentDirection']
-        ))
-
-    return cells, sensors
-
-
-def get_cell_edges(cell: Cell) -> np.ndarray:
-    """Генерирует рёбра ячейки в формате аналогичном FiniteElement"""
-    corners = np.array([
-        [cell.CenterX - cell.BoundX, cell.CenterY - cell.BoundY, cell.CenterZ - cell.BoundZ],
-        [cell.CenterX + cell.BoundX, cell.CenterY - cell.BoundY, cell.CenterZ - cell.BoundZ],
-        [cell.CenterX + cell.BoundX, cell.CenterY + cell.BoundY, cell.CenterZ - cell.BoundZ],
-        [cell.CenterX - cell.BoundX, cell.CenterY + cell.BoundY, cell.CenterZ - cell.BoundZ],
-        [cell.CenterX - cell.BoundX, cell.CenterY - cell.BoundY, cell.CenterZ + cell.BoundZ],
-        [cell.CenterX + cell.BoundX, cell.CenterY - cell.BoundY, cell.CenterZ + cell.BoundZ],
-        [cell.CenterX + cell.BoundX, cell.CenterY + cell.BoundY, cell.CenterZ + cell.BoundZ],
-        [cell.CenterX - cell.BoundX, cell.CenterY + cell.BoundY, cell.CenterZ + cell.BoundZ]
-    ])
-
-    # Определение рёбер куба
-    edges = [
-        [corners[0], corners[1]], [corners[1], corners[2]], [corners[2], corners[3]], [corners[3], corners[0]],
-        [corners[4], corners[5]], [corners[5], corners[6]], [corners[6], corners[7]], [corners[7], corners[4]],
-        [corners[0], corners[4]], [corners[1], corners[5]], [corners[2], corners[6]], [corners[3], corners[7]]
-    ]
-    return np.array(edges)
-
-
-def get_cell_corners(cell: Cell) -> np.ndarray:
-    """Возвращает все 8 углов ячейки"""
-    return np.array([
-        [cell.CenterX - cell.BoundX, cell.CenterY - cell.BoundY, cell.CenterZ - cell.BoundZ],
-        [cell.CenterX + cell.BoundX, cell.CenterY - cell.BoundY, cell.CenterZ - cell.BoundZ],
-        [cell.CenterX + cell.BoundX, cell.CenterY + cell.BoundY, cell.CenterZ - cell.BoundZ],
-        [cell.CenterX - cell.BoundX, cell.CenterY + cell.BoundY, cell.CenterZ - cell.BoundZ],
-        [cell.CenterX - cell.BoundX, cell.CenterY - cell.BoundY, cell.CenterZ + cell.BoundZ],
-        [cell.CenterX + cell.BoundX, cell.CenterY - cell.BoundY, cell.CenterZ + cell.BoundZ],
-        [cell.CenterX + cell.BoundX, cell.CenterY + cell.BoundY, cell.CenterZ + cell.BoundZ],
-        [cell.CenterX - cell.BoundX, cell.CenterY + cell.BoundY, cell.CenterZ + cell.BoundZ]
-    ])
+import telemetry
+from mesh_geometry import (
+    EDGES_PER_CELL,
+    PLANE_AXES,
+    cell_colors,
+    cell_corners,
+    cell_edges,
+    projection_rectangles,
+    slice_rectangles
+)
+from mesh_loader import CellFilter, MeshData, load_mesh
+from mesh_lod import DEFAULT_RENDER_BUDGET, reduce_to_budget
+from projection_raster import REDUCERS, draw_raster, rasterize_projection
 
 
 def plot_cell_mesh(
-        cells: List[Cell],
-        sensors: List[Sensor],
+        mesh: MeshData,
         x_slice: Optional[float] = None,
         y_slice: Optional[float] = None,
-        z_slice: Optional[float] = None
+        z_slice: Optional[float] = None,
+        projection_mode: str = 'patches',
+        reducer: str = 'mean',
+        resolution: int = 512,
+        render_budget: int = DEFAULT_RENDER_BUDGET,
+        output_image: str = 'graph.png',
+        show: bool = True,
+        value_label: str = 'Mu',
+        cmap: str = 'RdYlGn_r',
+        limits: Optional[tuple[float, float]] = None
 ):
-    """Функция визуализации с идентичным стилем"""
+    """Функция визуализации с идентичным стилем.
+
+    projection_mode='raster' строит проекции агрегацией плотности по глубине
+    на регулярной сетке (reducer: max, mean, volume) вместо отрисовки ячеек.
+    render_budget ограничивает число ячеек в 3D виде (0 — без ограничения).
+    value_label — подпись цветовой шкалы для значений в ячейках, limits —
+    её пределы (по умолчанию диапазон значений).
+    """
     fig = plt.figure(figsize=(18, 12))
     gs = fig.add_gridspec(2, 2,
                           left=0.05, right=0.88,
@@ -131,13 +57,22 @@ def plot_cell_mesh(
     ax_bottom_right = fig.add_subplot(gs[1, 1])
 
     # Настройки как в оригинальном скрипте
-    densities = [cell.Density for cell in cells]
-    norm = plt.Normalize(min(densities), max(densities))
-    cmap = plt.get_cmap('RdYlGn_r')
+    norm = plt.Normalize(*(limits or (mesh.density.min(), mesh.density.max())))
+    cmap = plt.get_cmap(cmap)
     mappable = ScalarMappable(norm=norm, cmap=cmap)
 
+    # Геометрия и цвета всех ячеек за один проход
+    corners = cell_corners(mesh)
+    colors = cell_colors(mesh.density, cmap, norm)
+
+    # 3D вид строится по сетке, ужатой до бюджета отрисовки
+    visible = reduce_to_budget(mesh, render_budget)
+    edges = cell_edges(corners if visible is mesh else cell_corners(visible))
+    edge_colors = colors if visible is mesh else cell_colors(visible.density, cmap, norm)
+    telemetry.checkpoint('geometry', cells=len(mesh), visible_cells=len(visible))
+
     # Пересчитаем границы с учётом всех углов ячеек
-    all_points = np.vstack([get_cell_corners(cell) for cell in cells])
+    all_points = corners.reshape(-1, 3)
     min_vals = all_points.min(axis=0)
     max_vals = all_points.max(axis=0)
     padding = 0.1
@@ -159,25 +94,22 @@ def plot_cell_mesh(
     ax3d.set_zlim(min_vals[2] - padding_3d, max_vals[2] + padding_3d)
 
     # 3D визуализация (как у FiniteElement)
-    if sensors:
-        sensor_coords = np.array([[s.Position.X, s.Position.Y, s.Position.Z] for s in sensors])
+    if len(mesh.sensors):
+        sensor_coords = mesh.sensors
         ax3d.scatter(
             sensor_coords[:, 0], sensor_coords[:, 1], sensor_coords[:, 2],
             c='red', marker='o', s=50, edgecolors='black', linewidths=0.3,
             label='Sensors', alpha=0.3
         )
 
-    # Отрисовка рёбер вместо граней
-    for cell in cells:
-        color = cmap(norm(cell.Density))
-        edges = get_cell_edges(cell)
-        line_collection = Line3DCollection(
-            edges,
-            colors=color,
-            linewidths=1.5,
-            alpha=0.7
-        )
-        ax3d.add_collection3d(line_collection)
+    # Отрисовка рёбер вместо граней: одна коллекция на всю сетку
+    line_collection = Line3DCollection(
+        edges,
+        colors=np.repeat(edge_colors, EDGES_PER_CELL, axis=0),
+        linewidths=1.5,
+        alpha=0.7
+    )
+    ax3d.add_collection3d(line_collection)
 
     # Одинаковые настройки осей
     ax3d.xaxis.set_pane_color((0.95, 0.95, 0.95, 0.1))
@@ -192,104 +124,42 @@ def plot_cell_mesh(
     ax3d.set_zlabel('Z', fontsize=12, labelpad=15)
     ax3d.set_title('3D View', pad=20)
 
-    # Функции для проекций (аналогичные оригиналу)
-    def get_cell_projection_points(cell: Cell, plane: str) -> List[List[float]]:
-        corners = [
-            (cell.CenterX - cell.BoundX, cell.CenterY - cell.BoundY, cell.CenterZ - cell.BoundZ),
-            (cell.CenterX + cell.BoundX, cell.CenterY - cell.BoundY, cell.CenterZ - cell.BoundZ),
-            (cell.CenterX + cell.BoundX, cell.CenterY + cell.BoundY, cell.CenterZ - cell.BoundZ),
-            (cell.CenterX - cell.BoundX, cell.CenterY + cell.BoundY, cell.CenterZ - cell.BoundZ),
-            (cell.CenterX - cell.BoundX, cell.CenterY - cell.BoundY, cell.CenterZ + cell.BoundZ),
-            (cell.CenterX + cell.BoundX, cell.CenterY - cell.BoundY, cell.CenterZ + cell.BoundZ),
-            (cell.CenterX + cell.BoundX, cell.CenterY + cell.BoundY, cell.CenterZ + cell.BoundZ),
-            (cell.CenterX - cell.BoundX, cell.CenterY + cell.BoundY, cell.CenterZ + cell.BoundZ)
-        ]
-
-        proj_points = []
-        for point in corners:
-            if plane == 'xy':
-                proj_points.append([point[0], point[1]])
-            elif plane == 'xz':
-                proj_points.append([point[0], point[2]])
-            else:
-                proj_points.append([point[1], point[2]])
-        return proj_points
-
+    # Проекции: осевые ячейки проецируются в прямоугольники, одна коллекция на панель
     def draw_projection(ax, plane: str):
         ax.cla()
         ax.set_title(f"{plane.upper()} Projection")
         ax.grid(True, linestyle='--', alpha=0.3)
 
-        for cell in cells:
-            color = cmap(norm(cell.Density))
-            points = get_cell_projection_points(cell, plane)
-
-            try:
-                hull = ConvexHull(points)
-                poly = Polygon(
-                    np.array(points)[hull.vertices],
-                    closed=True,
-                    facecolor=color,
-                    edgecolor='k',
-                    alpha=1.0
-                )
-                ax.add_patch(poly)
-            except:
-                for edge in get_cell_edges(cell):
-                    proj_edge = [
-                        [edge[0][0], edge[0][1]] if plane == 'xy' else
-                        [edge[0][0], edge[0][2]] if plane == 'xz' else
-                        [edge[0][1], edge[0][2]],
-                        [edge[1][0], edge[1][1]] if plane == 'xy' else
-                        [edge[1][0], edge[1][2]] if plane == 'xz' else
-                        [edge[1][1], edge[1][2]]
-                    ]
-                    ax.plot(
-                        [proj_edge[0][0], proj_edge[1][0]],
-                        [proj_edge[0][1], proj_edge[1][1]],
-                        color=color, linewidth=1
-                    )
-
-        ax.set_xlim(bounds[plane]['x'])
-        ax.set_ylim(bounds[plane]['y'])
+        if projection_mode == 'raster':
+            image, extent = rasterize_projection(mesh, plane, resolution=resolution, reducer=reducer)
+            draw_raster(ax, image, extent, cmap, norm)
+        else:
+            ax.add_collection(PolyCollection(
+                projection_rectangles(mesh, plane),
+                facecolors=colors,
+                edgecolors='k',
+                alpha=1.0
+            ))
+
+        x_index, y_index = PLANE_AXES[plane]
+        ax.set_xlim(min_vals[x_index], max_vals[x_index])
+        ax.set_ylim(min_vals[y_index], max_vals[y_index])
         ax.set_aspect('equal')
 
-    # Обработка сечений (полностью аналогичная оригиналу)
+    # Сечения: интервальный тест по оси, отрисовываются только пересечённые ячейки
     def draw_slice(ax, axis: str, position: float):
         ax.cla()
         ax.set_title(f"Сечение по {axis}={position:.2f}")
         ax.grid(True, linestyle='dotted', alpha=0.5)
 
-        axis_index = {'X': 0, 'Y': 1, 'Z': 2}[axis]
-        for cell in cells:
-            color = cmap(norm(cell.Density))
-            edges = get_cell_edges(cell)
-            slice_points = []
-
-            for edge in edges:
-                coord1 = edge[0][axis_index]
-                coord2 = edge[1][axis_index]
-
-                if (coord1 <= position <= coord2) or (coord2 <= position <= coord1):
-                    t = (position - coord1) / (coord2 - coord1 + 1e-9)
-                    point = edge[0] + t * (edge[1] - edge[0])
-                    slice_points.append(
-                        [point[i] for i in [0, 1, 2] if i != axis_index]
-                    )
-
-            if len(slice_points) >= 3:
-                try:
-                    hull = ConvexHull(slice_points)
-                    poly = Polygon(
-                        np.array(slice_points)[hull.vertices],
-                        closed=True,
-                        facecolor=color,
-                        edgecolor='k',
-                        alpha=1.0
-                    )
-                    ax.add_patch(poly)
-                except:
-                    pass
+        indices, slice_rects = slice_rectangles(mesh, axis, position)
+        if len(indices):
+            ax.add_collection(PolyCollection(
+                slice_rects,
+                facecolors=colors[indices],
+                edgecolors='k',
+                alpha=1.0
+            ))
 
         ax.autoscale_view()
         ax.set_aspect('equal')
@@ -315,10 +185,14 @@ def plot_cell_mesh(
 
     # Цветовая шкала
     cbar_ax = fig.add_axes([0.90, 0.15, 0.02, 0.7])
-    fig.colorbar(mappable, cax=cbar_ax, label='Mu')
+    fig.colorbar(mappable, cax=cbar_ax, label=value_label)
+    telemetry.checkpoint('draw')
 
-    plt.savefig("graph.png", dpi=300)
-    plt.show()
+    plt.savefig(output_image, dpi=300)
+    telemetry.checkpoint('save', figure=fig)
+    if show:
+        plt.show()
+    plt.close(fig)
 
 
 if __name__ == "__main__":
@@ -326,22 +200,45 @@ if __name__ == "__main__":
         description='Визуализатор ячеек сетки',
         formatter_class=argparse.ArgumentDefaultsHelpFormatter
     )
+    parser.add_argument('input', nargs='?', help='Путь к файлу сетки (то же, что -f)')
+    parser.add_argument('output', nargs='?', default='graph.png', help='Путь к выходному изображению')
     parser.add_argument('-f', '--file', default='mesh_data.json', help='Путь к JSON файлу')
     parser.add_argument('-x', '--x-slice', type=float)
     parser.add_argument('-y', '--y-slice', type=float)
     parser.add_argument('-z', '--z-slice', type=float)
+    parser.add_argument('--projection-mode', choices=['patches', 'raster'], default='patches',
+                        help='Отрисовка проекций ячейками или растром с агрегацией по глубине')
+    parser.add_argument('--reducer', choices=REDUCERS, default='mean', help='Агрегация растровой проекции')
+    parser.add_argument('--resolution', type=int, default=512, help='Разрешение растровой проекции')
+    parser.add_argument('--render-budget', type=int, default=DEFAULT_RENDER_BUDGET,
+                        help='Максимум ячеек в 3D виде (0 — без ограничения)')
+    parser.add_argument('--bbox', type=float, nargs=6, metavar=('X0', 'Y0', 'Z0', 'X1', 'Y1', 'Z1'),
+                        help='Загружать только ячейки, пересекающие бокс')
+    parser.add_argument('--no-show', action='store_true', help='Только сохранить изображение, без окна')
+    parser.add_argument('--telemetry', action='store_true',
+                        help=f'Замеры этапов в stderr (как {telemetry.ENV_VARIABLE}=1)')
 
     args = parser.parse_args()
+    if args.telemetry:
+        telemetry.enable()
 
     try:
-        cells, sensors = load_from_json(args.file)
-        plot_cell_mesh(
-            cells=cells,
-            sensors=sensors,
-            x_slice=0,
-            y_slice=0,
-            z_slice=-7
-        )
+        with telemetry.session('show_plots_script'):
+            cell_filter = CellFilter(np.array(args.bbox[:3]), np.array(args.bbox[3:])) if args.bbox else None
+            mesh = load_mesh(args.input or args.file, cell_filter=cell_filter)
+            telemetry.checkpoint('load', cells=len(mesh))
+            plot_cell_mesh(
+                mesh=mesh,
+                x_slice=args.x_slice,
+                y_slice=args.y_slice,
+                z_slice=args.z_slice,
+                projection_mode=args.projection_mode,
+                reducer=args.reducer,
+                resolution=args.resolution,
+                render_budget=args.render_budget,
+                output_image=args.output,
+                show=not args.no_show
+            )
     except Exception as e:
         print(f"\nОшибка: {str(e)}")
         exit(1)
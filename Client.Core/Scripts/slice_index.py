@@ -0,0 +1,64 @@
+import numpy as np
+
+from mesh_loader import AXES, MeshData
+
+
+class AxisIntervalIndex:
+    """Индекс интервалов [low, high] ячеек вдоль одной оси.
+
+    Ячейки октодерева имеют лишь несколько размеров (по уровню SubdivisionLevel),
+    поэтому интервалы группируются по длине с точностью до степени двойки.
+    Внутри группы интервалы отсортированы по нижней границе: все ячейки,
+    содержащие v, лежат в окне low ∈ [v - max_length, v], которое находится
+    бинарным поиском. Запрос стоит O(G·log N + k), где G — число групп.
+    """
+
+    def __init__(self, low: np.ndarray, high: np.ndarray):
+        length = high - low
+        _, exponent = np.frexp(length)
+
+        self._groups = []
+        for group in np.unique(exponent):
+            members = np.flatnonzero(exponent == group)
+            order = np.argsort(low[members], kind='stable')
+            members = members[order]
+            self._groups.append((
+                members,
+                low[members],
+                high[members],
+                float(length[members].max())
+            ))
+
+        self.bounds = (float(low.min()), float(high.max())) if len(low) else (0.0, 1.0)
+
+    def query(self, value: float) -> np.ndarray:
+        """Индексы ячеек, содержащих координату value (отсортированы)"""
+        hits = []
+        for members, low, high, max_length in self._groups:
+            start = np.searchsorted(low, value - max_length, side='left')
+            stop = np.searchsorted(low, value, side='right')
+            window = slice(start, stop)
+            hits.append(members[window][high[window] >= value])
+
+        if not hits:
+            return np.empty(0, dtype=np.intp)
+        return np.sort(np.concatenate(hits))
+
+
+class SliceIndex:
+    """Интервальные индексы сетки по трём осям, строятся один раз"""
+
+    def __init__(self, mesh: MeshData):
+        lower = mesh.lower
+        upper = mesh.upper
+        self._axes = {
+            axis: AxisIntervalIndex(lower[:, i], upper[:, i])
+            for i, axis in enumerate(AXES)
+        }
+
+    def bounds(self, axis: str) -> tuple[float, float]:
+        return self._axes[axis.upper()].bounds
+
+    def query(self, axis: str, value: float) -> np.ndarray:
+        """Какие ячейки содержат координату value на оси axis"""
+        return self._axes[axis.upper()].query(value)
@@ -0,0 +1,232 @@
+"""Журнал снимков сетки по итерациям инверсии (.gxlog).
+
+Все числа little-endian. Заголовок файла 16 байт:
+
+    magic      8s   b'GXSNAP\\0\\0'
+    version    u32  FORMAT_VERSION
+    reserved   u32
+
+Далее записи подряд, заголовок записи 64 байта:
+
+    payload     u64  размер данных записи в байтах
+    kind        u32  KIND_KEYFRAME — полный снимок, KIND_DELTA — разница с предыдущей
+    iteration   i32
+    functional  f64  NaN — не считался
+    lambda      f64  λ шага, который привёл к этой сетке (NaN для первой)
+    n_cells     u64  ячеек после применения записи
+    n_removed   u64
+    n_changed   u64
+    n_added     u64
+
+Данные: индексы удалённых ячеек u64 (в порядке предыдущей записи), индексы
+изменённых u64 (после удаления) и их плотности f64, затем 8 колонок f64
+добавленных ячеек, как в .gxm. Добавленные ячейки идут в конец. Ключевой
+кадр — только добавленные ячейки на пустой сетке. Запись на стороне C#:
+Common/Services/SnapshotLogWriter.cs. Читатель дочитывает файл по мере
+дозаписи и останавливается на недописанной записи.
+"""
+import struct
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+import numpy as np
+
+from mesh_binary import CELL_COLUMNS, DTYPE
+from mesh_loader import MeshData
+
+MAGIC = b'GXSNAP\x00\x00'
+FORMAT_VERSION = 1
+KIND_KEYFRAME = 0
+KIND_DELTA = 1
+
+FILE_HEADER = struct.Struct('<8sII')
+RECORD_HEADER = struct.Struct('<QIiddQQQQ')
+INDEX_DTYPE = np.dtype('<u8')
+# Строки блока ячеек без плотности: центр, полуразмеры, уровень
+GEOMETRY_ROWS = [0, 1, 2, 3, 4, 5, 7]
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """Состояние сетки после одной записи журнала"""
+    iteration: int
+    functional: float
+    lambda_: float
+    mesh: MeshData
+    # Геометрия совпадает с предыдущим снимком (изменились только плотности)
+    same_geometry: bool
+    changed: int  # число ячеек с изменённой плотностью
+
+
+def _columns_to_mesh(columns: np.ndarray) -> MeshData:
+    return MeshData(
+        center=np.ascontiguousarray(columns[0:3].T),
+        bound=np.ascontiguousarray(columns[3:6].T),
+        density=columns[6].copy(),
+        level=columns[7].copy(),
+        sensors=np.empty((0, 3))
+    )
+
+
+class SnapshotReader:
+    """Последовательное чтение журнала; read_new() отдаёт записи, дописанные с прошлого вызова"""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.offset = 0
+        self._columns = np.empty((CELL_COLUMNS, 0), dtype=np.float64)
+
+    def _read_file_header(self, f) -> bool:
+        raw = f.read(FILE_HEADER.size)
+        if len(raw) < FILE_HEADER.size:
+            return False
+        magic, version, _ = FILE_HEADER.unpack(raw)
+        if magic != MAGIC:
+            raise ValueError(f"Файл {self.file_path} не является журналом снимков")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия формата {version} в файле {self.file_path}")
+        self.offset = FILE_HEADER.size
+        return True
+
+    def read_new(self) -> list[Snapshot]:
+        return list(self.iter_new())
+
+    def iter_new(self) -> Iterator[Snapshot]:
+        """Записи, дописанные с прошлого чтения, по одной"""
+        with open(self.file_path, 'rb') as f:
+            if self.offset == 0 and not self._read_file_header(f):
+                return
+            f.seek(self.offset)
+            while True:
+                raw = f.read(RECORD_HEADER.size)
+                if len(raw) < RECORD_HEADER.size:
+                    break
+                payload_size, kind, iteration, functional, lambda_, n_cells, n_removed, n_changed, n_added = \
+                    RECORD_HEADER.unpack(raw)
+                payload = f.read(payload_size)
+                if len(payload) < payload_size:
+                    # Запись ещё дописывается
+                    break
+
+                self.offset += RECORD_HEADER.size + payload_size
+                yield self._apply(kind, iteration, functional, lambda_, n_cells, n_removed, n_changed, n_added,
+                                  payload)
+
+    def __iter__(self) -> Iterator[Snapshot]:
+        return self.iter_new()
+
+    def _apply(self, kind, iteration, functional, lambda_, n_cells, n_removed, n_changed, n_added,
+               payload: bytes) -> Snapshot:
+        position = 0
+
+        def take(dtype, count):
+            nonlocal position
+            values = np.frombuffer(payload, dtype=dtype, count=count, offset=position)
+            position += values.nbytes
+            return values
+
+        removed = take(INDEX_DTYPE, n_removed).astype(np.int64)
+        changed = take(INDEX_DTYPE, n_changed).astype(np.int64)
+        densities = take(DTYPE, n_changed)
+        added = take(DTYPE, CELL_COLUMNS * n_added).reshape(CELL_COLUMNS, n_added)
+
+        if kind == KIND_KEYFRAME:
+            columns = added.astype(np.float64)
+            same_geometry = (columns.shape == self._columns.shape
+                             and np.array_equal(columns[GEOMETRY_ROWS], self._columns[GEOMETRY_ROWS]))
+        elif kind == KIND_DELTA:
+            columns = np.delete(self._columns, removed, axis=1) if n_removed else self._columns.copy()
+            columns[6, changed] = densities
+            if n_added:
+                columns = np.concatenate([columns, added], axis=1)
+            same_geometry = n_removed == 0 and n_added == 0
+        else:
+            raise ValueError(f"Неизвестный вид записи {kind} в файле {self.file_path}")
+        if columns.shape[1] != n_cells:
+            raise ValueError(f"Файл {self.file_path} повреждён: ожидалось {n_cells} ячеек")
+
+        self._columns = columns
+        return Snapshot(iteration=iteration, functional=functional, lambda_=lambda_,
+                        mesh=_columns_to_mesh(columns), same_geometry=same_geometry,
+                        changed=n_changed if kind == KIND_DELTA else n_cells)
+
+
+def read_snapshots(file_path: str) -> list[Snapshot]:
+    """Все записи журнала"""
+    return SnapshotReader(file_path).read_new()
+
+
+class SnapshotWriter:
+    """Запись журнала из Python в формате SnapshotLogWriter.cs"""
+
+    def __init__(self, file_path: str, keyframe_interval: int = 50):
+        self.keyframe_interval = max(1, keyframe_interval)
+        self._file = open(file_path, 'wb')
+        self._file.write(FILE_HEADER.pack(MAGIC, FORMAT_VERSION, 0))
+        self._file.flush()
+        self._columns: Optional[np.ndarray] = None
+        self._since_keyframe = 0
+
+    def append(self, iteration: int, functional: float, lambda_: float, mesh: MeshData):
+        columns = np.vstack([mesh.center.T, mesh.bound.T, mesh.density, mesh.level]).astype(np.float64)
+        if self._columns is None or self._since_keyframe >= self.keyframe_interval:
+            self._write(KIND_KEYFRAME, iteration, functional, lambda_, columns.shape[1],
+                        removed=np.empty(0, np.int64), changed=np.empty(0, np.int64),
+                        densities=np.empty(0), added=columns)
+            self._columns = columns
+            self._since_keyframe = 0
+            return
+
+        # Сопоставление по геометрии и уровню, как в C#; добавленные ячейки — в конец
+        previous = self._columns
+        keys_previous = previous[GEOMETRY_ROWS].T
+        keys_current = columns[GEOMETRY_ROWS].T
+        _, inverse = np.unique(np.concatenate([keys_previous, keys_current]), axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        lookup = np.full(inverse.max() + 1, -1, dtype=np.int64)
+        lookup[inverse[:previous.shape[1]][::-1]] = np.arange(previous.shape[1])[::-1]
+        match = lookup[inverse[previous.shape[1]:]]
+
+        retained = np.zeros(previous.shape[1], dtype=bool)
+        retained[match[match >= 0]] = True
+        density = previous[6].copy()
+        density[match[match >= 0]] = columns[6, match >= 0]
+
+        kept = previous[:, retained].copy()
+        kept[6] = density[retained]
+        changed = np.flatnonzero(kept[6].view(np.int64) != previous[6, retained].view(np.int64))
+        added = columns[:, match < 0]
+
+        self._write(KIND_DELTA, iteration, functional, lambda_, kept.shape[1] + added.shape[1],
+                    removed=np.flatnonzero(~retained), changed=changed, densities=kept[6, changed], added=added)
+        self._columns = np.concatenate([kept, added], axis=1)
+        self._since_keyframe += 1
+
+    def _write(self, kind, iteration, functional, lambda_, n_cells, removed, changed, densities, added):
+        payload = b''.join([removed.astype(INDEX_DTYPE).tobytes(), changed.astype(INDEX_DTYPE).tobytes(),
+                            densities.astype(DTYPE).tobytes(), np.ascontiguousarray(added, dtype=DTYPE).tobytes()])
+        self._file.write(RECORD_HEADER.pack(len(payload), kind, iteration, functional, lambda_, n_cells,
+                                            len(removed), len(changed), added.shape[1]) + payload)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Сводка журнала снимков инверсии')
+    parser.add_argument('log', help='Файл .gxlog')
+    args = parser.parse_args()
+
+    for snapshot in read_snapshots(args.log):
+        geometry = 'та же геометрия' if snapshot.same_geometry else 'новая геометрия'
+        print(f"Итерация {snapshot.iteration}: функционал={snapshot.functional:.6e}, λ={snapshot.lambda_:.3e}, "
+              f"ячеек {len(snapshot.mesh)}, изменено {snapshot.changed}, {geometry}")
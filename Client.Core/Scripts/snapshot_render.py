@@ -0,0 +1,218 @@
+"""Кадры и анимация по журналу снимков инверсии (.gxlog).
+
+Пример:
+    python snapshot_render.py inversion_log.gxlog -o frames -s z=-100 --gif inversion.gif
+
+Журнал пишется, только если в inverse_options.json задан SnapshotLogPath
+(по умолчанию пусто). Кадр — три панели сетки (проекции или сечения, как
+в show_plots_script) и график функционала с отметкой текущей итерации.
+Кадры делятся на непрерывные отрезки по процессам; внутри отрезка
+коллекции панелей создаются заново только при смене геометрии, иначе
+меняются лишь цвета. Шкала цвета общая для всех кадров.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.cm import ScalarMappable
+from matplotlib.collections import PolyCollection
+
+from batch_render import parse_slice_spec
+from mesh_geometry import PLANE_AXES, cell_colors, projection_rectangles, slice_rectangles
+from snapshot_log import SnapshotReader
+
+# Панели: ось сечения, плоскость проекции и параметр среза
+PANELS = (('Z', 'xy', 'z_slice'), ('Y', 'xz', 'y_slice'), ('X', 'yz', 'x_slice'))
+
+
+def log_overview(file_path: str) -> dict:
+    """Итерации, функционал, λ и общий диапазон плотности по всем записям"""
+    iterations, functionals, lambdas = [], [], []
+    low, high = np.inf, -np.inf
+    lower, upper = np.full(3, np.inf), np.full(3, -np.inf)
+    for snapshot in SnapshotReader(file_path):
+        iterations.append(snapshot.iteration)
+        functionals.append(snapshot.functional)
+        lambdas.append(snapshot.lambda_)
+        if len(snapshot.mesh):
+            low = min(low, float(snapshot.mesh.density.min()))
+            high = max(high, float(snapshot.mesh.density.max()))
+            mesh_lower, mesh_upper = snapshot.mesh.extent()
+            lower, upper = np.minimum(lower, mesh_lower), np.maximum(upper, mesh_upper)
+    return {
+        'iterations': np.array(iterations, dtype=np.int64),
+        'functionals': np.array(functionals, dtype=np.float64),
+        'lambdas': np.array(lambdas, dtype=np.float64),
+        'density_range': (low, high) if low <= high else (0.0, 1.0),
+        'extent': (lower, upper)
+    }
+
+
+class FrameRenderer:
+    """Фигура кадра, переиспользуемая между снимками с одинаковой геометрией"""
+
+    def __init__(self, overview: dict, slices: dict, cmap: str = 'RdYlGn_r', dpi: int = 150):
+        self.slices = slices
+        self.dpi = dpi
+        self.cmap = plt.get_cmap(cmap)
+        self.norm = plt.Normalize(*overview['density_range'])
+        self.fig = plt.figure(figsize=(16, 11))
+        grid = self.fig.add_gridspec(2, 2, left=0.05, right=0.88, top=0.93, bottom=0.06, wspace=0.25, hspace=0.3)
+        self.panel_axes = [self.fig.add_subplot(grid[position]) for position in ((0, 1), (1, 0), (1, 1))]
+        self.ax_functional = self.fig.add_subplot(grid[0, 0])
+        self.fig.colorbar(ScalarMappable(norm=self.norm, cmap=self.cmap),
+                          cax=self.fig.add_axes([0.90, 0.15, 0.02, 0.7]), label='Mu')
+
+        lower, upper = overview['extent']
+        for ax, (axis, plane, slice_name) in zip(self.panel_axes, PANELS):
+            x_index, y_index = PLANE_AXES[plane]
+            position = slices.get(slice_name)
+            ax.set_title(f"Сечение по {axis}={position:.2f}" if position is not None else f"{plane.upper()} Projection")
+            ax.set_xlim(lower[x_index], upper[x_index])
+            ax.set_ylim(lower[y_index], upper[y_index])
+            ax.set_aspect('equal')
+            ax.grid(True, linestyle='--', alpha=0.3)
+
+        self._plot_functional(overview)
+        self.collections: list[Optional[PolyCollection]] = [None] * len(PANELS)
+        self.indices: list[Optional[np.ndarray]] = [None] * len(PANELS)
+
+    def _plot_functional(self, overview: dict):
+        ax = self.ax_functional
+        iterations, functionals = overview['iterations'], overview['functionals']
+        valid = np.isfinite(functionals) & (functionals > 0)
+        ax.plot(iterations[valid], functionals[valid], color='tab:blue', linewidth=1.2)
+        if valid.any():
+            ax.set_yscale('log')
+        ax.set_xlabel('Итерация')
+        ax.set_ylabel('Функционал')
+        ax.grid(True, which='both', linestyle='dotted', alpha=0.5)
+        self.marker = ax.axvline(iterations[0] if len(iterations) else 0, color='tab:red', linewidth=1)
+
+    def _rebuild(self, mesh):
+        """Новая геометрия: прямоугольники панелей строятся заново"""
+        for panel, (ax, (axis, plane, slice_name)) in enumerate(zip(self.panel_axes, PANELS)):
+            if self.collections[panel] is not None:
+                self.collections[panel].remove()
+            position = self.slices.get(slice_name)
+            if position is not None:
+                indices, rects = slice_rectangles(mesh, axis, position)
+            else:
+                indices, rects = np.arange(len(mesh)), projection_rectangles(mesh, plane)
+            self.indices[panel] = indices
+            self.collections[panel] = ax.add_collection(PolyCollection(rects, edgecolors='k', linewidths=0.3))
+
+    def render(self, snapshot, output_image: str, rebuild: bool):
+        if rebuild or self.collections[0] is None:
+            self._rebuild(snapshot.mesh)
+        colors = cell_colors(snapshot.mesh.density, self.cmap, self.norm)
+        for collection, indices in zip(self.collections, self.indices):
+            collection.set_facecolor(colors[indices])
+
+        self.marker.set_xdata([snapshot.iteration, snapshot.iteration])
+        lambda_text = f", λ={snapshot.lambda_:.3e}" if np.isfinite(snapshot.lambda_) else ''
+        self.fig.suptitle(f"Итерация {snapshot.iteration}: функционал={snapshot.functional:.6e}{lambda_text}, "
+                          f"ячеек {len(snapshot.mesh)}")
+        self.fig.savefig(output_image, dpi=self.dpi)
+
+    def close(self):
+        plt.close(self.fig)
+
+
+def frame_path(output_dir: str, index: int) -> str:
+    return os.path.join(output_dir, f"frame_{index:05d}.png")
+
+
+def render_frames(file_path: str, output_dir: str, frames: range, overview: dict, slices: dict,
+                  options: dict) -> tuple[int, int, float]:
+    """Задача пула: непрерывный отрезок кадров; возвращает число кадров, перестроений и время"""
+    start = time.perf_counter()
+    renderer = FrameRenderer(overview, slices, **options)
+    rebuilds = 0
+    need_rebuild = True
+    try:
+        for index, snapshot in enumerate(SnapshotReader(file_path)):
+            # Записи до отрезка читаются ради разностей, но не рисуются
+            need_rebuild = need_rebuild or not snapshot.same_geometry
+            if index < frames.start:
+                continue
+            if index >= frames.stop:
+                break
+            renderer.render(snapshot, frame_path(output_dir, index), need_rebuild)
+            rebuilds += need_rebuild
+            need_rebuild = False
+    finally:
+        renderer.close()
+    return len(frames), rebuilds, time.perf_counter() - start
+
+
+def split_frames(count: int, parts: int) -> list[range]:
+    """Непрерывные отрезки кадров примерно равной длины"""
+    bounds = np.linspace(0, count, max(1, min(parts, count)) + 1).astype(int)
+    return [range(low, high) for low, high in zip(bounds[:-1], bounds[1:]) if high > low]
+
+
+def render_log(file_path: str, output_dir: str, slices: dict, workers: Optional[int] = None,
+               options: Optional[dict] = None) -> int:
+    """Все кадры журнала в output_dir; возвращает число кадров"""
+    os.makedirs(output_dir, exist_ok=True)
+    overview = log_overview(file_path)
+    count = len(overview['iterations'])
+    chunks = split_frames(count, workers or os.cpu_count() or 1)
+
+    with ProcessPoolExecutor(max_workers=len(chunks) or 1) as executor:
+        futures = [executor.submit(render_frames, file_path, output_dir, chunk, overview, slices, options or {})
+                   for chunk in chunks]
+        for chunk, future in zip(chunks, futures):
+            frames, rebuilds, seconds = future.result()
+            print(f"Кадры {chunk.start}–{chunk.stop - 1}: {frames} за {seconds:.2f} c, "
+                  f"перестроений геометрии {rebuilds}")
+    return count
+
+
+def write_gif(output_dir: str, count: int, output_file: str, fps: float):
+    """Анимация из готовых кадров"""
+    from PIL import Image
+
+    frames = [Image.open(frame_path(output_dir, index)) for index in range(count)]
+    if not frames:
+        return
+    frames[0].save(output_file, save_all=True, append_images=frames[1:], duration=int(1000 / fps), loop=0)
+    for frame in frames:
+        frame.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Кадры и анимация по журналу снимков инверсии',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('log', help='Файл журнала .gxlog')
+    parser.add_argument('-o', '--output-dir', default='snapshot_frames', help='Каталог кадров')
+    parser.add_argument('-s', '--slice', default='none', help="Срезы, например 'x=0,z=-7'; 'none' — проекции")
+    parser.add_argument('-j', '--workers', type=int, help='Число процессов (по умолчанию — все ядра)')
+    parser.add_argument('--dpi', type=int, default=150)
+    parser.add_argument('--gif', help='Собрать кадры в GIF')
+    parser.add_argument('--fps', type=float, default=5.0, help='Кадров в секунду анимации')
+
+    args = parser.parse_args()
+
+    try:
+        frame_count = render_log(args.log, args.output_dir, parse_slice_spec(args.slice), args.workers,
+                                 {'dpi': args.dpi})
+    except (OSError, ValueError) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        exit(1)
+
+    if args.gif:
+        write_gif(args.output_dir, frame_count, args.gif, args.fps)
+        print(f"Анимация сохранена: {args.gif}")
@@ -0,0 +1,158 @@
+"""Структурированные замеры этапов отрисовки.
+
+Включается переменной окружения GRAVITY_PLOT_TELEMETRY=1 или флагом
+--telemetry в скриптах. Этап отмечается вызовом checkpoint() в его конце:
+время считается от предыдущей отметки или начала сеанса. Каждый этап
+(load, geometry, draw, save) пишет в stderr одну строку JSON:
+
+    {"telemetry": 1, "type": "stage", "script": "show_plots_script", "stage": "load",
+     "wall_s": 0.12, "cpu_s": 0.11, "peak_rss_mb": 84.2, "cells": 1000}
+
+В конце сеанса пишется запись "type": "summary" с суммарным временем,
+временем по этапам и самым долгим этапом. Если wall_s заметно больше cpu_s,
+этап ждёт диска. Без включения все функции ничего не делают.
+"""
+import contextlib
+import json
+import os
+import sys
+import time
+from typing import Optional
+
+from matplotlib.collections import Collection
+
+ENV_VARIABLE = 'GRAVITY_PLOT_TELEMETRY'
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Пиковый рабочий набор процесса в МБ (None, если узнать нельзя)"""
+    try:
+        import resource
+    except ImportError:
+        return _windows_peak_rss_mb()
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def _windows_peak_rss_mb() -> Optional[float]:
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize / 2 ** 20
+    except (AttributeError, OSError):
+        return None
+
+
+def figure_counts(fig) -> dict[str, int]:
+    """Число художников на фигуре и элементов в их коллекциях (после отрисовки)"""
+    artists = 0
+    paths = 0
+    for ax in fig.axes:
+        for artist in ax.get_children():
+            artists += 1
+            if isinstance(artist, Collection):
+                paths += max(len(artist.get_paths()), len(artist.get_offsets()))
+    return {'artists': artists, 'paths': paths}
+
+
+class Telemetry:
+    """Сеанс замеров одного скрипта или одного запроса сервера отрисовки"""
+
+    def __init__(self, script: str, stream=None):
+        self.script = script
+        self.stream = stream
+        self.stages = {}
+        self.counts = {}
+        self._wall = self._last_wall = time.perf_counter()
+        self._cpu = self._last_cpu = time.process_time()
+
+    def emit(self, record: dict):
+        stream = self.stream or sys.stderr
+        stream.write(json.dumps({'telemetry': 1, **record}, ensure_ascii=False) + '\n')
+        stream.flush()
+
+    def checkpoint(self, name: str, figure=None, **counts):
+        """Конец этапа name; figure — добавить счётчики художников фигуры"""
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        elapsed_wall, elapsed_cpu = wall - self._last_wall, cpu - self._last_cpu
+        if figure is not None:
+            counts.update(figure_counts(figure))
+
+        self.stages[name] = self.stages.get(name, 0.0) + elapsed_wall
+        self.counts.update(counts)
+        self.emit({'type': 'stage', 'script': self.script, 'stage': name, 'wall_s': round(elapsed_wall, 6),
+                   'cpu_s': round(elapsed_cpu, 6), 'peak_rss_mb': _rounded(peak_rss_mb()), **counts})
+        # Время вывода записи не входит в следующий этап
+        self._last_wall = time.perf_counter()
+        self._last_cpu = time.process_time()
+
+    def summary(self, status: str = 'ok'):
+        self.emit({
+            'type': 'summary',
+            'script': self.script,
+            'status': status,
+            'wall_s': round(time.perf_counter() - self._wall, 6),
+            'cpu_s': round(time.process_time() - self._cpu, 6),
+            'peak_rss_mb': _rounded(peak_rss_mb()),
+            'stages': {name: round(seconds, 6) for name, seconds in self.stages.items()},
+            'dominant_stage': max(self.stages, key=self.stages.get) if self.stages else None,
+            **self.counts
+        })
+
+
+def _rounded(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 1)
+
+
+_current: Optional[Telemetry] = None
+_forced = False
+
+
+def enabled() -> bool:
+    return _forced or os.environ.get(ENV_VARIABLE, '').strip().lower() not in ('', '0', 'false', 'no')
+
+
+def enable():
+    """Включение замеров из кода (флаг --telemetry)"""
+    global _forced
+    _forced = True
+
+
+@contextlib.contextmanager
+def session(script: str, stream=None):
+    """Сеанс замеров: этапы внутри пишутся, в конце пишется сводка"""
+    global _current
+    if not enabled():
+        yield None
+        return
+
+    previous, _current = _current, Telemetry(script, stream)
+    status = 'error'
+    try:
+        yield _current
+        status = 'ok'
+    finally:
+        _current.summary(status)
+        _current = previous
+
+
+def checkpoint(name: str, figure=None, **counts):
+    """Конец этапа текущего сеанса; вне сеанса ничего не делает"""
+    if _current is not None:
+        _current.checkpoint(name, figure, **counts)
@@ -1,76 +1,82 @@
-import json
+import sys
+
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d.art3d import Poly3DCollection
 import numpy as np
 
-# 📂 Загрузка Mesh из файла
-def load_mesh(filepath):
-    with open(filepath, 'r') as f:
-        data = json.load(f)
-    return data['Cells']
+import telemetry
+from mesh_geometry import FACES_PER_CELL, cell_corners, cell_faces
+from mesh_loader import MeshData, load_mesh
+from mesh_lod import DEFAULT_RENDER_BUDGET, reduce_to_budget
+from voxel_export import mesh_surfaces, plot_surfaces
 
 # 🎨 Получение цвета по плотности
 def density_to_color(density, min_d, max_d):
     norm = (density - min_d) / (max_d - min_d + 1e-9)
-    return (0, 0, 0, norm)  # Черный цвет с разной прозрачностью
-
-# 🔳 Генерация границ ячейки по центру и размерам
-def get_box(center, bounds):
-    cx, cy, cz = center
-    dx, dy, dz = bounds
-
-    # Вершины куба
-    x = [cx - dx, cx + dx]
-    y = [cy - dy, cy + dy]
-    z = [cz - dz, cz + dz]
-
-    # Грани
-    return [
-        [(x[0], y[0], z[0]), (x[1], y[0], z[0]), (x[1], y[1], z[0]), (x[0], y[1], z[0])],  # Нижняя
-        [(x[0], y[0], z[1]), (x[1], y[0], z[1]), (x[1], y[1], z[1]), (x[0], y[1], z[1])],  # Верхняя
-        [(x[0], y[0], z[0]), (x[0], y[1], z[0]), (x[0], y[1], z[1]), (x[0], y[0], z[1])],  # Левая
-        [(x[1], y[0], z[0]), (x[1], y[1], z[0]), (x[1], y[1], z[1]), (x[1], y[0], z[1])],  # Правая
-        [(x[0], y[0], z[0]), (x[1], y[0], z[0]), (x[1], y[0], z[1]), (x[0], y[0], z[1])],  # Передняя
-        [(x[0], y[1], z[0]), (x[1], y[1], z[0]), (x[1], y[1], z[1]), (x[0], y[1], z[1])],  # Задняя
-    ]
+    colors = np.zeros((np.size(density), 4))
+    colors[:, 3] = norm  # Черный цвет с разной прозрачностью
+    return colors
 
 # 📊 Основная функция визуализации
-def plot_mesh(cells):
+def plot_mesh(mesh: MeshData, render_budget: int = DEFAULT_RENDER_BUDGET, output_image: str = 'mesh_chart.png',
+              surface_levels=None, resolution: int = 64):
     fig = plt.figure()
     ax = fig.add_subplot(111, projection='3d')
 
-    densities = [cell["Density"] for cell in cells]
-    min_d = min(densities)
-    max_d = max(densities)
+    min_d = mesh.density.min()
+    max_d = mesh.density.max()
 
-    for cell in cells:
-        center = (cell["CenterX"], cell["CenterY"], cell["CenterZ"])
-        bounds = (cell["BoundX"], cell["BoundY"], cell["BoundZ"])
-        color = density_to_color(cell["Density"], min_d, max_d)
+    if surface_levels is not None:
+        # Изоповерхности плотности вместо ячеек: треугольников по площади аномалии
+        surfaces = mesh_surfaces(mesh, surface_levels, resolution)
+        plot_surfaces(ax, surfaces, plt.cm.viridis, plt.Normalize(min_d, max_d))
+        telemetry.checkpoint('geometry', cells=len(mesh), triangles=sum(len(s.faces) for s in surfaces))
+        _finish_plot(fig, ax, mesh, output_image)
+        return
 
-        box = get_box(center, bounds)
-        cube = Poly3DCollection(box, facecolors=color, edgecolors='gray', linewidths=0.1)
-        ax.add_collection3d(cube)
+    # Слияние однородных октантов, пока ячеек больше бюджета отрисовки
+    visible = reduce_to_budget(mesh, render_budget)
+    colors = density_to_color(visible.density, min_d, max_d)
 
+    # Все грани всех ячеек одной коллекцией
+    cubes = Poly3DCollection(
+        cell_faces(cell_corners(visible)),
+        facecolors=np.repeat(colors, FACES_PER_CELL, axis=0),
+        edgecolors='gray',
+        linewidths=0.1
+    )
+    telemetry.checkpoint('geometry', cells=len(mesh), visible_cells=len(visible))
+    ax.add_collection3d(cubes)
+    _finish_plot(fig, ax, mesh, output_image)
+
+
+def _finish_plot(fig, ax, mesh: MeshData, output_image: str):
     ax.set_xlabel('X')
     ax.set_ylabel('Y')
     ax.set_zlabel('Z')
 
+    min_vals, max_vals = mesh.extent()
     ax.auto_scale_xyz(
-        [min(cell["CenterX"] - cell["BoundX"] for cell in cells),
-         max(cell["CenterX"] + cell["BoundX"] for cell in cells)],
-        [min(cell["CenterY"] - cell["BoundY"] for cell in cells),
-         max(cell["CenterY"] + cell["BoundY"] for cell in cells)],
-        [min(cell["CenterZ"] - cell["BoundZ"] for cell in cells),
-         max(cell["CenterZ"] + cell["BoundZ"] for cell in cells)]
+        [min_vals[0], max_vals[0]],
+        [min_vals[1], max_vals[1]],
+        [min_vals[2], max_vals[2]]
     )
 
-    plt.savefig('mesh_chart.png', dpi=300, bbox_inches='tight')
-    print(f"Сохранено изображение: {'mesh_chart.png'}")
+    telemetry.checkpoint('draw')
+
+    plt.savefig(output_image, dpi=300, bbox_inches='tight')
+    telemetry.checkpoint('save', figure=fig)
+    plt.close(fig)
+    print(f"Сохранено изображение: {output_image}")
     #plt.show()
 
 # 🚀 Запуск
 if __name__ == '__main__':
-    mesh_file = 'mesh_data.json'  # Путь к JSON-файлу
-    cells = load_mesh(mesh_file)
-    plot_mesh(cells)
+    mesh_file = sys.argv[1] if len(sys.argv) > 1 else 'mesh_data.json'  # Путь к JSON-файлу
+    output_image = sys.argv[2] if len(sys.argv) > 2 else 'mesh_chart.png'
+    # Третий и следующие аргументы — уровни изоповерхностей вместо ячеек
+    surface_levels = [float(level) for level in sys.argv[3:]] or None
+    with telemetry.session('testing_chart'):
+        mesh = load_mesh(mesh_file)
+        telemetry.checkpoint('load', cells=len(mesh))
+        plot_mesh(mesh, output_image=output_image, surface_levels=surface_levels)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Скрипты — плоские модули, импортирующие друг друга напрямую
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,37 @@
+"""Сверка forward_model с DirectTaskService.GetAnomalyMapFast.
+
+data/forward_reference/anomaly.json — вывод C# (JsonSerializer, список
+Sensor) для сетки mesh.json и ρ_base = 2.0: блок 3×3×2 ячеек по 20 и шесть
+мелких ячеек разного размера; сенсоры на поверхности, над ней и один на
+верхней грани над узлом квадратуры (ветка NaN → asinh(0)).
+"""
+import os
+
+import numpy as np
+import pytest
+
+from forward_model import compute_anomaly
+from mesh_loader import load_mesh, load_sensors
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data', 'forward_reference')
+BASE_DENSITY = 2.0
+
+
+@pytest.fixture(scope='module')
+def reference():
+    mesh = load_mesh(os.path.join(DATA_DIR, 'mesh.json'))
+    coords, values = load_sensors(os.path.join(DATA_DIR, 'anomaly.json'))
+    return mesh, coords, values
+
+
+@pytest.mark.parametrize('workers, chunk_size', [(1, 1 << 19), (1, 64), (2, 64)])
+def test_matches_csharp(reference, workers, chunk_size):
+    mesh, coords, expected = reference
+    values = compute_anomaly(mesh, coords, BASE_DENSITY, chunk_size=chunk_size, workers=workers)
+    np.testing.assert_allclose(values, expected, rtol=1e-12, atol=0)
+
+
+def test_hybrid_within_tolerance(reference):
+    mesh, coords, expected = reference
+    values = compute_anomaly(mesh, coords, BASE_DENSITY, workers=1, mode='hybrid', rel_tol=1e-4)
+    np.testing.assert_allclose(values, expected, rtol=1e-3, atol=0)
@@ -0,0 +1,101 @@
+"""Кэш столбцов jacobian_builder: после дробления ячеек пересчитываются только новые."""
+import numpy as np
+import pytest
+
+import jacobian_builder
+from jacobian_builder import ColumnCache, build_jacobian
+from mesh_loader import MeshData
+
+
+def _grid_mesh(n: int = 4, size: float = 10.0) -> MeshData:
+    """Куб n×n×n ячеек со стороной size под поверхностью z = 0"""
+    axis = (np.arange(n) + 0.5) * size
+    x, y, z = np.meshgrid(axis, axis, -axis, indexing='ij')
+    center = np.column_stack([x.ravel(), y.ravel(), z.ravel()])
+    count = len(center)
+    return MeshData(center=center, bound=np.full((count, 3), size / 2), density=np.ones(count),
+                    level=np.zeros(count), sensors=np.empty((0, 3)))
+
+
+def _split(mesh: MeshData, cells: np.ndarray) -> MeshData:
+    """Проход дробления: выбранные ячейки заменяются восемью дочерними"""
+    keep = np.setdiff1d(np.arange(len(mesh)), cells)
+    offsets = np.array([[sx, sy, sz] for sx in (-1, 1) for sy in (-1, 1) for sz in (-1, 1)], dtype=float)
+    half = mesh.bound[cells] / 2
+    child_center = (mesh.center[cells][:, None, :] + offsets * half[:, None, :]).reshape(-1, 3)
+    child_bound = np.repeat(half, 8, axis=0)
+    # Дочерние ячейки вставляются в начало, чтобы порядок столбцов сместился
+    return MeshData(
+        center=np.concatenate([child_center, mesh.center[keep]]),
+        bound=np.concatenate([child_bound, mesh.bound[keep]]),
+        density=np.ones(len(child_center) + len(keep)),
+        level=np.concatenate([np.ones(len(child_center)), mesh.level[keep]]),
+        sensors=mesh.sensors
+    )
+
+
+@pytest.fixture
+def sensors():
+    x, y = np.meshgrid(np.linspace(-5, 45, 7), np.linspace(-5, 45, 6), indexing='ij')
+    return np.column_stack([x.ravel(), y.ravel(), np.full(x.size, 1.0)])
+
+
+@pytest.fixture
+def computed_cells(monkeypatch):
+    """Число ячеек, переданных в _kernel_block, по всем блокам строк"""
+    counts = []
+    kernel_block = jacobian_builder._kernel_block
+
+    def counting(sensors_block, cells, kernel, rel_tol):
+        counts.append(len(cells))
+        return kernel_block(sensors_block, cells, kernel, rel_tol)
+
+    monkeypatch.setattr(jacobian_builder, '_kernel_block', counting)
+    return counts
+
+
+def test_refinement_recomputes_only_new_cells(tmp_path, sensors, computed_cells):
+    mesh = _grid_mesh()
+    cache_path = str(tmp_path / 'cache.npz')
+    # Маленький блок — чтение и запись кэша идут несколькими блоками строк
+    block_size = 200
+
+    build_jacobian(mesh, sensors, out=str(tmp_path / 'first.npy'),
+                   cache=ColumnCache.load(cache_path), block_size=block_size)
+    assert max(computed_cells) == len(mesh)
+
+    refined = _split(mesh, np.array([0, 5, 21]))
+    computed_cells.clear()
+    cache = ColumnCache.load(cache_path)
+    assert isinstance(cache.columns, np.memmap)
+    jacobian = build_jacobian(refined, sensors, out=str(tmp_path / 'second.npy'),
+                              cache=cache, block_size=block_size)
+
+    assert set(computed_cells) == {3 * 8}
+    np.testing.assert_array_equal(jacobian, build_jacobian(refined, sensors))
+    # Кэш перезаписан столбцами новой сетки и по-прежнему лежит в файле
+    assert isinstance(cache.columns, np.memmap)
+    assert cache.columns.shape == (len(sensors), len(refined))
+
+
+def test_changed_sensors_invalidate_cache(tmp_path, sensors, computed_cells):
+    mesh = _grid_mesh(2)
+    cache_path = str(tmp_path / 'cache.npz')
+    build_jacobian(mesh, sensors, cache=ColumnCache.load(cache_path))
+
+    computed_cells.clear()
+    shifted = sensors + np.array([0.0, 0.0, 1.0])
+    jacobian = build_jacobian(mesh, shifted, cache=ColumnCache.load(cache_path))
+
+    assert set(computed_cells) == {len(mesh)}
+    np.testing.assert_array_equal(jacobian, build_jacobian(mesh, shifted))
+
+
+def test_in_memory_cache(sensors, computed_cells):
+    mesh = _grid_mesh(2)
+    cache = ColumnCache()
+    build_jacobian(mesh, sensors, cache=cache)
+    computed_cells.clear()
+    jacobian = build_jacobian(mesh, sensors, cache=cache)
+    assert computed_cells == []
+    np.testing.assert_array_equal(jacobian, build_jacobian(mesh, sensors))
@@ -0,0 +1,116 @@
+"""Потоковый разбор json_stream против json.load при мелких кусках буфера."""
+import json
+
+import numpy as np
+import pytest
+
+import json_stream
+from json_stream import iter_array_batches
+from mesh_loader import load_mesh, load_sensors
+
+CELLS = [
+    {'CenterX': -1.2345678901234e-05, 'CenterY': 1e300, 'CenterZ': -150.5, 'BoundX': 0.5, 'BoundY': 12345678901234567,
+     'BoundZ': 2, 'Density': -0.0, 'SubdivisionLevel': 3},
+    {'CenterX': 0, 'CenterY': 0.1, 'CenterZ': -3.5e-7, 'BoundX': 1.25, 'BoundY': 1.25, 'BoundZ': 1.25,
+     'Density': 2.67, 'Comment': 'ячейка "в кавычках" ] } [ {'},
+] * 3
+SENSORS = [{'X': 10.5, 'Y': -20.25, 'Z': 0.0, 'Value': 1.5e-5}, {'X': 1e3, 'Y': 2e3, 'Z': 5, 'Value': -7}]
+
+# Пропускаемые значения: экранированные кавычки и скобки внутри строк, вложенность
+SKIPPED = {
+    'Domain': {'Name': 'a\\"]}', 'Nested': [[1, [2, {'k': '[{"'}]], {}], 'Empty': []},
+    'Escaped': 'кавычка \\" и \\\\ обратная черта } ] \\u0041',
+    'Numbers': [1e-300, -0.5, 123456789012345678901234567890],
+    'Flag': True,
+    'Nothing': None,
+}
+
+
+def _document(extra_keys: dict) -> dict:
+    return {'Domain': SKIPPED['Domain'], 'Cells': CELLS, 'Escaped': SKIPPED['Escaped'],
+            'sensors': SENSORS, **extra_keys, 'Numbers': SKIPPED['Numbers']}
+
+
+def _collect(file_path: str, keys: tuple[str, ...], batch_size: int) -> dict:
+    collected = {}
+    for key, batch in iter_array_batches(file_path, keys, batch_size=batch_size):
+        assert len(batch) <= batch_size
+        collected.setdefault(key, []).extend(batch)
+    return collected
+
+
+@pytest.fixture(params=[7, 13, 64])
+def chunk_size(request, monkeypatch):
+    monkeypatch.setattr(json_stream, 'CHUNK_SIZE', request.param)
+    return request.param
+
+
+@pytest.mark.parametrize('batch_size', [1, 4, 4096])
+def test_object_matches_json_load(tmp_path, chunk_size, batch_size):
+    document = _document({'Flag': SKIPPED['Flag'], 'Nothing': SKIPPED['Nothing']})
+    text = json.dumps(document, ensure_ascii=False, indent=1)
+    file_path = tmp_path / 'mesh.json'
+    # Отступ в начале сдвигает все границы кусков, так что каждое значение рано или поздно разрывается
+    for padding in range(chunk_size):
+        file_path.write_text(' ' * padding + text, encoding='utf-8')
+        with open(file_path, encoding='utf-8') as f:
+            expected = json.load(f)
+        collected = _collect(str(file_path), ('Cells', 'sensors'), batch_size)
+        assert collected == {'Cells': expected['Cells'], 'sensors': expected['sensors']}
+
+
+def test_array_matches_json_load(tmp_path, chunk_size):
+    file_path = tmp_path / 'cells.json'
+    for padding in range(chunk_size):
+        file_path.write_text('\n' * padding + json.dumps(CELLS, ensure_ascii=False), encoding='utf-8')
+        assert _collect(str(file_path), ('Cells',), 2) == {None: CELLS}
+
+
+def test_empty_arrays(tmp_path, chunk_size):
+    file_path = tmp_path / 'empty.json'
+    file_path.write_text(json.dumps({'Cells': [], 'Escaped': SKIPPED['Escaped'], 'sensors': []}))
+    assert _collect(str(file_path), ('Cells', 'sensors'), 4) == {'Cells': [], 'sensors': []}
+    file_path.write_text('[ ]')
+    assert _collect(str(file_path), ('Cells',), 4) == {None: []}
+
+
+@pytest.mark.parametrize('text', ['{"Cells": [1, 2', '{"Cells": [1 2]}', '{"Cells": [], "x": "abc', '[{"a": 1}'])
+def test_malformed(tmp_path, chunk_size, text):
+    file_path = tmp_path / 'broken.json'
+    file_path.write_text(text)
+    with pytest.raises(ValueError):
+        _collect(str(file_path), ('Cells',), 4)
+
+
+@pytest.mark.parametrize('document', [
+    _document({}),
+    CELLS,
+    {'Cells': [], 'sensors': []},
+    {'Cells': CELLS, 'Sensors': SENSORS},
+])
+def test_load_mesh_stream_matches_json_load(tmp_path, chunk_size, document):
+    file_path = str(tmp_path / 'mesh.json')
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, ensure_ascii=False)
+
+    streamed = load_mesh(file_path, stream_threshold=0)
+    loaded = load_mesh(file_path, stream_threshold=None)
+    for name in ('center', 'bound', 'density', 'level', 'sensors'):
+        np.testing.assert_array_equal(getattr(streamed, name), getattr(loaded, name))
+    assert (streamed.sensor_values is None) == (loaded.sensor_values is None)
+    if not isinstance(document, dict):
+        return
+
+    streamed_sensors = load_sensors(file_path, stream_threshold=0)
+    loaded_sensors = load_sensors(file_path, stream_threshold=None)
+    np.testing.assert_array_equal(streamed_sensors[0], loaded_sensors[0])
+    assert (streamed_sensors[1] is None) == (loaded_sensors[1] is None)
+
+
+def test_missing_cells_raises_in_both_paths(tmp_path, chunk_size):
+    file_path = str(tmp_path / 'sensors.json')
+    with open(file_path, 'w') as f:
+        json.dump({'Domain': SKIPPED['Domain'], 'sensors': SENSORS}, f)
+    for threshold in (0, None):
+        with pytest.raises(ValueError, match='Cells'):
+            load_mesh(file_path, stream_threshold=threshold)
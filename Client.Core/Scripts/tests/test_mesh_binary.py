@@ -0,0 +1,124 @@
+"""Формат .gxm: чтение файлов Common/Services/MeshBinaryWriter.cs и запись из Python.
+
+data/mesh_binary/mesh.gxm и cells_only.gxm записаны MeshBinaryWriter.WriteAsync
+для трёх ячеек CELLS с сенсорами SENSORS и без них (в C# у сенсоров всегда
+есть Value, поэтому флаг значений ставится при любом числе сенсоров).
+"""
+import os
+
+import numpy as np
+import pytest
+
+from mesh_binary import FLAG_SENSOR_VALUES, HEADER, MAGIC, is_binary_mesh, read_binary_mesh, write_binary_mesh
+from mesh_loader import MeshData, detect_kind, load_mesh, load_sensors, save_mesh
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data', 'mesh_binary')
+
+# Строки — ячейки: CenterX..Z, BoundX..Z, Density, SubdivisionLevel
+CELLS = np.array([
+    [0.5, -1.25, -10.0, 0.5, 1.25, 2.0, 2.67, 0],
+    [100.1, 200.2, -300.3, 12.5, 12.5, 6.25, -0.1, 3],
+    [-1e6, 1e-3, -0.0, 1e-9, 3.0, 4.5, 0.0, 5],
+])
+# X, Y, Z, Value
+SENSORS = np.array([
+    [0.0, 0.0, 0.0, 1.5e-5],
+    [25.0, -50.0, 10.0, -3.25e-7],
+])
+
+
+def _mesh(count: int, sensor_count: int, with_values: bool, seed: int = 0) -> MeshData:
+    rng = np.random.default_rng(seed)
+    return MeshData(
+        center=rng.normal(size=(count, 3)) * 100,
+        bound=rng.uniform(0.1, 10, (count, 3)),
+        density=rng.normal(size=count),
+        level=rng.integers(0, 6, count).astype(np.float64),
+        sensors=rng.normal(size=(sensor_count, 3)) * 100,
+        sensor_values=rng.normal(size=sensor_count) if with_values else None
+    )
+
+
+def _assert_same_mesh(loaded: MeshData, mesh: MeshData):
+    for name in ('center', 'bound', 'density', 'level', 'sensors'):
+        np.testing.assert_array_equal(getattr(loaded, name), getattr(mesh, name))
+    if mesh.sensor_values is None:
+        assert loaded.sensor_values is None
+    else:
+        np.testing.assert_array_equal(loaded.sensor_values, mesh.sensor_values)
+
+
+def test_csharp_header():
+    with open(os.path.join(DATA_DIR, 'mesh.gxm'), 'rb') as f:
+        raw = f.read()
+    assert HEADER.unpack_from(raw) == (MAGIC, 1, FLAG_SENSOR_VALUES, len(CELLS), len(SENSORS))
+    assert len(raw) == HEADER.size + 8 * (CELLS.size + SENSORS.size)
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_reads_csharp_file(mmap):
+    cells, sensors, has_values = read_binary_mesh(os.path.join(DATA_DIR, 'mesh.gxm'), mmap=mmap)
+    assert isinstance(cells, np.memmap) == mmap
+    np.testing.assert_array_equal(cells, CELLS.T)
+    np.testing.assert_array_equal(sensors, SENSORS.T)
+    assert has_values
+
+    mesh = load_mesh(os.path.join(DATA_DIR, 'mesh.gxm'), mmap=mmap)
+    np.testing.assert_array_equal(mesh.center, CELLS[:, 0:3])
+    np.testing.assert_array_equal(mesh.bound, CELLS[:, 3:6])
+    np.testing.assert_array_equal(mesh.density, CELLS[:, 6])
+    np.testing.assert_array_equal(mesh.level, CELLS[:, 7])
+    np.testing.assert_array_equal(mesh.sensors, SENSORS[:, 0:3])
+    np.testing.assert_array_equal(mesh.sensor_values, SENSORS[:, 3])
+
+
+def test_reads_csharp_file_without_sensors():
+    file_path = os.path.join(DATA_DIR, 'cells_only.gxm')
+    cells, sensors, has_values = read_binary_mesh(file_path)
+    np.testing.assert_array_equal(cells, CELLS.T)
+    assert sensors.shape == (4, 0)
+    assert not has_values
+
+    mesh = load_mesh(file_path)
+    assert mesh.sensors.shape == (0, 3)
+    assert mesh.sensor_values is None
+    assert detect_kind(file_path) == 'mesh'
+
+
+def test_python_writer_matches_csharp(tmp_path):
+    for name, sensors in (('mesh.gxm', SENSORS), ('cells_only.gxm', SENSORS[:0])):
+        output = str(tmp_path / name)
+        values = sensors[:, 3] if len(sensors) else None
+        write_binary_mesh(output, CELLS.T, sensors[:, 0:3], values)
+        with open(output, 'rb') as written, open(os.path.join(DATA_DIR, name), 'rb') as expected:
+            assert written.read() == expected.read()
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+@pytest.mark.parametrize('count, sensor_count, with_values', [
+    (50, 20, True),
+    (50, 0, False),
+    (50, 20, False),
+    (0, 20, True),
+])
+def test_round_trip(tmp_path, mmap, count, sensor_count, with_values):
+    mesh = _mesh(count, sensor_count, with_values)
+    file_path = str(tmp_path / 'mesh.gxm')
+    save_mesh(mesh, file_path)
+
+    assert is_binary_mesh(file_path)
+    _assert_same_mesh(load_mesh(file_path, mmap=mmap), mesh)
+    coords, values = load_sensors(file_path)
+    np.testing.assert_array_equal(coords, mesh.sensors)
+    assert (values is None) == (not with_values or sensor_count == 0)
+    assert detect_kind(file_path) == ('mesh' if count else 'sensors')
+
+
+def test_truncated_file(tmp_path):
+    file_path = str(tmp_path / 'mesh.gxm')
+    with open(os.path.join(DATA_DIR, 'mesh.gxm'), 'rb') as f:
+        raw = f.read()
+    with open(file_path, 'wb') as f:
+        f.write(raw[:-8])
+    with pytest.raises(ValueError):
+        read_binary_mesh(file_path, mmap=False)
@@ -0,0 +1,91 @@
+"""Решения refinement_planner против CalculateLocalResidual, посчитанного вручную."""
+import math
+
+import numpy as np
+import pytest
+
+import refinement_planner
+from mesh_loader import MeshData
+from refinement_planner import KEEP, MERGE, REFINE, RefinementOptions, local_residuals, plan_refinement
+
+GRID_WIDTH = 100.0
+
+
+def _idw(center, sensors, residuals) -> float:
+    """Σ|r|/(d + ε) / Σ 1/(d + ε) по всем сенсорам, как в MeshRefinerService"""
+    weighted = total = 0.0
+    for sensor, residual in zip(sensors, residuals):
+        weight = 1.0 / (math.dist(center, sensor) + refinement_planner.RESIDUAL_EPSILON)
+        weighted += weight * abs(residual)
+        total += weight
+    return weighted / total
+
+
+@pytest.fixture
+def case():
+    rng = np.random.default_rng(7)
+    x, y = np.meshgrid(np.linspace(0, GRID_WIDTH, 9), np.linspace(0, GRID_WIDTH, 9), indexing='ij')
+    sensors = np.column_stack([x.ravel(), y.ravel(), np.zeros(x.size)])
+    # Невязка сосредоточена в углу съёмки, чтобы были и дробление, и слияние
+    residuals = 1e-3 * np.exp(-((sensors[:, 0] - 20) ** 2 + (sensors[:, 1] - 30) ** 2) / 2000)
+    residuals *= rng.choice([-1.0, 1.0], len(sensors))
+
+    count = 60
+    center = np.column_stack([rng.uniform(0, GRID_WIDTH, (count, 2)), rng.uniform(-60, -5, count)])
+    size = rng.choice([2.0, 8.0, 15.0], count)
+    mesh = MeshData(center=center, bound=np.repeat(size[:, None], 3, axis=1), density=np.ones(count),
+                    level=rng.integers(0, 4, count).astype(np.float64), sensors=sensors)
+    return mesh, sensors, residuals
+
+
+def test_exact_residual_matches_hand_computed(case):
+    mesh, sensors, residuals = case
+    expected = [_idw(center, sensors, residuals) for center in mesh.center]
+    np.testing.assert_allclose(local_residuals(mesh.center, sensors, residuals, theta=0), expected, rtol=1e-5)
+
+
+def test_exact_decisions_match_hand_computed(case):
+    mesh, sensors, residuals = case
+    options = RefinementOptions()
+    local = np.array([_idw(center, sensors, residuals) for center in mesh.center])
+    max_residual = float(np.max(np.abs(residuals)))
+    # Пороги посередине между соседними значениями, чтобы округление float32 их не пересекало
+    ordered = np.sort(local)
+    threshold_refine = float(ordered[-20:-18].mean())
+    threshold_merge = float(ordered[15:17].mean())
+
+    plan = plan_refinement(mesh, sensors, residuals, threshold_refine, threshold_merge, options,
+                           grid_width=GRID_WIDTH, theta=0)
+
+    expected = []
+    for value, bound, level, center in zip(local, mesh.bound, mesh.level, mesh.center):
+        if (value > threshold_refine and value > 0.2 * max_residual
+                and bound[0] > options.min_cell_size_fraction * GRID_WIDTH
+                and level < options.max_subdivision_level):
+            expected.append(REFINE)
+        elif value < threshold_merge and bound[0] * 2 <= options.max_cell_size_fraction * GRID_WIDTH:
+            radius = refinement_planner.MERGE_INFLUENCE_FACTOR * bound.max()
+            loud = [sensor for sensor, r in zip(sensors, residuals)
+                    if abs(r) > threshold_merge and math.dist(center, sensor) <= radius]
+            expected.append(KEEP if loud else MERGE)
+        else:
+            expected.append(KEEP)
+
+    np.testing.assert_array_equal(plan.actions, expected)
+    assert {REFINE, MERGE, KEEP} <= set(expected)
+    assert len(plan.mesh) == len(mesh) + 7 * expected.count(REFINE)
+
+
+def test_small_problem_uses_exact_sum(case):
+    mesh, sensors, residuals = case
+    np.testing.assert_array_equal(local_residuals(mesh.center, sensors, residuals),
+                                  local_residuals(mesh.center, sensors, residuals, theta=0))
+
+
+def test_cluster_approximation_close_to_exact(case, monkeypatch):
+    mesh, sensors, residuals = case
+    monkeypatch.setattr(refinement_planner, 'EXACT_PAIRS_LIMIT', 0)
+    exact = local_residuals(mesh.center, sensors, residuals, theta=0)
+    approximate = local_residuals(mesh.center, sensors, residuals, theta=0.25)
+    assert not np.array_equal(approximate, exact)
+    np.testing.assert_allclose(approximate, exact, rtol=0.05)
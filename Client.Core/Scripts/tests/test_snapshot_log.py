@@ -0,0 +1,135 @@
+"""Журнал снимков .gxlog: запись SnapshotWriter и чтение SnapshotReader."""
+import numpy as np
+import pytest
+
+from mesh_loader import MeshData
+from snapshot_log import (FILE_HEADER, KIND_DELTA, KIND_KEYFRAME, RECORD_HEADER, SnapshotReader, SnapshotWriter,
+                          read_snapshots)
+
+SIGNS = np.array([[sx, sy, sz] for sx in (-1, 1) for sy in (-1, 1) for sz in (-1, 1)], dtype=float)
+
+
+def _grid_mesh(n: int = 3, size: float = 10.0) -> MeshData:
+    axis = (np.arange(n) + 0.5) * size
+    x, y, z = np.meshgrid(axis, axis, -axis, indexing='ij')
+    center = np.column_stack([x.ravel(), y.ravel(), z.ravel()])
+    count = len(center)
+    return MeshData(center=center, bound=np.full((count, 3), size / 2), density=np.linspace(1, 2, count),
+                    level=np.zeros(count), sensors=np.empty((0, 3)))
+
+
+def _replace(mesh: MeshData, removed, center, bound, density, level) -> MeshData:
+    keep = np.setdiff1d(np.arange(len(mesh)), removed)
+    return MeshData(center=np.concatenate([mesh.center[keep], center]),
+                    bound=np.concatenate([mesh.bound[keep], bound]),
+                    density=np.concatenate([mesh.density[keep], density]),
+                    level=np.concatenate([mesh.level[keep], level]),
+                    sensors=mesh.sensors)
+
+
+def _split(mesh: MeshData, cell: int) -> MeshData:
+    """Ячейка cell заменяется восемью дочерними с её плотностью"""
+    half = mesh.bound[cell] / 2
+    return _replace(mesh, [cell], mesh.center[cell] + SIGNS * half, np.tile(half, (8, 1)),
+                    np.full(8, mesh.density[cell]), np.full(8, mesh.level[cell] + 1))
+
+
+def _merge(mesh: MeshData, children: np.ndarray) -> MeshData:
+    """Восемь дочерних ячеек заменяются родительской со средней плотностью"""
+    center = mesh.center[children].mean(axis=0, keepdims=True)
+    return _replace(mesh, children, center, mesh.bound[children[:1]] * 2, [mesh.density[children].mean()],
+                    mesh.level[children[:1]] - 1)
+
+
+def _rows(mesh: MeshData) -> np.ndarray:
+    """Ячейки как строки в порядке сортировки: порядок в журнале не обязан совпадать с исходным"""
+    rows = np.column_stack([mesh.center, mesh.bound, mesh.density, mesh.level])
+    return rows[np.lexsort(rows.T[::-1])]
+
+
+def _record_kinds(file_path: str) -> list[int]:
+    kinds = []
+    with open(file_path, 'rb') as f:
+        f.seek(FILE_HEADER.size)
+        while raw := f.read(RECORD_HEADER.size):
+            header = RECORD_HEADER.unpack(raw)
+            kinds.append(header[1])
+            f.seek(header[0], 1)
+    return kinds
+
+
+@pytest.fixture
+def history():
+    """Сетки по итерациям: плотности, дробление, слияние и снова плотности"""
+    meshes = [_grid_mesh()]
+    meshes.append(meshes[-1].with_density(meshes[-1].density * 1.5))
+    meshes.append(_split(meshes[-1], 4))
+    split = meshes[-1]
+    meshes.append(split.with_density(np.where(split.level > 0, split.density + 0.25, split.density)))
+    meshes.append(_merge(meshes[-1], np.flatnonzero(meshes[-1].level > 0)))
+    meshes.append(meshes[-1].with_density(meshes[-1].density - 0.5))
+    meshes.append(_split(meshes[-1], 0))
+    return meshes
+
+
+def _write(file_path: str, meshes: list[MeshData], keyframe_interval: int):
+    with SnapshotWriter(file_path, keyframe_interval=keyframe_interval) as writer:
+        for iteration, mesh in enumerate(meshes):
+            writer.append(iteration, 10.0 / (iteration + 1), np.nan if iteration == 0 else 0.1 * iteration, mesh)
+
+
+@pytest.mark.parametrize('keyframe_interval', [1, 3, 50])
+def test_round_trip(tmp_path, history, keyframe_interval):
+    file_path = str(tmp_path / 'inversion.gxlog')
+    _write(file_path, history, keyframe_interval)
+
+    kinds = _record_kinds(file_path)
+    assert kinds[0] == KIND_KEYFRAME
+    assert kinds.count(KIND_KEYFRAME) == -(-len(history) // (keyframe_interval + 1))
+
+    snapshots = read_snapshots(file_path)
+    assert [snapshot.iteration for snapshot in snapshots] == list(range(len(history)))
+    assert np.isnan(snapshots[0].lambda_)
+    for snapshot, mesh, kind in zip(snapshots, history, kinds):
+        np.testing.assert_array_equal(_rows(snapshot.mesh), _rows(mesh))
+        assert snapshot.functional == 10.0 / (snapshot.iteration + 1)
+        if kind == KIND_DELTA:
+            assert snapshot.same_geometry == (snapshot.iteration in (1, 3, 5))
+
+    # Чистые дельты плотности: все ячейки (итерация 1), только дочерние (3)
+    if keyframe_interval == 50:
+        assert [snapshot.changed for snapshot in snapshots[1:4:2]] == [len(history[1]), 8]
+
+
+def test_partial_trailing_record(tmp_path, history):
+    complete = str(tmp_path / 'complete.gxlog')
+    _write(complete, history[:3], keyframe_interval=50)
+    with open(complete, 'rb') as f:
+        raw = f.read()
+
+    first_record = FILE_HEADER.size + RECORD_HEADER.size + RECORD_HEADER.unpack_from(raw, FILE_HEADER.size)[0]
+    growing = str(tmp_path / 'growing.gxlog')
+    reader = SnapshotReader(growing)
+    # Обрыв внутри заголовка второй записи, затем внутри её данных
+    cuts = [first_record + RECORD_HEADER.size // 2, first_record + RECORD_HEADER.size + 8, len(raw)]
+    with open(growing, 'wb') as f:
+        f.write(raw[:FILE_HEADER.size // 2])
+        f.flush()
+        assert reader.read_new() == []
+
+        f.write(raw[FILE_HEADER.size // 2:cuts[0]])
+        f.flush()
+        assert [snapshot.iteration for snapshot in reader.read_new()] == [0]
+
+        f.write(raw[cuts[0]:cuts[1]])
+        f.flush()
+        assert reader.read_new() == []
+        assert reader.offset == first_record
+
+        f.write(raw[cuts[1]:])
+        f.flush()
+        snapshots = reader.read_new()
+
+    assert [snapshot.iteration for snapshot in snapshots] == [1, 2]
+    np.testing.assert_array_equal(_rows(snapshots[-1].mesh), _rows(history[2]))
+    assert reader.read_new() == []
@@ -1,5 +1,4 @@
 ﻿using System.Diagnostics;
-using System.Text.Json;
 using Client.Core.Services.MeshService;
 using Client.Core.Services.SensorsService;
 using Client.Core.Services.TrueModelService;
@@ -118,18 +117,22 @@ public class InvertTaskService : IInvertTaskService
 
     private async Task ShowPlotAsync(Mesh mesh)
     {
-        const string jsonFile = "inverse.json";
+        const string meshFile = "inverse.gxm";
         const string pythonPath = "python";
         const string outputImage = "inverse.png";
 
-        await File.WriteAllTextAsync(jsonFile, JsonSerializer.Serialize(mesh));
+        await MeshBinaryWriter.WriteAsync(meshFile, mesh);
+
+        if (await PythonRenderServer.Shared.TryRenderAsync("inverse_chart", meshFile, outputImage) is not null)
+            return;
+
         var currentDirectory = Directory.GetCurrentDirectory();
         var scriptPath = Path.Combine(currentDirectory, "Scripts\\inverse_chart.py");
 
         var psi = new ProcessStartInfo
         {
             FileName = pythonPath,
-            Arguments = $"{scriptPath} {jsonFile} {outputImage}",
+            Arguments = $"{scriptPath} {meshFile} {outputImage}",
             RedirectStandardOutput = true,
             RedirectStandardError = true,
             UseShellExecute = false,
@@ -1,5 +1,6 @@
 using System.Diagnostics;
 using System.Text.Json;
+using Common.Services;
 
 namespace Client.Core.Services.PlotHelperBase;
 
@@ -21,13 +22,35 @@ public abstract class PlotHelperBase<TData>
             throw;
         }
 
+        // Сначала через долгоживущий процесс отрисовки, иначе разовым запуском скрипта
+        var renderedImage = await PythonRenderServer.Shared.TryRenderAsync(
+            Path.GetFileNameWithoutExtension(_scriptName),
+            _jsonFile,
+            _outputImage
+        );
+        if (renderedImage is not null && File.Exists(renderedImage))
+            return renderedImage;
+
+        await RunScriptAsync(_scriptName, $"{_jsonFile} {_outputImage}");
+
+        if (!File.Exists(_outputImage))
+            throw new($"{_outputImage} not found");
+
+        return _outputImage;
+    }
+
+    /// <summary>
+    /// Разовый запуск скрипта из каталога Scripts с выводом его stdout/stderr.
+    /// </summary>
+    protected async Task RunScriptAsync(string scriptName, string arguments)
+    {
         var currentDirectory = Directory.GetCurrentDirectory();
-        var scriptPath = Path.Combine(currentDirectory, $"Scripts\\{_scriptName}");
+        var scriptPath = Path.Combine(currentDirectory, $"Scripts\\{scriptName}");
 
         var psi = new ProcessStartInfo
         {
             FileName = _pythonPath,
-            Arguments = $"{scriptPath} {_jsonFile} {_outputImage}",
+            Arguments = $"{scriptPath} {arguments}",
             RedirectStandardOutput = true,
             RedirectStandardError = true,
             UseShellExecute = false,
@@ -39,12 +62,7 @@ public abstract class PlotHelperBase<TData>
         var error = await process.StandardError.ReadToEndAsync()!;
         await process.WaitForExitAsync()!;
 
-        Console.WriteLine($"Python output: {output}");
-        Console.WriteLine($"Python error: {error}");
-
-        if (!File.Exists(_outputImage))
-            throw new($"{_outputImage} not found");
-
-        return _outputImage;
+        PlotTelemetry.Report(output, "Python output");
+        PlotTelemetry.Report(error, "Python error");
     }
 }
\ No newline at end of file
@@ -6,9 +6,15 @@ namespace Client.Core.Services.PlotService;
 
 public interface IMeshPlotHelper
 {
-    Task<string> GenerateChartAsync(
-        SensorsGrid sensorsGrid,
-        bool selectedProjection,
-        EProjection projection
+    /// <summary>
+    /// Отрисовывает слои в нескольких проекциях одним запуском скрипта mesh_chart.
+    /// </summary>
+    /// <param name="sensorsGrid">Сетка приёмников поверх слоёв; null — не рисовать.</param>
+    /// <returns>Путь к изображению для каждой проекции.</returns>
+    Task<IReadOnlyDictionary<EProjection, string>> GenerateStrataChartsAsync(
+        Domain domain,
+        IReadOnlyList<Stratum> strata,
+        IReadOnlyCollection<EProjection> projections,
+        SensorsGrid? sensorsGrid = null
     );
 }
\ No newline at end of file
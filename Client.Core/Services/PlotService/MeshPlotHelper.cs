@@ -1,46 +1,56 @@
-﻿using Client.Core.Data;
+﻿using System.Text.Json;
+using Client.Core.Data;
 using Client.Core.Enums;
-using Client.Core.Services.MeshService;
 using Client.Core.Services.PlotHelperBase;
 using Common.Data;
+using Common.Services;
 
 namespace Client.Core.Services.PlotService;
 
 internal class MeshPlotHelper : PlotHelperBase<Mesh>, IMeshPlotHelper
 {
-    private readonly IMeshService _meshService;
+    private const string StrataScriptName   = "mesh_chart.py";
+    private const string StrataJsonFile     = "strata_data.json";
+    private const string StrataImagePattern = "strata_chart_{projection}.png";
 
-    public MeshPlotHelper(IMeshService meshService)
+    public MeshPlotHelper()
     {
-        _meshService = meshService;
-
-        _jsonFile = "mesh_data.json";
         _pythonPath = "python";
-        _outputImage = "mesh_chart.png";
-        _scriptName = "testing_chart.py";
     }
 
-    public async Task<string> GenerateChartAsync(
-        SensorsGrid sensorsGrid,
-        bool selectedProjection,
-        EProjection projection
+    public async Task<IReadOnlyDictionary<EProjection, string>> GenerateStrataChartsAsync(
+        Domain domain,
+        IReadOnlyList<Stratum> strata,
+        IReadOnlyCollection<EProjection> projections,
+        SensorsGrid? sensorsGrid = null
     )
     {
-        var mesh = await _meshService.GetMeshAsync();
-        var data = new MeshParams
-        {
-            Mesh = mesh,
-            SensorsGrid = sensorsGrid,
-            SelectedProjection = selectedProjection,
-            Projection = projection switch
-            {
-                EProjection.XY => "XY",
-                EProjection.XZ => "XZ",
-                EProjection.YZ => "YZ",
-                _              => throw new ArgumentOutOfRangeException(nameof(projection), "Неизвестная проекция")
-            }
-        };
-
-        return await GeneratePlotAsync(mesh);
+        var names = projections.Select(projection => projection.ToString()).ToList();
+        await File.WriteAllTextAsync(
+            StrataJsonFile,
+            JsonSerializer.Serialize(new { domain, strata, projections = names, sensors_grid = sensorsGrid })
+        );
+
+        var images = projections.ToDictionary(
+            projection => projection,
+            projection => StrataImagePattern.Replace("{projection}", projection.ToString())
+        );
+        foreach (var image in images.Values)
+            File.Delete(image);
+
+        // Все проекции за один разбор файла: через сервер отрисовки или одним запуском скрипта
+        var rendered = await PythonRenderServer.Shared.TryRenderAsync(
+            Path.GetFileNameWithoutExtension(StrataScriptName),
+            StrataJsonFile,
+            StrataImagePattern
+        );
+        if (rendered is null || images.Values.Any(image => !File.Exists(image)))
+            await RunScriptAsync(StrataScriptName, $"{StrataJsonFile} {StrataImagePattern}");
+
+        var missing = images.Values.FirstOrDefault(image => !File.Exists(image));
+        if (missing is not null)
+            throw new($"{missing} not found");
+
+        return images;
     }
 }
\ No newline at end of file
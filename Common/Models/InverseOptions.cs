@@ -112,4 +112,29 @@ public record InverseOptions
     /// Допустимый рост функционала прежде чем считать это отклонением.
     /// </summary>
     public double FunctionalGrowthTolerance { get; init; }
+
+    /// <summary>
+    /// Путь к журналу снимков сетки по итерациям (.gxlog). Пусто — журнал не пишется.
+    /// </summary>
+    public string? SnapshotLogPath { get; init; }
+
+    /// <summary>
+    /// Снимок пишется каждые столько итераций; итерация останова записывается всегда.
+    /// </summary>
+    public int SnapshotInterval { get; init; } = 1;
+
+    /// <summary>
+    /// Путь к файлу метрик итераций (JSON Lines) для мониторинга. Пусто — метрики не пишутся.
+    /// </summary>
+    public string? MetricsLogPath { get; init; }
+
+    /// <summary>
+    /// Путь к карте невязки на сенсорах (.gxm), обновляемой во время инверсии. Пусто — не пишется.
+    /// </summary>
+    public string? ResidualMapPath { get; init; }
+
+    /// <summary>
+    /// Минимальный интервал между обновлениями карты невязки, в секундах.
+    /// </summary>
+    public double ResidualMapInterval { get; init; } = 10;
 }
\ No newline at end of file
@@ -0,0 +1,104 @@
+﻿using System.Diagnostics;
+using System.Text.Json;
+using System.Text.Json.Serialization;
+using Common.Data;
+
+namespace Common.Services;
+
+/// <summary>
+/// Метрики одной итерации адаптивной инверсии.
+/// </summary>
+/// <param name="Iteration">Номер итерации.</param>
+/// <param name="Functional">Функционал сетки до шага.</param>
+/// <param name="Lambda">Эффективный коэффициент регуляризации шага.</param>
+/// <param name="Cells">Число ячеек.</param>
+/// <param name="ForwardSeconds">Время прямой задачи.</param>
+/// <param name="JacobianSeconds">Время построения якобиана.</param>
+/// <param name="InvertSeconds">Время шага Гаусса–Ньютона.</param>
+/// <param name="ElapsedSeconds">Время от начала инверсии.</param>
+public sealed record InversionMetrics(
+    int Iteration,
+    double Functional,
+    double Lambda,
+    int Cells,
+    double ForwardSeconds,
+    double JacobianSeconds,
+    double InvertSeconds,
+    double ElapsedSeconds
+);
+
+/// <summary>
+/// Запись метрик инверсии для Scripts/convergence_dashboard.py: одна строка JSON
+/// на итерацию, только дозапись. Карта невязки на сенсорах (.gxm без ячеек)
+/// перезаписывается не чаще заданного интервала через временный файл,
+/// чтобы читатель не увидел его недописанным.
+/// </summary>
+public sealed class InversionMetricsWriter : IDisposable
+{
+    private static readonly JsonSerializerOptions s_jsonOptions = new()
+    {
+        PropertyNamingPolicy = JsonNamingPolicy.SnakeCaseLower,
+        NumberHandling = JsonNumberHandling.AllowNamedFloatingPointLiterals
+    };
+
+    private readonly StreamWriter _writer;
+    private readonly string?      _residualPath;
+    private readonly TimeSpan     _residualInterval;
+    private readonly Stopwatch    _sinceResiduals = new();
+
+    private InversionMetricsWriter(StreamWriter writer, string? residualPath, TimeSpan residualInterval)
+    {
+        _writer = writer;
+        _residualPath = residualPath;
+        _residualInterval = residualInterval;
+    }
+
+    /// <summary>
+    /// Создаёт новый файл метрик (существующий перезаписывается).
+    /// </summary>
+    /// <param name="path">Путь к файлу метрик (JSON Lines).</param>
+    /// <param name="residualPath">Путь к карте невязки; null — не писать.</param>
+    /// <param name="residualIntervalSeconds">Минимальный интервал между записями карты невязки.</param>
+    public static InversionMetricsWriter Create(string path, string? residualPath, double residualIntervalSeconds)
+    {
+        var stream = new FileStream(path, FileMode.Create, FileAccess.Write, FileShare.ReadWrite);
+        return new InversionMetricsWriter(
+            new StreamWriter(stream) { AutoFlush = false },
+            string.IsNullOrEmpty(residualPath) ? null : residualPath,
+            TimeSpan.FromSeconds(Math.Max(0, residualIntervalSeconds))
+        );
+    }
+
+    /// <summary>
+    /// Дописывает строку метрик итерации.
+    /// </summary>
+    public void Append(InversionMetrics metrics)
+    {
+        // Строка целиком одним вызовом: читатель не увидит половину записи
+        _writer.Write(JsonSerializer.Serialize(metrics, s_jsonOptions) + "\n");
+        _writer.Flush();
+    }
+
+    /// <summary>
+    /// Перезаписывает карту невязки (наблюдение − модель), если с прошлой записи прошёл интервал.
+    /// </summary>
+    public async Task WriteResidualsAsync(
+        IReadOnlyList<Sensor> sensors,
+        double[] observedValues,
+        double[] modelValues,
+        bool force = false
+    )
+    {
+        if (_residualPath is null || (!force && _sinceResiduals.IsRunning && _sinceResiduals.Elapsed < _residualInterval))
+            return;
+
+        var residuals = sensors.Select((sensor, i) => sensor with { Value = observedValues[i] - modelValues[i] })
+                               .ToList();
+        var temporaryPath = _residualPath + ".tmp";
+        await MeshBinaryWriter.WriteAsync(temporaryPath, new Mesh(), residuals);
+        File.Move(temporaryPath, _residualPath, overwrite: true);
+        _sinceResiduals.Restart();
+    }
+
+    public void Dispose() => _writer.Dispose();
+}
@@ -0,0 +1,68 @@
+﻿using System.Buffers.Binary;
+using Common.Data;
+
+namespace Common.Services;
+
+/// <summary>
+/// Запись сетки в бинарный колоночный формат (.gxm), который Python-скрипты
+/// открывают без разбора текста через <c>np.memmap</c> (Scripts/mesh_binary.py).
+/// Заголовок 32 байта, далее колонки float64 в порядке little-endian.
+/// </summary>
+public static class MeshBinaryWriter
+{
+    public const uint FormatVersion    = 1;
+    public const uint FlagSensorValues = 1;
+
+    private const int HeaderSize    = 32;
+    private const int CellColumns   = 8;
+    private const int SensorColumns = 4;
+
+    private static readonly byte[] s_magic = "GXMESH\0\0"u8.ToArray();
+
+    /// <summary>
+    /// Сохраняет ячейки сетки и (необязательно) сенсоры со значениями.
+    /// </summary>
+    public static Task WriteAsync(string path, Mesh mesh, IReadOnlyList<Sensor>? sensors = null)
+    {
+        return File.WriteAllBytesAsync(path, Serialize(mesh, sensors ?? []));
+    }
+
+    public static byte[] Serialize(Mesh mesh, IReadOnlyList<Sensor> sensors)
+    {
+        var cells = mesh.Cells;
+        var buffer = new byte[HeaderSize + sizeof(double) * (CellColumns * cells.Count + SensorColumns * sensors.Count)];
+
+        s_magic.CopyTo(buffer, 0);
+        BinaryPrimitives.WriteUInt32LittleEndian(buffer.AsSpan(8), FormatVersion);
+        BinaryPrimitives.WriteUInt32LittleEndian(buffer.AsSpan(12), sensors.Count > 0 ? FlagSensorValues : 0);
+        BinaryPrimitives.WriteUInt64LittleEndian(buffer.AsSpan(16), (ulong)cells.Count);
+        BinaryPrimitives.WriteUInt64LittleEndian(buffer.AsSpan(24), (ulong)sensors.Count);
+
+        // Каждое поле записывается непрерывной колонкой
+        var offset = HeaderSize;
+        WriteColumn(buffer, ref offset, cells, cell => cell.CenterX);
+        WriteColumn(buffer, ref offset, cells, cell => cell.CenterY);
+        WriteColumn(buffer, ref offset, cells, cell => cell.CenterZ);
+        WriteColumn(buffer, ref offset, cells, cell => cell.BoundX);
+        WriteColumn(buffer, ref offset, cells, cell => cell.BoundY);
+        WriteColumn(buffer, ref offset, cells, cell => cell.BoundZ);
+        WriteColumn(buffer, ref offset, cells, cell => cell.Density);
+        WriteColumn(buffer, ref offset, cells, cell => cell.SubdivisionLevel);
+
+        WriteColumn(buffer, ref offset, sensors, sensor => sensor.X);
+        WriteColumn(buffer, ref offset, sensors, sensor => sensor.Y);
+        WriteColumn(buffer, ref offset, sensors, sensor => sensor.Z);
+        WriteColumn(buffer, ref offset, sensors, sensor => sensor.Value);
+
+        return buffer;
+    }
+
+    private static void WriteColumn<T>(byte[] buffer, ref int offset, IReadOnlyList<T> items, Func<T, double> selector)
+    {
+        for (var i = 0; i < items.Count; i++)
+        {
+            BinaryPrimitives.WriteDoubleLittleEndian(buffer.AsSpan(offset), selector(items[i]));
+            offset += sizeof(double);
+        }
+    }
+}
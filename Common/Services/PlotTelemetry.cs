@@ -0,0 +1,105 @@
+﻿using System.Text.Json;
+
+namespace Common.Services;
+
+/// <summary>
+/// Запись замеров этапа отрисовки из Python-скриптов (Scripts/telemetry.py).
+/// </summary>
+/// <param name="Type">stage или summary.</param>
+/// <param name="Script">Имя скрипта.</param>
+/// <param name="Stage">Этап (load, geometry, draw, save); для сводки — самый долгий этап.</param>
+/// <param name="WallSeconds">Время по часам.</param>
+/// <param name="CpuSeconds">Процессорное время.</param>
+/// <param name="PeakRssMb">Пиковый рабочий набор процесса, если известен.</param>
+/// <param name="Raw">Исходная запись со всеми счётчиками.</param>
+public sealed record PlotTelemetryRecord(
+    string Type,
+    string Script,
+    string? Stage,
+    double WallSeconds,
+    double CpuSeconds,
+    double? PeakRssMb,
+    JsonElement Raw
+);
+
+/// <summary>
+/// Разбор строк замеров в выводе Python-скриптов.
+/// Замеры включаются переменной окружения <see cref="EnvironmentVariable"/>, которую наследует процесс Python.
+/// </summary>
+public static class PlotTelemetry
+{
+    public const string EnvironmentVariable = "GRAVITY_PLOT_TELEMETRY";
+
+    /// <summary>
+    /// Вызывается для каждой разобранной записи.
+    /// </summary>
+    public static event Action<PlotTelemetryRecord>? RecordReceived;
+
+    /// <summary>
+    /// Разбирает строку вывода как запись замеров.
+    /// </summary>
+    public static bool TryParse(string line, out PlotTelemetryRecord? record)
+    {
+        record = null;
+        var text = line.Trim();
+        if (!text.StartsWith('{') || !text.Contains("\"telemetry\""))
+            return false;
+
+        try
+        {
+            using var document = JsonDocument.Parse(text);
+            var root = document.RootElement;
+            if (!root.TryGetProperty("telemetry", out _))
+                return false;
+
+            var type = root.GetProperty("type").GetString() ?? string.Empty;
+            record = new(
+                type,
+                root.GetProperty("script").GetString() ?? string.Empty,
+                type == "summary" ? GetString(root, "dominant_stage") : GetString(root, "stage"),
+                root.GetProperty("wall_s").GetDouble(),
+                root.GetProperty("cpu_s").GetDouble(),
+                root.TryGetProperty("peak_rss_mb", out var rss) && rss.ValueKind == JsonValueKind.Number
+                    ? rss.GetDouble()
+                    : null,
+                root.Clone()
+            );
+            return true;
+        } catch (Exception e) when (e is JsonException or KeyNotFoundException or InvalidOperationException)
+        {
+            return false;
+        }
+    }
+
+    /// <summary>
+    /// Выводит вывод скрипта: записи замеров — одной строкой на этап, остальное — как есть.
+    /// </summary>
+    public static void Report(string output, string prefix)
+    {
+        foreach (var line in output.Split('\n', StringSplitOptions.RemoveEmptyEntries))
+            ReportLine(line.TrimEnd('\r'), prefix);
+    }
+
+    /// <summary>
+    /// Выводит одну строку вывода скрипта.
+    /// </summary>
+    public static void ReportLine(string line, string prefix)
+    {
+        if (!TryParse(line, out var record) || record is null)
+        {
+            Console.WriteLine($"{prefix}: {line}");
+            return;
+        }
+
+        var rss = record.PeakRssMb is { } peak ? $", peak RSS {peak:F1} MB" : string.Empty;
+        Console.WriteLine(
+            record.Type == "summary"
+                ? $"Plot telemetry: {record.Script} total {record.WallSeconds:F3} s (CPU {record.CpuSeconds:F3} s{rss}), slowest stage: {record.Stage}"
+                : $"Plot telemetry: {record.Script}/{record.Stage} {record.WallSeconds:F3} s (CPU {record.CpuSeconds:F3} s{rss})"
+        );
+        RecordReceived?.Invoke(record);
+    }
+
+    private static string? GetString(JsonElement root, string name) =>
+        root.TryGetProperty(name, out var value) && value.ValueKind == JsonValueKind.String ? value.GetString() : null;
+}
@@ -0,0 +1,197 @@
+﻿using System.Diagnostics;
+using System.Text.Json;
+
+namespace Common.Services;
+
+/// <summary>
+/// Клиент долгоживущего Python-процесса отрисовки (Scripts/render_server.py).
+/// Библиотеки Python импортируются один раз, запросы передаются построчно в формате JSON.
+/// При любой ошибке сервера или превышении времени ожидания ответа возвращается <c>null</c>,
+/// и вызывающий код запускает скрипт напрямую.
+/// </summary>
+public sealed class PythonRenderServer : IAsyncDisposable
+{
+    private const string ServerScriptName = "render_server.py";
+
+    private static readonly TimeSpan s_defaultRenderTimeout = TimeSpan.FromMinutes(2);
+
+    private static readonly Lazy<PythonRenderServer> s_shared = new(() => new("python"));
+
+    private readonly string        _pythonPath;
+    private readonly TimeSpan      _renderTimeout;
+    private readonly SemaphoreSlim _lock = new(1, 1);
+
+    private Process? _process;
+    private int      _requestId;
+
+    /// <param name="pythonPath">Интерпретатор Python.</param>
+    /// <param name="renderTimeout">
+    /// Максимальное время ожидания ответа на один запрос; по истечении процесс сервера завершается.
+    /// </param>
+    public PythonRenderServer(string pythonPath, TimeSpan? renderTimeout = null)
+    {
+        _pythonPath = pythonPath;
+        _renderTimeout = renderTimeout ?? s_defaultRenderTimeout;
+    }
+
+    /// <summary>
+    /// Общий экземпляр сервера на всё приложение.
+    /// </summary>
+    public static PythonRenderServer Shared => s_shared.Value;
+
+    /// <summary>
+    /// Отрисовывает график скриптом <paramref name="scriptName"/> в уже запущенном процессе.
+    /// </summary>
+    /// <param name="scriptName">Имя скрипта без расширения (например, testing_chart).</param>
+    /// <param name="inputFile">Путь к файлу с данными.</param>
+    /// <param name="outputImage">Путь к выходному изображению.</param>
+    /// <param name="options">Дополнительные параметры функции отрисовки.</param>
+    /// <returns>Путь к изображению или <c>null</c>, если сервер недоступен.</returns>
+    public async Task<string?> TryRenderAsync(
+        string scriptName,
+        string inputFile,
+        string outputImage,
+        IReadOnlyDictionary<string, object?>? options = null
+    )
+    {
+        await _lock.WaitAsync();
+        try
+        {
+            var process = EnsureStarted();
+            if (process is null)
+                return null;
+
+            var id = ++_requestId;
+            var request = JsonSerializer.Serialize(
+                new
+                {
+                    id,
+                    method = "render",
+                    @params = new
+                    {
+                        script = scriptName,
+                        input = inputFile,
+                        output = outputImage,
+                        options = options ?? new Dictionary<string, object?>()
+                    }
+                }
+            );
+
+            // Зависший или упавший скрипт не должен держать блокировку: по таймауту процесс
+            // завершается, и вызывающий код переходит к разовому запуску
+            using var timeout = new CancellationTokenSource(_renderTimeout);
+            string? line;
+            try
+            {
+                await process.StandardInput.WriteLineAsync(request.AsMemory(), timeout.Token);
+                await process.StandardInput.FlushAsync(timeout.Token);
+                line = await process.StandardOutput.ReadLineAsync(timeout.Token).AsTask().WaitAsync(timeout.Token);
+            } catch (OperationCanceledException)
+            {
+                Console.WriteLine($"Python render server did not respond in {_renderTimeout.TotalSeconds:F0} s");
+                Stop();
+                return null;
+            }
+
+            if (line is null)
+            {
+                Stop();
+                return null;
+            }
+
+            using var response = JsonDocument.Parse(line);
+            if (response.RootElement.TryGetProperty("error", out var error))
+            {
+                Console.WriteLine($"Python render server error: {error}");
+                return null;
+            }
+
+            return response.RootElement.GetProperty("result").GetProperty("image").GetString();
+        } catch (Exception e)
+        {
+            Console.WriteLine($"Python render server is unavailable: {e.Message}");
+            Stop();
+            return null;
+        } finally
+        {
+            _lock.Release();
+        }
+    }
+
+    public async ValueTask DisposeAsync()
+    {
+        await _lock.WaitAsync();
+        try
+        {
+            if (_process is { HasExited: false })
+            {
+                await _process.StandardInput.WriteLineAsync("{\"id\":0,\"method\":\"shutdown\"}");
+                await _process.StandardInput.FlushAsync();
+                await _process.WaitForExitAsync();
+            }
+
+            Stop();
+        } finally
+        {
+            _lock.Release();
+            _lock.Dispose();
+        }
+    }
+
+    private Process? EnsureStarted()
+    {
+        if (_process is { HasExited: false })
+            return _process;
+
+        Stop();
+
+        var scriptPath = Path.Combine(Directory.GetCurrentDirectory(), "Scripts", ServerScriptName);
+        if (!File.Exists(scriptPath))
+            return null;
+
+        var psi = new ProcessStartInfo
+        {
+            FileName = _pythonPath,
+            Arguments = $"\"{scriptPath}\"",
+            RedirectStandardInput = true,
+            RedirectStandardOutput = true,
+            RedirectStandardError = true,
+            UseShellExecute = false,
+            CreateNoWindow = true,
+            StandardInputEncoding = new System.Text.UTF8Encoding(false),
+            StandardOutputEncoding = System.Text.Encoding.UTF8
+        };
+
+        _process = Process.Start(psi);
+        if (_process is null)
+            return null;
+
+        // Вывод самих скриптов идёт в stderr и читается асинхронно, чтобы не заблокировать процесс
+        _process.ErrorDataReceived += (_, args) =>
+        {
+            if (args.Data is not null)
+                PlotTelemetry.ReportLine(args.Data, "Python output");
+        };
+        _process.BeginErrorReadLine();
+
+        return _process;
+    }
+
+    private void Stop()
+    {
+        if (_process is null)
+            return;
+
+        try
+        {
+            if (!_process.HasExited)
+                _process.Kill();
+        } catch (InvalidOperationException)
+        {
+            // Процесс уже завершён
+        }
+
+        _process.Dispose();
+        _process = null;
+    }
+}
\ No newline at end of file
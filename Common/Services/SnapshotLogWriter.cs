@@ -0,0 +1,192 @@
+﻿using System.Buffers.Binary;
+using Common.Data;
+
+namespace Common.Services;
+
+/// <summary>
+/// Журнал снимков сетки по итерациям инверсии (.gxlog), только дозапись.
+/// Каждая запись — полный снимок (ключевой кадр) или разница с предыдущей:
+/// удалённые ячейки, изменённые плотности и добавленные ячейки.
+/// Python читает журнал по мере дозаписи (Scripts/snapshot_log.py).
+/// </summary>
+/// <remarks>
+/// Заголовок файла 16 байт: magic "GXSNAP\0\0", версия u32, резерв u32.
+/// Заголовок записи 64 байта: размер данных u64, вид u32, итерация i32,
+/// функционал f64, λ f64, число ячеек после записи u64, удалено u64,
+/// изменено u64, добавлено u64. Данные: индексы удалённых ячеек u64
+/// (в порядке предыдущей записи), индексы изменённых u64 (после удаления)
+/// и их плотности f64, затем 8 колонок f64 добавленных ячеек, как в .gxm.
+/// Добавленные ячейки идут в конец, поэтому порядок ячеек в журнале
+/// может отличаться от порядка в сетке.
+/// </remarks>
+public sealed class SnapshotLogWriter : IDisposable
+{
+    public const uint FormatVersion = 1;
+    public const uint KindKeyframe  = 0;
+    public const uint KindDelta     = 1;
+
+    private const int FileHeaderSize   = 16;
+    private const int RecordHeaderSize = 64;
+    private const int CellColumns      = 8;
+
+    private static readonly byte[] s_magic = "GXSNAP\0\0"u8.ToArray();
+
+    private readonly FileStream _stream;
+    private readonly int        _keyframeInterval;
+    private          List<Cell> _cells = [];
+    private          int        _recordsSinceKeyframe;
+    private          bool       _hasRecords;
+
+    private SnapshotLogWriter(FileStream stream, int keyframeInterval)
+    {
+        _stream = stream;
+        _keyframeInterval = Math.Max(1, keyframeInterval);
+    }
+
+    /// <summary>
+    /// Создаёт новый журнал (существующий файл перезаписывается).
+    /// </summary>
+    /// <param name="path">Путь к файлу журнала.</param>
+    /// <param name="keyframeInterval">Через сколько записей писать полный снимок.</param>
+    public static SnapshotLogWriter Create(string path, int keyframeInterval = 50)
+    {
+        var stream = new FileStream(path, FileMode.Create, FileAccess.Write, FileShare.Read);
+        var header = new byte[FileHeaderSize];
+        s_magic.CopyTo(header, 0);
+        BinaryPrimitives.WriteUInt32LittleEndian(header.AsSpan(8), FormatVersion);
+        stream.Write(header);
+        stream.Flush();
+        return new SnapshotLogWriter(stream, keyframeInterval);
+    }
+
+    /// <summary>
+    /// Дописывает снимок сетки после итерации.
+    /// </summary>
+    public void Append(int iteration, double functional, double lambda, Mesh mesh)
+    {
+        byte[] record = !_hasRecords || _recordsSinceKeyframe >= _keyframeInterval
+            ? Keyframe(iteration, functional, lambda, mesh.Cells)
+            : Delta(iteration, functional, lambda, mesh.Cells);
+
+        // Запись целиком одним вызовом: читатель не увидит половину заголовка
+        _stream.Write(record);
+        _stream.Flush();
+        _hasRecords = true;
+    }
+
+    public void Dispose() => _stream.Dispose();
+
+    private byte[] Keyframe(int iteration, double functional, double lambda, IReadOnlyList<Cell> cells)
+    {
+        _cells = cells.Select(cell => cell with { }).ToList();
+        _recordsSinceKeyframe = 0;
+
+        var buffer = NewRecord(KindKeyframe, iteration, functional, lambda, _cells.Count, 0, 0, _cells.Count);
+        WriteCells(buffer, RecordHeaderSize, _cells);
+        return buffer;
+    }
+
+    private byte[] Delta(int iteration, double functional, double lambda, IReadOnlyList<Cell> cells)
+    {
+        // Ячейки сопоставляются по геометрии; смена уровня — удаление и добавление
+        var previous = new Dictionary<CellKey, int>(_cells.Count);
+        for (var i = 0; i < _cells.Count; i++)
+            previous.TryAdd(CellKey.Of(_cells[i]), i);
+
+        var retained = new Cell?[_cells.Count];
+        var added = new List<Cell>();
+        foreach (var cell in cells)
+        {
+            if (previous.Remove(CellKey.Of(cell), out var index)
+                && _cells[index].SubdivisionLevel == cell.SubdivisionLevel)
+                retained[index] = cell;
+            else
+                added.Add(cell with { });
+        }
+
+        var removed = new List<long>();
+        var changed = new List<(long Index, double Density)>();
+        var next = new List<Cell>(cells.Count);
+        for (var i = 0; i < _cells.Count; i++)
+        {
+            if (retained[i] is not { } cell)
+            {
+                removed.Add(i);
+                continue;
+            }
+
+            if (BitConverter.DoubleToInt64Bits(cell.Density) != BitConverter.DoubleToInt64Bits(_cells[i].Density))
+                changed.Add((next.Count, cell.Density));
+            next.Add(_cells[i] with { Density = cell.Density });
+        }
+
+        next.AddRange(added);
+        _cells = next;
+        _recordsSinceKeyframe++;
+
+        var buffer = NewRecord(KindDelta, iteration, functional, lambda, next.Count, removed.Count, changed.Count,
+            added.Count);
+        var offset = RecordHeaderSize;
+        foreach (var index in removed)
+            WriteUInt64(buffer, ref offset, (ulong)index);
+        foreach (var (index, _) in changed)
+            WriteUInt64(buffer, ref offset, (ulong)index);
+        foreach (var (_, density) in changed)
+            WriteDouble(buffer, ref offset, density);
+        WriteCells(buffer, offset, added);
+        return buffer;
+    }
+
+    private static byte[] NewRecord(uint kind, int iteration, double functional, double lambda, int cellCount,
+        int removed, int changed, int added)
+    {
+        var payload = sizeof(ulong) * removed + (sizeof(ulong) + sizeof(double)) * changed
+                      + sizeof(double) * CellColumns * added;
+        var buffer = new byte[RecordHeaderSize + payload];
+
+        var offset = 0;
+        WriteUInt64(buffer, ref offset, (ulong)payload);
+        BinaryPrimitives.WriteUInt32LittleEndian(buffer.AsSpan(offset), kind);
+        BinaryPrimitives.WriteInt32LittleEndian(buffer.AsSpan(offset + 4), iteration);
+        offset += 8;
+        WriteDouble(buffer, ref offset, functional);
+        WriteDouble(buffer, ref offset, lambda);
+        WriteUInt64(buffer, ref offset, (ulong)cellCount);
+        WriteUInt64(buffer, ref offset, (ulong)removed);
+        WriteUInt64(buffer, ref offset, (ulong)changed);
+        WriteUInt64(buffer, ref offset, (ulong)added);
+        return buffer;
+    }
+
+    private static void WriteCells(byte[] buffer, int offset, IReadOnlyList<Cell> cells)
+    {
+        // Колонки в порядке MeshBinaryWriter
+        Func<Cell, double>[] columns =
+        [
+            cell => cell.CenterX, cell => cell.CenterY, cell => cell.CenterZ,
+            cell => cell.BoundX, cell => cell.BoundY, cell => cell.BoundZ,
+            cell => cell.Density, cell => cell.SubdivisionLevel
+        ];
+        foreach (var column in columns)
+            foreach (var cell in cells)
+                WriteDouble(buffer, ref offset, column(cell));
+    }
+
+    private static void WriteUInt64(byte[] buffer, ref int offset, ulong value)
+    {
+        BinaryPrimitives.WriteUInt64LittleEndian(buffer.AsSpan(offset), value);
+        offset += sizeof(ulong);
+    }
+
+    private static void WriteDouble(byte[] buffer, ref int offset, double value)
+    {
+        BinaryPrimitives.WriteDoubleLittleEndian(buffer.AsSpan(offset), value);
+        offset += sizeof(double);
+    }
+
+    private readonly record struct CellKey(double X, double Y, double Z, double Bx, double By, double Bz)
+    {
+        public static CellKey Of(Cell cell) =>
+            new(cell.CenterX, cell.CenterY, cell.CenterZ, cell.BoundX, cell.BoundY, cell.BoundZ);
+    }
+}
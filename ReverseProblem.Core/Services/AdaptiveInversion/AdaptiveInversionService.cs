@@ -1,8 +1,8 @@
 ﻿using System.Collections.Concurrent;
 using System.Diagnostics;
-using System.Text.Json;
 using Common.Data;
 using Common.Models;
+using Common.Services;
 using DirectTask.Core.Services;
 using ReverseProblem.Core.Services.JacobianService;
 using ReverseProblem.Core.Services.MeshRefinerService;
@@ -40,13 +40,35 @@ public class AdaptiveInversionService(
         double currentFunctional = .0;
         double previousFunctional = double.MaxValue;
 
+        // Журнал снимков по итерациям для Scripts/snapshot_log.py
+        using var snapshotLog = string.IsNullOrEmpty(inversionOptions.SnapshotLogPath)
+            ? null
+            : SnapshotLogWriter.Create(inversionOptions.SnapshotLogPath);
+        var snapshotInterval = Math.Max(1, inversionOptions.SnapshotInterval);
+        var lastLambda = double.NaN;
+        var lastEvaluated = -1;
+        var lastLogged = -1;
+        var meshUpdated = false;
+
+        // Метрики итераций и карта невязки для Scripts/convergence_dashboard.py
+        using var metrics = string.IsNullOrEmpty(inversionOptions.MetricsLogPath)
+            ? null
+            : InversionMetricsWriter.Create(
+                inversionOptions.MetricsLogPath,
+                inversionOptions.ResidualMapPath,
+                inversionOptions.ResidualMapInterval
+            );
+        double[]? lastModelValues = null;
+
         for (var iteration = 0; iteration < inversionOptions.MaxIterations; iteration++)
         {
             Console.WriteLine($"\n== Gauss-Newton inversion: iteration[{iteration + 1}] ==");
 
             // Расчёт прямой задачи
+            var forwardTimer = Stopwatch.StartNew();
             var anomalySensors = directTaskService.GetAnomalyMapFast(currentMesh, sensors, baseDensity);
             var modelValues = anomalySensors.Select(s => s.Value).ToArray();
+            forwardTimer.Stop();
 
             // Расчёт невязки и вычисление функционала
             currentFunctional = .0;
@@ -65,6 +87,19 @@ public class AdaptiveInversionService(
                 Console.WriteLine($"Initial functional was set to: {_initialFunctional:E8}");
             }
 
+            lastModelValues = modelValues;
+            if (metrics is not null)
+                await metrics.WriteResidualsAsync(sensors, observedValues, modelValues);
+
+            // Снимок сетки, на которой посчитан функционал, и λ шага, который к ней привёл
+            lastEvaluated = iteration;
+            meshUpdated = false;
+            if (snapshotLog is not null && iteration % snapshotInterval == 0)
+            {
+                snapshotLog.Append(iteration, currentFunctional, lastLambda, currentMesh);
+                lastLogged = iteration;
+            }
+
             // Проверка на нулевой функционал
             if (Math.Abs(currentFunctional) < 1e-18)
             {
@@ -125,6 +160,7 @@ public class AdaptiveInversionService(
             var modelParameters = currentMesh.Cells.Select(c => c.Density).ToArray();
 
             // 10. Итерация метода Гаусса–Ньютона
+            var invertTimer = Stopwatch.StartNew();
             var updatedParameters = gaussNewtonInversionService.Invert(
                 modelValues,
                 observedValues,
@@ -134,15 +170,38 @@ public class AdaptiveInversionService(
                 iteration,
                 out var effectiveLambda
             );
+            lastLambda = effectiveLambda;
+            invertTimer.Stop();
 
             // 11. Обновляем плотности ячеек
             for (int j = 0; j < currentMesh.Cells.Count; j++)
                 currentMesh.Cells[j].Density = updatedParameters[j];
+            meshUpdated = true;
 
             _functionalList.TryAdd(iteration, currentFunctional);
+            metrics?.Append(new InversionMetrics(
+                iteration,
+                currentFunctional,
+                effectiveLambda,
+                currentMesh.Cells.Count,
+                forwardTimer.Elapsed.TotalSeconds,
+                timer.Elapsed.TotalSeconds,
+                invertTimer.Elapsed.TotalSeconds,
+                _timer.Elapsed.TotalSeconds
+            ));
             Console.WriteLine($"Elements: {currentMesh.Cells.Count}");
         }
 
+        // Итерация останова; после последнего шага функционал для новой сетки не считался
+        if (meshUpdated)
+            snapshotLog?.Append(lastEvaluated + 1, double.NaN, lastLambda, currentMesh);
+        else if (lastLogged != lastEvaluated)
+            snapshotLog?.Append(lastEvaluated, currentFunctional, lastLambda, currentMesh);
+
+        // Карта невязки последней оценённой сетки пишется без ограничения по времени
+        if (metrics is not null && lastModelValues is not null)
+            await metrics.WriteResidualsAsync(sensors, observedValues, lastModelValues, force: true);
+
         _timer.Stop();
 
         Console.ForegroundColor = ConsoleColor.Green;
@@ -156,18 +215,22 @@ public class AdaptiveInversionService(
 
     private async Task ShowPlotAsync(Mesh mesh, IReadOnlyList<Sensor> sensors)
     {
-        const string jsonFile = "mesh_data.json";
+        const string meshFile = "mesh_data.gxm";
         const string pythonPath = "python";
         const string outputImage = "mesh_data.png";
 
-        await File.WriteAllTextAsync(jsonFile, JsonSerializer.Serialize(mesh));
+        await MeshBinaryWriter.WriteAsync(meshFile, mesh, sensors);
+
+        if (await PythonRenderServer.Shared.TryRenderAsync("show_plots_script", meshFile, outputImage) is not null)
+            return;
+
         var currentDirectory = Directory.GetCurrentDirectory();
         var scriptPath = Path.Combine(currentDirectory, "Scripts\\show_plots_script.py");
 
         var psi = new ProcessStartInfo
         {
             FileName = pythonPath,
-            Arguments = $"{scriptPath} {jsonFile} {outputImage}",
+            Arguments = $"{scriptPath} {meshFile} {outputImage}",
             UseShellExecute = false,
             RedirectStandardInput = true,
             RedirectStandardOutput = false,